@@ -0,0 +1,89 @@
+"""
+Benchmark del arranque en frío: tiempo hasta la primera respuesta.
+
+Lanza varias veces un worker de uvicorn y mide desde que se crea el proceso
+hasta que GET /productos/?limit=1 responde 200, en dos modos:
+
+- "esquema al arrancar": ESQUEMA_AL_ARRANCAR=true, el worker crea y revisa el esquema.
+- "esquema previo": ESQUEMA_AL_ARRANCAR=false, el esquema ya se preparó con
+  `python crear_admin.py --solo-esquema` y el worker no toca la base hasta la primera solicitud.
+
+Con SQLite local la revisión del esquema es barata; la diferencia grande se ve
+contra un PostgreSQL remoto, donde cada consulta de inspección es un viaje de red.
+
+Uso:
+    python benchmarks/bench_arranque.py --repeticiones 10
+    python benchmarks/bench_arranque.py --url postgresql://...
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODOS = [
+    ("esquema al arrancar", "true"),
+    ("esquema previo", "false"),
+]
+
+def parsear_argumentos():
+    parser = argparse.ArgumentParser(description="Benchmark de tiempo hasta la primera respuesta")
+    parser.add_argument("--repeticiones", type=int, default=5, help="Arranques medidos por modo")
+    parser.add_argument("--puerto", type=int, default=8766, help="Puerto del servidor de pruebas")
+    parser.add_argument("--url", help="DATABASE_URL a usar (por defecto un SQLite temporal)")
+    return parser.parse_args()
+
+def primera_respuesta(entorno: dict, puerto: int, limite_s: float = 60) -> float:
+    """Arranca un worker y retorna los segundos hasta su primera respuesta 200"""
+    url = f"http://127.0.0.1:{puerto}/productos/?limit=1"
+    inicio = time.perf_counter()
+    servidor = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(puerto), "--log-level", "warning"],
+        cwd=RAIZ, env=entorno, stdout=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - inicio < limite_s:
+            try:
+                with urllib.request.urlopen(url, timeout=5) as respuesta:
+                    if respuesta.status == 200:
+                        return time.perf_counter() - inicio
+            except (urllib.error.URLError, ConnectionError):
+                if servidor.poll() is not None:
+                    raise RuntimeError("El servidor de pruebas terminó antes de responder")
+                time.sleep(0.005)
+        raise RuntimeError("El servidor de pruebas no respondió a tiempo")
+    finally:
+        servidor.terminate()
+        servidor.wait()
+
+def main():
+    args = parsear_argumentos()
+    entorno = dict(os.environ, PYTHONUNBUFFERED="1")
+    if args.url:
+        entorno["DATABASE_URL"] = args.url
+    else:
+        entorno["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench_arranque.db')}"
+    entorno.pop("DATABASE_READ_URL", None)
+
+    # El paso de despliegue, una sola vez: después ambos modos ven el mismo esquema
+    subprocess.run([sys.executable, "crear_admin.py", "--solo-esquema"], cwd=RAIZ, env=entorno,
+                   check=True, stdout=subprocess.DEVNULL)
+
+    print(f"{args.repeticiones} arranques por modo\n")
+    print(f"{'modo':<22} {'mediana':>9} {'mín':>9} {'máx':>9}")
+    for nombre, valor in MODOS:
+        tiempos = [
+            primera_respuesta(dict(entorno, ESQUEMA_AL_ARRANCAR=valor), args.puerto) * 1000
+            for _ in range(args.repeticiones)
+        ]
+        print(f"{nombre:<22} {statistics.median(tiempos):>7.0f}ms {min(tiempos):>7.0f}ms {max(tiempos):>7.0f}ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""
+Benchmark de carga: rutas síncronas contra las rutas asíncronas de /async.
+
+Levanta la aplicación con uvicorn (DB_ASYNC_HABILITADO=true y la caché del
+catálogo desactivada, para que cada solicitud consulte la base de datos) y
+mide las solicitudes por segundo de cada ruta con muchos clientes a la vez.
+
+Con SQLite las consultas son locales y muy rápidas, así que la diferencia se
+ve sobre todo contra un PostgreSQL remoto, donde cada consulta espera la red y
+las rutas síncronas quedan limitadas por los hilos del threadpool.
+
+Uso:
+    python benchmarks/bench_async.py --concurrencia 200 --segundos 10
+    python benchmarks/bench_async.py --url postgresql://...   (base de pruebas, se borran los productos)
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+RUTAS = [
+    ("página", "/productos/?limit=20&after={after}"),
+    ("categoría", "/productos/categoria/{categoria}"),
+    ("facetas", "/productos/facetas"),
+]
+
+def parsear_argumentos():
+    parser = argparse.ArgumentParser(description="Benchmark de rutas síncronas contra asíncronas")
+    parser.add_argument("--productos", type=int, default=20_000, help="Productos sintéticos a insertar")
+    parser.add_argument("--concurrencia", type=int, default=200, help="Clientes simultáneos")
+    parser.add_argument("--segundos", type=float, default=10, help="Duración de cada medición")
+    parser.add_argument("--puerto", type=int, default=8765, help="Puerto del servidor de pruebas")
+    parser.add_argument("--url", help="DATABASE_URL a usar (por defecto un SQLite temporal)")
+    return parser.parse_args()
+
+def preparar_base(entorno: dict, cantidad: int):
+    """Crea las tablas y siembra productos en un proceso aparte, con el mismo entorno del servidor"""
+    codigo = (
+        "import sys; sys.path.insert(0, 'benchmarks');"
+        "from bench_busqueda import sembrar;"
+        "from database import SessionLocal, engine;"
+        "from services.esquema_service import actualizar_esquema;"
+        "import models;"
+        "actualizar_esquema(engine);"
+        "db = SessionLocal();"
+        f"sembrar(db, models, {cantidad});"
+        "db.close()"
+    )
+    subprocess.run([sys.executable, "-c", codigo], cwd=RAIZ, env=entorno, check=True)
+
+def iniciar_servidor(entorno: dict, puerto: int) -> subprocess.Popen:
+    servidor = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(puerto), "--log-level", "warning"],
+        cwd=RAIZ, env=entorno, stdout=subprocess.DEVNULL,
+    )
+    import httpx
+    for _ in range(100):
+        try:
+            httpx.get(f"http://127.0.0.1:{puerto}/metrics", timeout=1)
+            return servidor
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    servidor.terminate()
+    raise RuntimeError("El servidor de pruebas no arrancó")
+
+async def cargar(base: str, plantilla: str, concurrencia: int, segundos: float, max_id: int) -> dict:
+    """Lanza `concurrencia` clientes que repiten la solicitud hasta agotar el tiempo"""
+    import httpx
+
+    rnd = random.Random(7)
+    limites = httpx.Limits(max_connections=concurrencia, max_keepalive_connections=concurrencia)
+    completadas, errores, tiempos = 0, 0, []
+    fin = time.perf_counter() + segundos
+
+    async with httpx.AsyncClient(base_url=base, limits=limites, timeout=30) as cliente:
+        async def trabajador():
+            nonlocal completadas, errores
+            while time.perf_counter() < fin:
+                ruta = plantilla.format(after=rnd.randint(0, max_id), categoria=rnd.choice(["Labiales", "Bases", "Sombras"]))
+                inicio = time.perf_counter()
+                try:
+                    respuesta = await cliente.get(ruta)
+                    if respuesta.status_code == 200:
+                        completadas += 1
+                        tiempos.append(time.perf_counter() - inicio)
+                    else:
+                        errores += 1
+                except httpx.HTTPError:
+                    errores += 1
+
+        inicio = time.perf_counter()
+        await asyncio.gather(*(trabajador() for _ in range(concurrencia)))
+        duracion = time.perf_counter() - inicio
+
+    tiempos.sort()
+    return {
+        "rps": completadas / duracion,
+        "errores": errores,
+        "p50_ms": tiempos[len(tiempos) // 2] * 1000 if tiempos else 0,
+        "p99_ms": tiempos[int(len(tiempos) * 0.99) - 1] * 1000 if tiempos else 0,
+    }
+
+def main():
+    args = parsear_argumentos()
+    entorno = dict(os.environ, DB_ASYNC_HABILITADO="true", CATALOGO_CACHE_MAX_ENTRADAS="0", PYTHONUNBUFFERED="1")
+    if args.url:
+        entorno["DATABASE_URL"] = args.url
+    else:
+        entorno["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench_async.db')}"
+    entorno.pop("DATABASE_READ_URL", None)
+
+    print(f"Sembrando {args.productos} productos...")
+    preparar_base(entorno, args.productos)
+    servidor = iniciar_servidor(entorno, args.puerto)
+    base = f"http://127.0.0.1:{args.puerto}"
+
+    try:
+        print(f"Concurrencia {args.concurrencia}, {args.segundos:.0f} s por medición\n")
+        print(f"{'ruta':<10} {'modo':<6} {'req/s':>9} {'p50':>9} {'p99':>9} {'errores':>8}")
+        for nombre, plantilla in RUTAS:
+            for modo, prefijo in (("sync", ""), ("async", "/async")):
+                r = asyncio.run(cargar(base, prefijo + plantilla, args.concurrencia, args.segundos, args.productos))
+                print(f"{nombre:<10} {modo:<6} {r['rps']:>9.1f} {r['p50_ms']:>7.1f}ms {r['p99_ms']:>7.1f}ms {r['errores']:>8}")
+    finally:
+        servidor.terminate()
+        servidor.wait()
+
+if __name__ == "__main__":
+    main()
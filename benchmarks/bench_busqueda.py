@@ -0,0 +1,111 @@
+"""
+Benchmark de la búsqueda por categoría y marca.
+
+Compara el ILIKE '%texto%' sin índice (recorrido completo de la tabla) con la
+búsqueda indexada de BusquedaProductos sobre un catálogo sintético.
+
+Uso:
+    python benchmarks/bench_busqueda.py --productos 100000
+    python benchmarks/bench_busqueda.py --url postgresql://...   (base de pruebas, se borran los productos)
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+MARCAS = ["Maybelline", "L'Oréal", "MAC", "NYX", "Revlon", "Clinique", "Dior", "Vogue", "Samy", "Esika"]
+CATEGORIAS = ["Labiales", "Bases", "Sombras", "Pestañinas", "Rubores", "Delineadores", "Polvos", "Correctores"]
+TERMINOS = ["labia", "BASE", "sombr", "mac", "oréal", "xyz-no-existe"]
+
+def parsear_argumentos():
+    parser = argparse.ArgumentParser(description="Benchmark de búsqueda de productos")
+    parser.add_argument("--productos", type=int, default=100_000, help="Productos sintéticos a insertar")
+    parser.add_argument("--repeticiones", type=int, default=20, help="Ejecuciones por término")
+    parser.add_argument("--url", help="DATABASE_URL a usar (por defecto un SQLite temporal)")
+    return parser.parse_args()
+
+def sembrar(db, models, cantidad: int):
+    """Inserta productos sintéticos en lotes"""
+    from sqlalchemy import insert
+
+    rnd = random.Random(42)
+    db.query(models.Producto).delete()
+    lote = []
+    for i in range(cantidad):
+        lote.append({
+            "nombre": f"Producto {i}",
+            "cantidad": rnd.randint(0, 100),
+            "descripcion": "Producto sintético de benchmark",
+            "marca": f"{rnd.choice(MARCAS)} {rnd.randint(1, 500)}",
+            "categoria": f"{rnd.choice(CATEGORIAS)} {rnd.randint(1, 50)}",
+            "imagen_url": None,
+        })
+        if len(lote) == 5000:
+            db.execute(insert(models.Producto), lote)
+            lote = []
+    if lote:
+        db.execute(insert(models.Producto), lote)
+    db.commit()
+
+def medir(funcion, repeticiones: int) -> dict:
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        resultado = funcion()
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    tiempos.sort()
+    return {
+        "filas": len(resultado),
+        "p50_ms": round(statistics.median(tiempos), 3),
+        "p95_ms": round(tiempos[int(len(tiempos) * 0.95) - 1], 3),
+    }
+
+def main():
+    args = parsear_argumentos()
+    if args.url:
+        os.environ["DATABASE_URL"] = args.url
+    else:
+        ruta = os.path.join(tempfile.mkdtemp(), "bench_busqueda.db")
+        os.environ["DATABASE_URL"] = f"sqlite:///{ruta}"
+
+    from database import SessionLocal, engine
+    import models
+    from services.busqueda_service import BusquedaProductos
+
+    models.Base.metadata.create_all(bind=engine)
+    BusquedaProductos.preparar_indices(engine)
+
+    db = SessionLocal()
+    try:
+        print(f"Sembrando {args.productos} productos en {engine.dialect.name}...")
+        sembrar(db, models, args.productos)
+        buscador = BusquedaProductos(db)
+
+        resultados = []
+        for termino in TERMINOS:
+            for campo in ("categoria", "marca"):
+                columna = getattr(models.Producto, campo)
+                sin_indice = medir(
+                    lambda: db.query(models.Producto).filter(columna.ilike(f"%{termino}%")).all(),
+                    args.repeticiones,
+                )
+                indexada = medir(lambda: buscador.buscar(campo, termino), args.repeticiones)
+                assert sin_indice["filas"] == indexada["filas"], "Los resultados no coinciden"
+                resultados.append((campo, termino, sin_indice, indexada))
+
+        print(f"{'campo':<10} {'término':<15} {'filas':>7} {'ilike p50':>10} {'índice p50':>11} {'mejora':>7}")
+        for campo, termino, sin_indice, indexada in resultados:
+            mejora = sin_indice["p50_ms"] / max(indexada["p50_ms"], 0.001)
+            print(f"{campo:<10} {termino:<15} {indexada['filas']:>7} "
+                  f"{sin_indice['p50_ms']:>9.2f}ms {indexada['p50_ms']:>10.2f}ms {mejora:>6.1f}x")
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,286 @@
+"""
+Suite de carga de las rutas de la API, con resultados en JSON para comparar entre commits.
+
+Levanta la aplicación con uvicorn contra un SQLite temporal (o la base indicada
+con --url), siembra productos y usuarios y recorre cada ruta con cada nivel de
+concurrencia durante un tiempo fijo. Por cada ruta y concurrencia reporta
+solicitudes por segundo, errores y latencias p50/p95/p99.
+
+Las rutas de lectura se miden primero; luego las escrituras, y al final el
+borrado, que elimina los productos creados durante la medición de creación.
+
+Uso:
+    python benchmarks/bench_rutas.py --concurrencia 1,10,50 --segundos 5 --salida base.json
+    git checkout otra-rama
+    python benchmarks/bench_rutas.py --concurrencia 1,10,50 --segundos 5 --comparar base.json
+    python benchmarks/bench_rutas.py --rutas productos,categoria,auth_me   (solo algunas rutas)
+    python benchmarks/bench_rutas.py --url postgresql://...   (base de pruebas, se borran productos y usuarios bench_*)
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+CONTRASENA = "bench-contraseña"
+ADMIN = "bench_admin"
+CATEGORIAS = ["Labiales", "Bases", "Sombras", "Rubores"]
+MARCAS = ["MAC", "Dior", "NYX", "Vogue"]
+
+def _producto(rnd: random.Random) -> dict:
+    return {
+        "nombre": f"Producto bench {rnd.randint(0, 10**6)}",
+        "cantidad": rnd.randint(0, 100),
+        "descripcion": "Producto creado por la suite de carga",
+        "marca": rnd.choice(MARCAS),
+        "categoria": rnd.choice(CATEGORIAS),
+    }
+
+# nombre -> (método, ruta, sesión requerida, cuerpo); la ruta y el cuerpo reciben (rnd, contexto)
+RUTAS = {
+    "productos": ("GET", lambda rnd, ctx: "/productos/", None, None),
+    "productos_pagina": ("GET", lambda rnd, ctx: f"/productos/?limit=50&after={rnd.randint(0, ctx['max_id'])}", None, None),
+    "facetas": ("GET", lambda rnd, ctx: "/productos/facetas", None, None),
+    "categoria": ("GET", lambda rnd, ctx: f"/productos/categoria/{rnd.choice(CATEGORIAS)}", None, None),
+    "marca": ("GET", lambda rnd, ctx: f"/productos/marca/{rnd.choice(MARCAS)}", None, None),
+    "stock_bajo": ("GET", lambda rnd, ctx: "/productos/stock-bajo", "admin", None),
+    "usuarios": ("GET", lambda rnd, ctx: "/usuarios/", "admin", None),
+    "auth_me": ("GET", lambda rnd, ctx: "/auth/me", "usuario", None),
+    "auth_login": ("POST", lambda rnd, ctx: "/auth/login", None,
+                   lambda rnd, ctx: {"username": f"bench_{rnd.randrange(ctx['usuarios'])}", "password": CONTRASENA}),
+    "producto_crear": ("POST", lambda rnd, ctx: "/productos/", "admin", lambda rnd, ctx: _producto(rnd)),
+    "producto_actualizar": ("PUT", lambda rnd, ctx: f"/productos/{rnd.randint(1, ctx['max_id'])}", "admin",
+                            lambda rnd, ctx: _producto(rnd)),
+    "producto_parcial": ("PATCH", lambda rnd, ctx: f"/productos/{rnd.randint(1, ctx['max_id'])}", "admin",
+                         lambda rnd, ctx: {"descripcion": f"Editado {rnd.random()}"}),
+    "producto_stock": ("PATCH", lambda rnd, ctx: f"/productos/{rnd.randint(1, ctx['max_id'])}/stock", "admin",
+                       lambda rnd, ctx: {"delta": rnd.choice([-1, 1]), "permitir_negativo": True}),
+    "producto_eliminar": ("DELETE", lambda rnd, ctx: f"/productos/{ctx['creados'].pop()}", "admin", None),
+}
+
+def parsear_argumentos():
+    parser = argparse.ArgumentParser(description="Suite de carga de las rutas de la API")
+    parser.add_argument("--productos", type=int, default=5_000, help="Productos sintéticos a insertar")
+    parser.add_argument("--usuarios", type=int, default=200, help="Usuarios sintéticos a insertar")
+    parser.add_argument("--concurrencia", default="1,10,50", help="Niveles de concurrencia separados por coma")
+    parser.add_argument("--segundos", type=float, default=5, help="Duración de cada medición")
+    parser.add_argument("--rutas", help=f"Rutas a medir separadas por coma (por defecto todas: {','.join(RUTAS)})")
+    parser.add_argument("--sin-cache", action="store_true", help="Desactivar la caché del catálogo")
+    parser.add_argument("--semilla", type=int, default=7, help="Semilla de los datos y de las solicitudes")
+    parser.add_argument("--puerto", type=int, default=8767, help="Puerto del servidor de pruebas")
+    parser.add_argument("--url", help="DATABASE_URL a usar (por defecto un SQLite temporal)")
+    parser.add_argument("--salida", help="Archivo JSON de resultados (por defecto se imprime en la salida estándar)")
+    parser.add_argument("--comparar", help="JSON de una ejecución anterior para mostrar la diferencia")
+    return parser.parse_args()
+
+def preparar_base(entorno: dict, productos: int, usuarios: int):
+    """Crea el esquema y siembra productos y usuarios en un proceso aparte, con el entorno del servidor"""
+    codigo = f"""
+import sys; sys.path.insert(0, 'benchmarks')
+from sqlalchemy import insert
+from bench_busqueda import sembrar
+from database import SessionLocal, engine
+from services.auth_service import PasswordManager
+from services.esquema_service import actualizar_esquema
+import models
+
+actualizar_esquema(engine)
+db = SessionLocal()
+sembrar(db, models, {productos})
+db.query(models.Usuario).filter(models.Usuario.username.like('bench_%')).delete(synchronize_session=False)
+# Un solo hash para todos: el costo del KDF se mide en auth_login, no al sembrar
+hash_comun = PasswordManager.hash_password({CONTRASENA!r})
+filas = [dict(username=f'bench_{{i}}', email=f'bench_{{i}}@ejemplo.com', password=hash_comun, is_admin=False)
+         for i in range({usuarios})]
+filas.append(dict(username={ADMIN!r}, email='bench_admin@ejemplo.com', password=hash_comun, is_admin=True))
+db.execute(insert(models.Usuario), filas)
+db.commit()
+db.close()
+"""
+    subprocess.run([sys.executable, "-c", codigo], cwd=RAIZ, env=entorno, check=True, stdout=subprocess.DEVNULL)
+
+def iniciar_servidor(entorno: dict, puerto: int) -> subprocess.Popen:
+    servidor = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(puerto), "--log-level", "warning"],
+        cwd=RAIZ, env=entorno, stdout=subprocess.DEVNULL,
+    )
+    import httpx
+    for _ in range(150):
+        try:
+            httpx.get(f"http://127.0.0.1:{puerto}/metrics", timeout=1)
+            return servidor
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    servidor.terminate()
+    raise RuntimeError("El servidor de pruebas no arrancó")
+
+def iniciar_sesion(base: str, username: str) -> str:
+    import httpx
+    respuesta = httpx.post(f"{base}/auth/login", json={"username": username, "password": CONTRASENA}, timeout=30)
+    respuesta.raise_for_status()
+    return respuesta.cookies["token"]
+
+def percentil(ordenados: list, p: float) -> float:
+    """Percentil por rango más cercano sobre una lista ya ordenada"""
+    if not ordenados:
+        return 0.0
+    return ordenados[min(len(ordenados) - 1, max(0, int(round(p / 100 * len(ordenados))) - 1))]
+
+async def cargar(base: str, nombre: str, concurrencia: int, segundos: float, contexto: dict, semilla: int) -> dict:
+    """Lanza `concurrencia` clientes que repiten la solicitud de la ruta hasta agotar el tiempo"""
+    import httpx
+
+    metodo, ruta, sesion, cuerpo = RUTAS[nombre]
+    rnd = random.Random(semilla)
+    cookies = {"token": contexto["tokens"][sesion]} if sesion else {}
+    limites = httpx.Limits(max_connections=concurrencia, max_keepalive_connections=concurrencia)
+    completadas, errores, tiempos = 0, 0, []
+    fin = time.perf_counter() + segundos
+
+    async with httpx.AsyncClient(base_url=base, limits=limites, timeout=60, cookies=cookies) as cliente:
+        async def trabajador():
+            nonlocal completadas, errores
+            while time.perf_counter() < fin:
+                if nombre == "producto_eliminar" and not contexto["creados"]:
+                    return
+                url = ruta(rnd, contexto)
+                datos = cuerpo(rnd, contexto) if cuerpo else None
+                inicio = time.perf_counter()
+                try:
+                    respuesta = await cliente.request(metodo, url, json=datos)
+                except httpx.HTTPError:
+                    errores += 1
+                    continue
+                if respuesta.status_code >= 400:
+                    errores += 1
+                    continue
+                tiempos.append((time.perf_counter() - inicio) * 1000)
+                completadas += 1
+                if nombre == "producto_crear":
+                    contexto["creados"].append(respuesta.json()["id"])
+
+        inicio = time.perf_counter()
+        await asyncio.gather(*(trabajador() for _ in range(concurrencia)))
+        duracion = time.perf_counter() - inicio
+
+    tiempos.sort()
+    return {
+        "ruta": nombre,
+        "metodo": metodo,
+        "concurrencia": concurrencia,
+        "solicitudes": completadas,
+        "errores": errores,
+        "rps": round(completadas / duracion, 1) if duracion else 0.0,
+        "p50_ms": round(percentil(tiempos, 50), 2),
+        "p95_ms": round(percentil(tiempos, 95), 2),
+        "p99_ms": round(percentil(tiempos, 99), 2),
+        "max_ms": round(tiempos[-1], 2) if tiempos else 0.0,
+    }
+
+def commit_actual() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=RAIZ, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "desconocido"
+
+def imprimir_encabezado(anteriores: dict):
+    encabezado = f"{'ruta':<20} {'conc':>5} {'req/s':>9} {'p50':>9} {'p95':>9} {'p99':>9} {'errores':>8}"
+    if anteriores:
+        encabezado += f" {'Δ req/s':>9} {'Δ p99':>9}"
+    print(encabezado, file=sys.stderr)
+
+def imprimir_fila(r: dict, anteriores: dict):
+    """Fila legible en stderr; con --comparar agrega el cambio de req/s y p99 contra la ejecución anterior"""
+    linea = (f"{r['ruta']:<20} {r['concurrencia']:>5} {r['rps']:>9.1f} {r['p50_ms']:>7.1f}ms "
+             f"{r['p95_ms']:>7.1f}ms {r['p99_ms']:>7.1f}ms {r['errores']:>8}")
+    anterior = anteriores.get((r["ruta"], r["concurrencia"]))
+    if anterior:
+        def cambio(actual, previo):
+            return f"{(actual - previo) / previo * 100:+.0f}%" if previo else "n/a"
+        linea += f" {cambio(r['rps'], anterior['rps']):>9} {cambio(r['p99_ms'], anterior['p99_ms']):>9}"
+    print(linea, file=sys.stderr)
+
+def main():
+    args = parsear_argumentos()
+    niveles = [int(n) for n in args.concurrencia.split(",")]
+    nombres = args.rutas.split(",") if args.rutas else list(RUTAS)
+    desconocidas = [n for n in nombres if n not in RUTAS]
+    if desconocidas:
+        sys.exit(f"Rutas desconocidas: {', '.join(desconocidas)}")
+    if "producto_eliminar" in nombres and "producto_crear" not in nombres:
+        sys.exit("producto_eliminar borra los productos creados por producto_crear: inclúyelas juntas")
+
+    anteriores = {}
+    if args.comparar:
+        with open(args.comparar) as archivo:
+            anteriores = {(r["ruta"], r["concurrencia"]): r for r in json.load(archivo)["resultados"]}
+
+    entorno = dict(os.environ, PYTHONUNBUFFERED="1")
+    if args.sin_cache:
+        entorno["CATALOGO_CACHE_MAX_ENTRADAS"] = "0"
+    if args.url:
+        entorno["DATABASE_URL"] = args.url
+    else:
+        entorno["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench_rutas.db')}"
+    entorno.pop("DATABASE_READ_URL", None)
+
+    print(f"Sembrando {args.productos} productos y {args.usuarios} usuarios...", file=sys.stderr)
+    preparar_base(entorno, args.productos, args.usuarios)
+    servidor = iniciar_servidor(entorno, args.puerto)
+    base = f"http://127.0.0.1:{args.puerto}"
+
+    resultados = []
+    try:
+        contexto = {
+            "max_id": args.productos,
+            "usuarios": args.usuarios,
+            "creados": [],
+            "tokens": {"admin": iniciar_sesion(base, ADMIN), "usuario": iniciar_sesion(base, "bench_0")},
+        }
+        print(f"Concurrencia {niveles}, {args.segundos:g} s por medición\n", file=sys.stderr)
+        imprimir_encabezado(anteriores)
+        for concurrencia in niveles:
+            for nombre in nombres:
+                resultado = asyncio.run(cargar(base, nombre, concurrencia, args.segundos, contexto, args.semilla))
+                resultados.append(resultado)
+                imprimir_fila(resultado, anteriores)
+    finally:
+        servidor.terminate()
+        servidor.wait()
+
+    informe = {
+        "metadatos": {
+            "commit": commit_actual(),
+            "fecha": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "plataforma": platform.platform(),
+            "cpus": os.cpu_count(),
+            "base_datos": entorno["DATABASE_URL"].split(":", 1)[0],
+            "productos": args.productos,
+            "usuarios": args.usuarios,
+            "segundos": args.segundos,
+            "cache_catalogo": not args.sin_cache,
+        },
+        "resultados": resultados,
+    }
+    salida = json.dumps(informe, indent=2, ensure_ascii=False)
+    if args.salida:
+        with open(args.salida, "w") as archivo:
+            archivo.write(salida + "\n")
+        print(f"\nResultados guardados en {args.salida}", file=sys.stderr)
+    else:
+        print(salida)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Micro-benchmark de la serialización de listas grandes.
+
+Compara, para el catálogo completo y la lista de usuarios:
+
+- Ruta anterior: consulta de objetos ORM, validación de cada fila con Pydantic
+  (from_attributes) y dump_json.
+- Ruta rápida: SELECT solo de las columnas del esquema y filas_json (orjson si está instalado).
+
+Verifica que ambas produzcan exactamente los mismos bytes y muestra además el
+costo y el tamaño de comprimir la respuesta con gzip y brotli.
+
+Uso:
+    python benchmarks/bench_serializacion.py --productos 50000
+    python benchmarks/bench_serializacion.py --url postgresql://...   (base de pruebas, se borran los productos)
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def parsear_argumentos():
+    parser = argparse.ArgumentParser(description="Benchmark de serialización de listas")
+    parser.add_argument("--productos", type=int, default=50_000, help="Productos sintéticos a insertar")
+    parser.add_argument("--usuarios", type=int, default=5_000, help="Usuarios sintéticos a insertar")
+    parser.add_argument("--repeticiones", type=int, default=10, help="Ejecuciones por variante")
+    parser.add_argument("--url", help="DATABASE_URL a usar (por defecto un SQLite temporal)")
+    return parser.parse_args()
+
+def sembrar(db, models, productos: int, usuarios: int):
+    """Inserta productos y usuarios sintéticos en lotes"""
+    from sqlalchemy import insert
+
+    db.query(models.Producto).delete()
+    db.query(models.Usuario).filter(models.Usuario.username.like("bench_%")).delete(synchronize_session=False)
+    for inicio in range(0, productos, 5000):
+        db.execute(insert(models.Producto), [{
+            "nombre": f"Producto {i} — edición ñ",
+            "cantidad": i % 100,
+            "descripcion": "Producto sintético de benchmark con una descripción de largo típico",
+            "marca": f"Marca {i % 300}",
+            "categoria": f"Categoría {i % 40}",
+            "imagen_url": f"https://cdn.ejemplo.com/productos/{i}.jpg" if i % 2 else None,
+        } for i in range(inicio, min(inicio + 5000, productos))])
+    for inicio in range(0, usuarios, 5000):
+        db.execute(insert(models.Usuario), [{
+            "username": f"bench_{i}",
+            "email": f"bench_{i}@ejemplo.com",
+            "password": "x",
+            "is_admin": i % 50 == 0,
+        } for i in range(inicio, min(inicio + 5000, usuarios))])
+    db.commit()
+
+def medir(funcion, repeticiones: int) -> tuple[dict, bytes]:
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        resultado = funcion()
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    return {"p50_ms": round(statistics.median(tiempos), 2), "min_ms": round(min(tiempos), 2)}, resultado
+
+def main():
+    args = parsear_argumentos()
+    if args.url:
+        os.environ["DATABASE_URL"] = args.url
+    else:
+        ruta = os.path.join(tempfile.mkdtemp(), "bench_serializacion.db")
+        os.environ["DATABASE_URL"] = f"sqlite:///{ruta}"
+
+    from pydantic import TypeAdapter
+    from database import SessionLocal, engine
+    import models, schemas
+    from services import serializacion_service
+    from services.producto_service import ProductoService
+    from services.usuario_service import UsuarioService
+
+    models.Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        print(f"Sembrando {args.productos} productos y {args.usuarios} usuarios en {engine.dialect.name}...")
+        sembrar(db, models, args.productos, args.usuarios)
+        print(f"Codificador JSON: {'orjson' if serializacion_service.orjson else 'json (sin orjson)'}\n")
+
+        casos = [
+            ("productos", TypeAdapter(list[schemas.Producto]), schemas.Producto,
+             lambda: db.query(models.Producto).order_by(models.Producto.id).all(),
+             lambda: ProductoService(db).obtener_filas()),
+            ("usuarios", TypeAdapter(list[schemas.Usuario]), schemas.Usuario,
+             lambda: db.query(models.Usuario).order_by(models.Usuario.id).all(),
+             lambda: UsuarioService(db).obtener_filas()),
+        ]
+
+        print(f"{'lista':<10} {'variante':<22} {'p50':>10} {'mín':>10} {'bytes':>11}")
+        for nombre, adaptador, esquema, consultar_orm, consultar_filas in casos:
+            def ruta_anterior():
+                db.expunge_all()
+                return adaptador.dump_json(adaptador.validate_python(consultar_orm(), from_attributes=True))
+
+            anterior, cuerpo = medir(ruta_anterior, args.repeticiones)
+            rapida, cuerpo_rapido = medir(lambda: serializacion_service.filas_json(esquema, consultar_filas()), args.repeticiones)
+            assert cuerpo == cuerpo_rapido, f"La ruta rápida no produce el mismo JSON para {nombre}"
+
+            filas = [
+                ("orm + pydantic", anterior, len(cuerpo)),
+                ("columnas + filas_json", rapida, len(cuerpo)),
+            ]
+            for codificacion in ("gzip", "br"):
+                if codificacion == "br" and serializacion_service.brotli is None:
+                    continue
+                tiempos, comprimido = medir(
+                    lambda: serializacion_service.comprimir(cuerpo, codificacion)[0], args.repeticiones
+                )
+                filas.append((f"  + compresión {codificacion}", tiempos, len(comprimido)))
+
+            for variante, tiempos, tamano in filas:
+                print(f"{nombre:<10} {variante:<22} {tiempos['p50_ms']:>8.2f}ms {tiempos['min_ms']:>8.2f}ms {tamano:>11,}")
+            print(f"{'':<10} mejora p50: {anterior['p50_ms'] / max(rapida['p50_ms'], 0.001):.1f}x\n")
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+"""
+Script para calibrar el costo del hash de contraseñas (scrypt)
+Mide cuánto tarda un hash en esta máquina y sugiere el valor de PASSWORD_SCRYPT_N
+más alto que no supera la latencia objetivo
+"""
+
+import argparse
+import secrets
+import statistics
+import time
+from services.auth_service import SCRYPT_P, SCRYPT_R, scrypt_hash
+
+def medir_ms(n: int, r: int, p: int, repeticiones: int) -> float:
+    """Mediana en milisegundos de un hash scrypt con los parámetros dados"""
+    salt = secrets.token_bytes(16)
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        scrypt_hash("contraseña de calibración", salt, n, r, p)
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    return statistics.median(tiempos)
+
+def calibrar(objetivo_ms: float, r: int, p: int, repeticiones: int) -> int:
+    """Retorna el N (potencia de 2) más alto cuyo hash tarda como máximo objetivo_ms"""
+    elegido = 2 ** 10
+    for exponente in range(10, 21):
+        n = 2 ** exponente
+        ms = medir_ms(n, r, p, repeticiones)
+        print(f"   N=2^{exponente:<2} ({n:>7}) -> {ms:8.1f} ms  (~{128 * r * n // (1024 * 1024)} MiB)")
+        if ms > objetivo_ms:
+            break
+        elegido = n
+    return elegido
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Calibrar el costo de scrypt para las contraseñas")
+    parser.add_argument("--objetivo-ms", type=float, default=100, help="Latencia objetivo por hash (ms)")
+    parser.add_argument("--repeticiones", type=int, default=3, help="Mediciones por cada valor de N")
+    args = parser.parse_args()
+
+    print(f"🔧 Calibrando scrypt (r={SCRYPT_R}, p={SCRYPT_P}) para ~{args.objetivo_ms:.0f} ms por hash...")
+    n = calibrar(args.objetivo_ms, SCRYPT_R, SCRYPT_P, args.repeticiones)
+    print("\n📝 Agrega esta línea a tu archivo .env:")
+    print(f"   PASSWORD_SCRYPT_N={n}")
+    print("\nLos usuarios existentes se actualizan al nuevo costo en su siguiente login.")
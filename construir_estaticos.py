@@ -0,0 +1,21 @@
+"""
+Script para preparar los archivos estáticos de producción
+Genera en STATIC_BUILD_DIR (static_build por defecto) los recursos con huella de
+contenido, las páginas con las referencias reescritas y las variantes gzip/brotli
+"""
+
+import argparse
+import os
+from services.estaticos_service import construir_estaticos
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Construir los archivos estáticos para STATIC_MODO=produccion")
+    parser.add_argument("--origen", default="static", help="Carpeta de archivos estáticos")
+    parser.add_argument("--destino", default=os.getenv("STATIC_BUILD_DIR", "static_build"), help="Carpeta de salida")
+    args = parser.parse_args()
+
+    print(f"🔧 Construyendo estáticos de '{args.origen}' en '{args.destino}'...")
+    manifiesto = construir_estaticos(args.origen, args.destino)
+    for original, con_huella in sorted(manifiesto.items()):
+        print(f"   {original} -> {con_huella}")
+    print("\n📝 Arranca el servidor con STATIC_MODO=produccion para usarlos.")
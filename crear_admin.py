@@ -1,17 +1,23 @@
 """
 Script para crear un usuario administrador inicial
 Ejecutar este script después de crear la base de datos
+
+Con --solo-esquema solo crea y actualiza las tablas, índices y la secuencia de
+cambios. Es el paso de despliegue cuando los workers arrancan con
+ESQUEMA_AL_ARRANCAR=false
 """
 
+import argparse
 from database import SessionLocal, engine
 import models, schemas
+from services.esquema_service import actualizar_esquema
 from services.usuario_service import UsuarioService
 
 def crear_admin_inicial():
     """Crea un usuario administrador inicial si no existe"""
     
     # Crear las tablas si no existen
-    models.Base.metadata.create_all(bind=engine)
+    actualizar_esquema(engine)
     
     db = SessionLocal()
     try:
@@ -51,6 +57,20 @@ def crear_admin_inicial():
     finally:
         db.close()
 
+def preparar_esquema():
+    """Crea las tablas y aplica los cambios de esquema pendientes, sin crear usuarios"""
+    actualizar_esquema(engine)
+    print("✅ Esquema de la base de datos actualizado")
+
 if __name__ == "__main__":
-    print("🚀 Creando usuario administrador inicial...")
-    crear_admin_inicial()
+    parser = argparse.ArgumentParser(description="Preparar la base de datos y crear el administrador inicial")
+    parser.add_argument("--solo-esquema", action="store_true",
+                        help="Solo crear/actualizar el esquema (paso de despliegue con ESQUEMA_AL_ARRANCAR=false)")
+    args = parser.parse_args()
+
+    if args.solo_esquema:
+        print("🔧 Actualizando el esquema de la base de datos...")
+        preparar_esquema()
+    else:
+        print("🚀 Creando usuario administrador inicial...")
+        crear_admin_inicial()
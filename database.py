@@ -7,7 +7,77 @@ from dotenv import load_dotenv
 load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL")
+# Réplica de solo lectura opcional; si no se configura, las lecturas van a la principal
+DATABASE_READ_URL = os.getenv("DATABASE_READ_URL")
 
-engine = create_engine(DATABASE_URL)
+def opciones_engine(url: str, asincrono: bool = False) -> dict:
+    """
+    Opciones del pool de conexiones, configurables por variables de entorno:
+    DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE,
+    DB_POOL_PRE_PING y DB_STATEMENT_TIMEOUT_MS (solo PostgreSQL).
+    """
+    opciones = {"pool_pre_ping": os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"}
+    if url.startswith("sqlite"):
+        return opciones
+
+    opciones.update(
+        pool_size=int(os.getenv("DB_POOL_SIZE", "5")),
+        max_overflow=int(os.getenv("DB_MAX_OVERFLOW", "10")),
+        pool_timeout=float(os.getenv("DB_POOL_TIMEOUT", "30")),
+        pool_recycle=int(os.getenv("DB_POOL_RECYCLE", "1800")),
+    )
+    statement_timeout = os.getenv("DB_STATEMENT_TIMEOUT_MS")
+    if asincrono and url.startswith("postgresql"):
+        # asyncpg: sin caché de sentencias preparadas para funcionar detrás de PgBouncer/Supavisor
+        opciones["connect_args"] = {"statement_cache_size": int(os.getenv("DB_ASYNC_STATEMENT_CACHE_SIZE", "0"))}
+        if statement_timeout:
+            opciones["connect_args"]["server_settings"] = {"statement_timeout": str(int(statement_timeout))}
+    elif statement_timeout and url.startswith("postgresql"):
+        opciones["connect_args"] = {"options": f"-c statement_timeout={int(statement_timeout)}"}
+    return opciones
+
+engine = create_engine(DATABASE_URL, **opciones_engine(DATABASE_URL))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+read_engine = create_engine(DATABASE_READ_URL, **opciones_engine(DATABASE_READ_URL)) if DATABASE_READ_URL else engine
+# info["replica"] marca las sesiones que pueden leer datos atrasados (ver ProductoService.obtener_cacheado)
+SessionLectura = sessionmaker(autocommit=False, autoflush=False, bind=read_engine,
+                              info={"replica": read_engine is not engine})
+
 Base = declarative_base()
+
+def url_asincrona(url: str) -> str:
+    """Convierte la URL de la base de datos al driver asíncrono (asyncpg o aiosqlite)"""
+    esquema, resto = url.split("://", 1)
+    if esquema in ("postgresql", "postgres", "postgresql+psycopg2"):
+        return f"postgresql+asyncpg://{resto}"
+    if esquema == "sqlite":
+        return f"sqlite+aiosqlite://{resto}"
+    return url
+
+# Motores y sesiones asíncronas (rutas /async); se crean la primera vez que se piden
+_async = {}
+
+def motores_async():
+    """
+    Retorna (async_engine, async_read_engine) para la base principal y la réplica.
+    Requiere sqlalchemy[asyncio] y asyncpg (PostgreSQL) o aiosqlite (SQLite).
+    """
+    if not _async:
+        from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+        def crear(url):
+            url = url_asincrona(url)
+            return create_async_engine(url, **opciones_engine(url, asincrono=True))
+
+        _async["engine"] = crear(DATABASE_URL)
+        _async["read_engine"] = crear(DATABASE_READ_URL) if DATABASE_READ_URL else _async["engine"]
+        _async["sesion"] = async_sessionmaker(_async["engine"], autoflush=False, expire_on_commit=False)
+        _async["lectura"] = async_sessionmaker(_async["read_engine"], autoflush=False, expire_on_commit=False,
+                                               info={"replica": _async["read_engine"] is not _async["engine"]})
+    return _async["engine"], _async["read_engine"]
+
+def sesiones_async():
+    """Retorna (AsyncSessionLocal, AsyncSessionLectura), equivalentes asíncronos de SessionLocal y SessionLectura"""
+    motores_async()
+    return _async["sesion"], _async["lectura"]
@@ -0,0 +1,37 @@
+"""
+Script para importar usuarios de forma masiva desde un archivo CSV o JSONL
+El CSV debe tener encabezado con las columnas de UsuarioCreate
+(username, email, password y opcionalmente is_admin)
+"""
+
+import argparse
+import time
+from database import SessionLocal
+from services.importacion_service import FORMATOS, ImportadorUsuarios, detectar_formato, leer_filas
+
+def importar(ruta: str, formato: str, tamano_lote: int):
+    """Importa el archivo indicado y muestra el resumen"""
+    db = SessionLocal()
+    try:
+        inicio = time.perf_counter()
+        with open(ruta, "rb") as archivo:
+            resultado = ImportadorUsuarios(db, tamano_lote).importar(leer_filas(archivo, formato))
+        duracion = time.perf_counter() - inicio
+
+        print(f"✅ {resultado['insertados']} de {resultado['total_filas']} usuarios importados en {duracion:.1f} s")
+        if resultado["con_error"]:
+            print(f"⚠️  {resultado['con_error']} filas con error:")
+            for error in resultado["errores"]:
+                print(f"   Fila {error['fila']}: {error['error']}")
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Importar usuarios desde CSV o JSONL")
+    parser.add_argument("archivo", help="Ruta del archivo .csv o .jsonl")
+    parser.add_argument("--formato", choices=FORMATOS, help="Formato del archivo (por defecto según la extensión)")
+    parser.add_argument("--lote", type=int, default=500, help="Filas por cada INSERT")
+    args = parser.parse_args()
+
+    print(f"🚀 Importando usuarios desde {args.archivo}...")
+    importar(args.archivo, args.formato or detectar_formato(args.archivo), args.lote)
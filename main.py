@@ -1,19 +1,33 @@
-from fastapi import FastAPI, Depends, HTTPException, UploadFile, File, Cookie
+from fastapi import FastAPI, BackgroundTasks, Depends, HTTPException, UploadFile, File, Cookie, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse, RedirectResponse
+from fastapi.responses import PlainTextResponse, RedirectResponse, StreamingResponse
 from sqlalchemy.orm import Session
-from database import SessionLocal, engine
+from starlette.concurrency import run_in_threadpool
+from pydantic import TypeAdapter
+from database import SessionLectura, SessionLocal, engine, read_engine
 import models, schemas
-import uuid, requests, os
-from dotenv import load_dotenv
-from services.auth_service import auth_service
+import asyncio
+import os
+import tempfile
+from services.auth_service import auth_service, en_hilo_si_bloquea
+from services.cache_service import catalogo_cache
+from services.cambios_service import CambiosService
+from services.eventos_service import difusor_eventos
+from services.estaticos_service import estaticos_service
 from services.producto_service import ProductoService
+from services.respuestas_service import (
+    catalogo_json, pagina_json, respuesta_catalogo, respuesta_comprimida, serializar,
+)
+from services.serializacion_service import filas_json
+from services.imagen_service import imagen_service
+from services.importacion_service import FORMATOS as FORMATOS_IMPORTACION, ImportadorProductos, ImportadorUsuarios, detectar_formato, leer_filas
+from services.metricas_service import MetricasMiddleware, metricas_service
+from services.storage_service import storage_service
 from services.usuario_service import UsuarioService
-from typing import Optional
+from typing import Dict, Optional
 
-load_dotenv()
-models.Base.metadata.create_all(bind=engine)
+# Las variables de .env ya las carga database.py
 
 app = FastAPI()
 
@@ -25,7 +39,26 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Configurar archivos estáticos sin caché para desarrollo
+# Métricas por ruta y de base de datos, expuestas en /metrics
+metricas_service.instrumentar_engine(engine)
+if read_engine is not engine:
+    metricas_service.instrumentar_engine(read_engine)
+metricas_service.agregar_fuente("auth", auth_service.metricas_sesiones)
+metricas_service.agregar_fuente("eventos", difusor_eventos.metricas)
+app.add_middleware(MetricasMiddleware, metricas=metricas_service, rutas=app.routes)
+
+# Modo asíncrono opcional: las mismas rutas de productos y usuarios sobre AsyncSession, en /async
+if os.getenv("DB_ASYNC_HABILITADO", "false").lower() == "true":
+    from database import motores_async
+    from rutas_async import router as router_async
+
+    async_engine, async_read_engine = motores_async()
+    metricas_service.instrumentar_engine(async_engine.sync_engine)
+    if async_read_engine is not async_engine:
+        metricas_service.instrumentar_engine(async_read_engine.sync_engine)
+    app.include_router(router_async)
+
+# Configurar archivos estáticos sin caché para desarrollo (STATIC_MODO=dev)
 class NoCacheStaticFiles(StaticFiles):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -37,22 +70,28 @@ class NoCacheStaticFiles(StaticFiles):
         response.headers["Expires"] = "0"
         return response
 
-app.mount("/static", NoCacheStaticFiles(directory="static"), name="static")
+# En STATIC_MODO=produccion: nombres con huella, caché inmutable y variantes gzip/brotli
+app.mount("/static", estaticos_service.montar(clase_dev=NoCacheStaticFiles), name="static")
 
 @app.get("/")
-def cliente():
-    return FileResponse("static/inventario.html")
+def cliente(request: Request):
+    return estaticos_service.pagina("inventario.html", request)
 
 @app.get("/admin")
-def admin(token: Optional[str] = Cookie(None)):
+def admin(request: Request, token: Optional[str] = Cookie(None)):
     # Verificar si el usuario está autenticado y es admin
     if not token or not auth_service.verify_admin_access(token):
-        return FileResponse("static/login.html")
-    return FileResponse("static/index.html")
+        return estaticos_service.pagina("login.html", request)
+    return estaticos_service.pagina("index.html", request)
 
 @app.get("/login")
-def login_page():
-    return FileResponse("static/login.html")
+def login_page(request: Request):
+    return estaticos_service.pagina("login.html", request)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Métricas en formato de texto de Prometheus"""
+    return PlainTextResponse(metricas_service.exportar(), media_type="text/plain; version=0.0.4")
 
 
 def get_db():
@@ -62,6 +101,17 @@ def get_db():
     finally:
         db.close()
 
+def get_db_lectura():
+    # Rutas de solo lectura: usan la réplica si DATABASE_READ_URL está configurada
+    db = SessionLectura()
+    try:
+        yield db
+    finally:
+        db.close()
+
+_facetas = TypeAdapter(schemas.Facetas)
+_cambios = TypeAdapter(schemas.CambiosProductos)
+
 @app.post("/productos/", response_model=schemas.Producto)
 def crear_producto(producto: schemas.ProductoCreate, token: Optional[str] = Cookie(None), db: Session = Depends(get_db)):
     # Verificar que el usuario sea admin
@@ -72,11 +122,112 @@ def crear_producto(producto: schemas.ProductoCreate, token: Optional[str] = Cook
     producto_service = ProductoService(db)
     return producto_service.crear_producto(producto)
 
+@app.post("/productos/importar", response_model=schemas.ResultadoImportacion)
+def importar_productos(file: UploadFile = File(...), formato: Optional[str] = None, tamano_lote: int = Query(1000, ge=1, le=10000),
+                       token: Optional[str] = Cookie(None), db: Session = Depends(get_db)):
+    """Importar productos desde un archivo CSV o JSONL (solo para admins)"""
+    if not token or not auth_service.verify_admin_access(token):
+        raise HTTPException(status_code=403, detail="Acceso denegado - Solo administradores")
+    
+    try:
+        formato = formato or detectar_formato(file.filename)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if formato not in FORMATOS_IMPORTACION:
+        raise HTTPException(status_code=400, detail=f"Formato no soportado: {formato}")
+    
+    importador = ImportadorProductos(db, tamano_lote)
+    return importador.importar(leer_filas(file.file, formato))
+
 @app.get("/productos/", response_model=list[schemas.Producto])
-def listar_productos(db: Session = Depends(get_db)):
+def listar_productos(
+    request: Request,
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    after: Optional[int] = None,
+    db: Session = Depends(get_db_lectura),
+):
     # Usar el servicio de productos
     producto_service = ProductoService(db)
-    return producto_service.obtener_productos()
+    if limit is None:
+        def cargar_todo():
+            # El cursor de cambios se lee antes que las filas
+            cursor = CambiosService(db).version_actual()
+            return catalogo_json(producto_service.obtener_filas(), cursor)
+        return respuesta_catalogo(request, producto_service, ("productos",), cargar_todo)
+
+    # Paginación por cursor: el cliente pide la siguiente página con ?after=<X-Siguiente-Cursor>
+    return respuesta_catalogo(request, producto_service, ("productos", limit, after), lambda: (
+        pagina_json(producto_service.obtener_filas(limit, after), limit)
+    ))
+
+@app.get("/productos/facetas", response_model=schemas.Facetas)
+def facetas_productos(request: Request, db: Session = Depends(get_db_lectura)):
+    """Marcas y categorías distintas con su número de productos, para los filtros"""
+    producto_service = ProductoService(db)
+    return respuesta_catalogo(request, producto_service, ("facetas",), lambda: (
+        serializar(_facetas, producto_service.obtener_facetas()), {}
+    ))
+
+@app.get("/productos/stream")
+def stream_productos():
+    """Enviar todo el catálogo como NDJSON, una fila por línea, a medida que se lee"""
+    def generar():
+        # La sesión vive lo mismo que la respuesta, no lo que dura el handler
+        db = SessionLectura()
+        try:
+            producto_service = ProductoService(db)
+            for producto in producto_service.iterar_productos():
+                yield schemas.Producto.model_validate(producto).model_dump_json() + "\n"
+        finally:
+            db.close()
+
+    return StreamingResponse(generar(), media_type="application/x-ndjson")
+
+@app.get("/productos/changes", response_model=schemas.CambiosProductos)
+def cambios_productos(request: Request, since: Optional[int] = Query(None, ge=0), limit: int = Query(1000, ge=1, le=10000),
+                      db: Session = Depends(get_db_lectura)):
+    """
+    Productos creados, modificados o eliminados después del cursor `since`.
+    Sin `since` retorna el catálogo completo; el cliente guarda `cursor` para la siguiente llamada.
+    Un cursor anterior a la retención de lápidas (CAMBIOS_RETENCION_DIAS) recibe 410.
+    """
+    cambios = CambiosService(db).obtener_cambios(since, limit)
+    return respuesta_comprimida(request, serializar(_cambios, cambios))
+
+@app.get("/productos/eventos")
+async def eventos_productos():
+    """
+    Cambios del catálogo en tiempo real (Server-Sent Events): eventos "producto"
+    (nuevo o con campos cambiados), "eliminado" y "recargar". Con varios workers
+    se necesita EVENTOS_SONDEO para recibir los cambios hechos en los demás.
+    """
+    if not difusor_eventos.puede_suscribir():
+        raise HTTPException(status_code=503, detail="Demasiadas conexiones de eventos, intenta más tarde")
+    return StreamingResponse(
+        difusor_eventos.suscribir(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+# Las rutas de lote van antes de /productos/{producto_id} para que "lote" no se tome como ID
+
+@app.put("/productos/lote", response_model=list[schemas.ResultadoLote])
+def actualizar_productos_lote(cambios: schemas.ActualizacionLote, token: Optional[str] = Cookie(None), db: Session = Depends(get_db)):
+    """Actualizar varios productos en una sola transacción (solo para admins)"""
+    if not token or not auth_service.verify_admin_access(token):
+        raise HTTPException(status_code=403, detail="Acceso denegado - Solo administradores")
+    
+    producto_service = ProductoService(db)
+    return producto_service.actualizar_productos_lote(cambios.productos)
+
+@app.post("/productos/lote/eliminar", response_model=list[schemas.ResultadoLote])
+def eliminar_productos_lote(eliminacion: schemas.EliminacionLote, token: Optional[str] = Cookie(None), db: Session = Depends(get_db)):
+    """Eliminar varios productos en una sola transacción (solo para admins)"""
+    if not token or not auth_service.verify_admin_access(token):
+        raise HTTPException(status_code=403, detail="Acceso denegado - Solo administradores")
+    
+    producto_service = ProductoService(db)
+    return producto_service.eliminar_productos_lote(eliminacion.ids)
 
 @app.delete("/productos/{producto_id}")
 def eliminar_producto(producto_id: int, token: Optional[str] = Cookie(None), db: Session = Depends(get_db)):
@@ -88,6 +239,24 @@ def eliminar_producto(producto_id: int, token: Optional[str] = Cookie(None), db:
     producto_service = ProductoService(db)
     return producto_service.eliminar_producto(producto_id)
 
+@app.patch("/productos/{producto_id}", response_model=schemas.Producto)
+def actualizar_producto_parcial(producto_id: int, producto: schemas.ProductoUpdate, token: Optional[str] = Cookie(None), db: Session = Depends(get_db)):
+    """Actualizar solo los campos enviados de un producto (solo para admins)"""
+    if not token or not auth_service.verify_admin_access(token):
+        raise HTTPException(status_code=403, detail="Acceso denegado - Solo administradores")
+    
+    producto_service = ProductoService(db)
+    return producto_service.actualizar_producto_parcial(producto_id, producto)
+
+@app.patch("/productos/{producto_id}/stock", response_model=schemas.Producto)
+def ajustar_stock(producto_id: int, ajuste: schemas.AjusteStock, token: Optional[str] = Cookie(None), db: Session = Depends(get_db)):
+    """Sumar o restar unidades al stock de forma atómica (solo para admins)"""
+    if not token or not auth_service.verify_admin_access(token):
+        raise HTTPException(status_code=403, detail="Acceso denegado - Solo administradores")
+    
+    producto_service = ProductoService(db)
+    return producto_service.ajustar_stock(producto_id, ajuste.delta, ajuste.permitir_negativo)
+
 @app.put("/productos/{producto_id}", response_model=schemas.Producto)
 def actualizar_producto(producto_id: int, producto: schemas.ProductoCreate, token: Optional[str] = Cookie(None), db: Session = Depends(get_db)):
     # Verificar que el usuario sea admin
@@ -98,29 +267,89 @@ def actualizar_producto(producto_id: int, producto: schemas.ProductoCreate, toke
     producto_service = ProductoService(db)
     return producto_service.actualizar_producto(producto_id, producto)
 
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_KEY = os.getenv("SUPABASE_KEY")
+def asignar_variantes(imagen_url: str, urls: Dict[str, str]) -> int:
+    db = SessionLocal()
+    try:
+        return ProductoService(db).asignar_variantes(imagen_url, urls)
+    finally:
+        db.close()
 
-@app.post("/upload-imagen/")
-async def upload_imagen(file: UploadFile = File(...)):
-    nombre_archivo = f"{uuid.uuid4()}_{file.filename}"
-    contenido = await file.read()
-
-    headers = {
-        "apikey": SUPABASE_KEY,
-        "Authorization": f"Bearer {SUPABASE_KEY}",
-        "Content-Type": "application/octet-stream"
-    }
+async def guardar_variantes(imagen_url: str, urls: Dict[str, str]) -> int:
+    return await run_in_threadpool(asignar_variantes, imagen_url, urls)
 
-    url = f"{SUPABASE_URL}/storage/v1/object/imagenes/{nombre_archivo}"
+@app.post("/upload-imagen/")
+async def upload_imagen(background_tasks: BackgroundTasks, file: UploadFile = File(...)):
+    # El archivo se envía por bloques con el cliente asíncrono compartido,
+    # así la subida no bloquea el event loop ni el resto de solicitudes
+    import httpx  # Se importa con la primera subida, no al arrancar
 
-    resp = requests.post(url, headers=headers, data=contenido)
-    if resp.status_code in [200, 201]:
-        imagen_url = f"{SUPABASE_URL}/storage/v1/object/public/imagenes/{nombre_archivo}"
-        return {"url": imagen_url}
-    else:
+    nombre_archivo = storage_service.nombre_unico(file.filename)
+    copia = tempfile.NamedTemporaryFile(delete=False) if imagen_service.variantes else None
+    try:
+        imagen_url = await storage_service.subir_upload(file, nombre_archivo, copia)
+    except httpx.HTTPError as e:
+        print(f"Error al subir imagen: {e}")
+        if copia is not None:
+            copia.close()
+            os.unlink(copia.name)
         raise HTTPException(status_code=500, detail="Error al subir la imagen")
 
+    if copia is not None:
+        # Las variantes se generan después de responder, en el pool de procesos, y
+        # sus URLs se guardan en los productos que usan esta imagen cuando ya existen
+        copia.close()
+        background_tasks.add_task(imagen_service.procesar, nombre_archivo, copia.name, guardar_variantes)
+    return {"url": imagen_url}
+
+@app.on_event("startup")
+def preparar_esquema():
+    """
+    Crea y actualiza el esquema al arrancar cada worker (ESQUEMA_AL_ARRANCAR=true, por defecto).
+
+    En producción conviene desactivarlo y ejecutar una sola vez `python crear_admin.py --solo-esquema`
+    en cada despliegue: así el worker no se conecta ni inspecciona las tablas antes de recibir tráfico.
+    """
+    if os.getenv("ESQUEMA_AL_ARRANCAR", "true").lower() == "true":
+        from services.esquema_service import actualizar_esquema
+        actualizar_esquema(engine)
+
+def purgar_cambios():
+    db = SessionLocal()
+    try:
+        CambiosService(db).purgar()
+    finally:
+        db.close()
+
+async def mantener_cambios(intervalo: int):
+    while True:
+        await asyncio.sleep(intervalo)
+        try:
+            await run_in_threadpool(purgar_cambios)
+        except Exception:
+            pass  # CambiosService.purgar ya registró el error; se reintenta en el siguiente intervalo
+
+@app.on_event("startup")
+async def programar_mantenimiento_cambios():
+    """
+    Consolida la secuencia de cambios y purga las lápidas vencidas cada
+    CAMBIOS_PURGA_INTERVALO segundos (0 lo desactiva). Cada worker lo ejecuta; la
+    purga es idempotente.
+    """
+    intervalo = int(os.getenv("CAMBIOS_PURGA_INTERVALO", "60"))
+    if intervalo > 0:
+        app.state.mantenimiento_cambios = asyncio.create_task(mantener_cambios(intervalo))
+
+@app.on_event("shutdown")
+async def cerrar_conexiones():
+    if getattr(app.state, "mantenimiento_cambios", None) is not None:
+        app.state.mantenimiento_cambios.cancel()
+    imagen_service.cerrar()
+    await storage_service.cerrar()
+    if "async_engine" in globals():
+        await async_engine.dispose()
+        if async_read_engine is not async_engine:
+            await async_read_engine.dispose()
+
 # ============ RUTAS DE AUTENTICACIÓN ============
 
 @app.post("/auth/register", response_model=schemas.Usuario)
@@ -130,10 +359,10 @@ def registrar_usuario(usuario: schemas.UsuarioCreate, db: Session = Depends(get_
     return usuario_service.crear_usuario(usuario)
 
 @app.post("/auth/login")
-def login(credentials: schemas.UsuarioLogin, db: Session = Depends(get_db)):
-    """Autenticar usuario y crear sesión"""
+async def login(credentials: schemas.UsuarioLogin, db: Session = Depends(get_db)):
+    """Autenticar usuario y crear sesión (async: la espera del hash no ocupa un hilo del threadpool)"""
     usuario_service = UsuarioService(db)
-    user = usuario_service.validar_credenciales(credentials.username, credentials.password)
+    user = await usuario_service.validar_credenciales_async(credentials.username, credentials.password)
     
     if not user:
         raise HTTPException(status_code=401, detail="Credenciales incorrectas")
@@ -146,7 +375,7 @@ def login(credentials: schemas.UsuarioLogin, db: Session = Depends(get_db)):
         "is_admin": user.is_admin
     }
     
-    token = auth_service.create_session(user_data)
+    token = await en_hilo_si_bloquea(auth_service.create_session, user_data)
     
     # Crear respuesta JSON con cookie
     from fastapi.responses import JSONResponse
@@ -182,32 +411,61 @@ def get_current_user(token: Optional[str] = Cookie(None)):
     
     return user_data
 
+@app.get("/auth/sesiones/metricas")
+def metricas_sesiones(token: Optional[str] = Cookie(None)):
+    """Métricas del almacén de sesiones (solo para admins)"""
+    if not token or not auth_service.verify_admin_access(token):
+        raise HTTPException(status_code=403, detail="Acceso denegado - Solo administradores")
+    
+    return auth_service.metricas_sesiones()
+
 @app.get("/usuarios/", response_model=list[schemas.Usuario])
-def listar_usuarios(token: Optional[str] = Cookie(None), db: Session = Depends(get_db)):
+def listar_usuarios(request: Request, token: Optional[str] = Cookie(None), db: Session = Depends(get_db_lectura)):
     """Listar todos los usuarios (solo para admins)"""
     if not token or not auth_service.verify_admin_access(token):
         raise HTTPException(status_code=403, detail="Acceso denegado - Solo administradores")
     
     usuario_service = UsuarioService(db)
-    return usuario_service.obtener_usuarios()
+    return respuesta_comprimida(request, filas_json(schemas.Usuario, usuario_service.obtener_filas()))
+
+@app.post("/usuarios/importar", response_model=schemas.ResultadoImportacion)
+def importar_usuarios(file: UploadFile = File(...), formato: Optional[str] = None, tamano_lote: int = Query(500, ge=1, le=5000),
+                      token: Optional[str] = Cookie(None), db: Session = Depends(get_db)):
+    """Importar usuarios desde un archivo CSV o JSONL (solo para admins)"""
+    if not token or not auth_service.verify_admin_access(token):
+        raise HTTPException(status_code=403, detail="Acceso denegado - Solo administradores")
+    
+    try:
+        formato = formato or detectar_formato(file.filename)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if formato not in FORMATOS_IMPORTACION:
+        raise HTTPException(status_code=400, detail=f"Formato no soportado: {formato}")
+    
+    importador = ImportadorUsuarios(db, tamano_lote)
+    return importador.importar(leer_filas(file.file, formato))
 
 # ============ RUTAS ADICIONALES PARA APROVECHAR LOS SERVICIOS ============
 
 @app.get("/productos/categoria/{categoria}", response_model=list[schemas.Producto])
-def buscar_productos_por_categoria(categoria: str, db: Session = Depends(get_db)):
+def buscar_productos_por_categoria(categoria: str, request: Request, db: Session = Depends(get_db_lectura)):
     """Buscar productos por categoría"""
     producto_service = ProductoService(db)
-    return producto_service.buscar_productos_por_categoria(categoria)
+    return respuesta_catalogo(request, producto_service, ("categoria", categoria), lambda: (
+        filas_json(schemas.Producto, producto_service.buscar_filas("categoria", categoria)), {}
+    ))
 
 @app.get("/productos/marca/{marca}", response_model=list[schemas.Producto])
-def buscar_productos_por_marca(marca: str, db: Session = Depends(get_db)):
+def buscar_productos_por_marca(marca: str, request: Request, db: Session = Depends(get_db_lectura)):
     """Buscar productos por marca"""
     producto_service = ProductoService(db)
-    return producto_service.buscar_productos_por_marca(marca)
+    return respuesta_catalogo(request, producto_service, ("marca", marca), lambda: (
+        filas_json(schemas.Producto, producto_service.buscar_filas("marca", marca)), {}
+    ))
 
 @app.get("/productos/stock-bajo", response_model=list[schemas.Producto])
-def productos_stock_bajo(limite: int = 5, token: Optional[str] = Cookie(None), db: Session = Depends(get_db)):
-    """Obtener productos con stock bajo (solo para admins)"""
+def productos_stock_bajo(limite: Optional[int] = Query(None, ge=0), token: Optional[str] = Cookie(None), db: Session = Depends(get_db_lectura)):
+    """Obtener productos con stock bajo (solo para admins); sin `limite` se usa el stock mínimo de cada producto"""
     if not token or not auth_service.verify_admin_access(token):
         raise HTTPException(status_code=403, detail="Acceso denegado - Solo administradores")
     
@@ -215,12 +473,12 @@ def productos_stock_bajo(limite: int = 5, token: Optional[str] = Cookie(None), d
     return producto_service.verificar_stock_bajo(limite)
 
 @app.get("/usuarios/administradores", response_model=list[schemas.Usuario])
-def listar_administradores(token: Optional[str] = Cookie(None), db: Session = Depends(get_db)):
+def listar_administradores(request: Request, token: Optional[str] = Cookie(None), db: Session = Depends(get_db_lectura)):
     """Listar usuarios administradores (solo para admins)"""
     if not token or not auth_service.verify_admin_access(token):
         raise HTTPException(status_code=403, detail="Acceso denegado - Solo administradores")
     
     usuario_service = UsuarioService(db)
-    return usuario_service.obtener_administradores()
+    return respuesta_comprimida(request, filas_json(schemas.Usuario, usuario_service.obtener_filas(solo_admins=True)))
 
 
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean
+from sqlalchemy import BigInteger, Column, Integer, String, Boolean, DateTime, Float, Index
 from database import Base
 
 class Producto(Base):
@@ -6,11 +6,54 @@ class Producto(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     nombre = Column(String, index=True)
-    cantidad = Column(Integer)
+    cantidad = Column(Integer, index=True)
+    # Umbral de alerta propio de cada producto (ver ix_productos_stock_bajo)
+    stock_minimo = Column(Integer, nullable=False, default=5, server_default="5")
     descripcion = Column(String)
     marca = Column(String)
     categoria = Column(String)
     imagen_url = Column(String)
+    imagen_thumb_url = Column(String, nullable=True)
+    imagen_webp_url = Column(String, nullable=True)
+    imagen_avif_url = Column(String, nullable=True)
+    # Número de cambio en que se creó o modificó por última vez (ver services/cambios_service.py)
+    version = Column(BigInteger, nullable=False, default=0, server_default="0", index=True)
+
+    # Índice parcial con solo los productos en stock bajo: la base de datos lo mantiene
+    # en cada INSERT/UPDATE y la consulta de stock bajo no recorre todo el catálogo
+    __table_args__ = (
+        Index(
+            "ix_productos_stock_bajo", "id",
+            postgresql_where=cantidad <= stock_minimo,
+            sqlite_where=cantidad <= stock_minimo,
+        ),
+    )
+
+class ProductoEliminado(Base):
+    """Lápida de un producto eliminado, para que la sincronización incremental informe el borrado"""
+    __tablename__ = "productos_eliminados"
+
+    producto_id = Column(Integer, primary_key=True)
+    version = Column(BigInteger, nullable=False, index=True)
+    eliminado_en = Column(DateTime, index=True)
+
+class CambioCatalogo(Base):
+    """Número de cambio reservado por una transacción de escritura del catálogo"""
+    __tablename__ = "cambios_catalogo"
+
+    # Autoincremental: cada escritura inserta su propia fila y no espera a las demás.
+    # En SQLite AUTOINCREMENT evita que se reutilicen números al purgar filas
+    version = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
+    registrado_en = Column(DateTime, nullable=False)
+
+    __table_args__ = {"sqlite_autoincrement": True}
+
+class SecuenciaCambios(Base):
+    """Marcas de la secuencia de cambios: hasta dónde está consolidada y hasta dónde se purgaron las lápidas"""
+    __tablename__ = "secuencia_cambios"
+
+    nombre = Column(String, primary_key=True)
+    valor = Column(BigInteger, nullable=False, default=0)
 
 class Usuario(Base):
     __tablename__ = "usuarios"
@@ -20,3 +63,22 @@ class Usuario(Base):
     email = Column(String, unique=True, index=True)
     password = Column(String)
     is_admin = Column(Boolean, default=False)
+
+class Sesion(Base):
+    __tablename__ = "sesiones"
+
+    token = Column(String, primary_key=True)
+    user_id = Column(Integer, index=True)
+    username = Column(String)
+    is_admin = Column(Boolean, default=False)
+    created_at = Column(DateTime)
+    expira = Column(Float, index=True)
+
+class TokenRevocado(Base):
+    """Tokens firmados cerrados con logout antes de vencer (TOKEN_REVOCACION=sql)"""
+    __tablename__ = "tokens_revocados"
+
+    # El id creciente permite a cada worker pedir solo las revocaciones nuevas
+    id = Column(Integer, primary_key=True)
+    jti = Column(String, nullable=False, unique=True)
+    expira = Column(Float, nullable=False, index=True)
@@ -0,0 +1,166 @@
+"""
+Rutas asíncronas de productos y usuarios, montadas en /async cuando DB_ASYNC_HABILITADO=true.
+
+Son las mismas rutas de main.py pero sobre AsyncSession: mientras esperan a la
+base de datos no ocupan un hilo del threadpool de Starlette, así que la
+concurrencia la limita el pool de conexiones y no el número de hilos.
+"""
+
+from fastapi import APIRouter, Cookie, Depends, HTTPException, Query, Request
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import sesiones_async
+import schemas
+from services.auth_service import auth_service, en_hilo_si_bloquea
+from services.cambios_service import version_actual_async
+from services.producto_service_async import ProductoServiceAsync
+from services.respuestas_service import (
+    catalogo_json, pagina_json, respuesta_catalogo_async as respuesta_catalogo, respuesta_comprimida, serializar,
+)
+from services.serializacion_service import filas_json
+from services.usuario_service_async import UsuarioServiceAsync
+from typing import Optional
+
+router = APIRouter(prefix="/async")
+
+async def get_db_async():
+    AsyncSessionLocal, _ = sesiones_async()
+    async with AsyncSessionLocal() as db:
+        yield db
+
+async def get_db_lectura_async():
+    # Rutas de solo lectura: usan la réplica si DATABASE_READ_URL está configurada
+    _, AsyncSessionLectura = sesiones_async()
+    async with AsyncSessionLectura() as db:
+        yield db
+
+async def verificar_admin(token: Optional[str]):
+    if not token or not await en_hilo_si_bloquea(auth_service.verify_admin_access, token):
+        raise HTTPException(status_code=403, detail="Acceso denegado - Solo administradores")
+
+_facetas = TypeAdapter(schemas.Facetas)
+
+# ============ PRODUCTOS ============
+
+@router.post("/productos/", response_model=schemas.Producto)
+async def crear_producto(producto: schemas.ProductoCreate, token: Optional[str] = Cookie(None), db: AsyncSession = Depends(get_db_async)):
+    await verificar_admin(token)
+    return await ProductoServiceAsync(db).crear_producto(producto)
+
+@router.get("/productos/", response_model=list[schemas.Producto])
+async def listar_productos(
+    request: Request,
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    after: Optional[int] = None,
+    db: AsyncSession = Depends(get_db_lectura_async),
+):
+    producto_service = ProductoServiceAsync(db)
+    if limit is None:
+        async def cargar_todo():
+            # El cursor de cambios se lee antes que las filas, igual que en main.py
+            cursor = await version_actual_async(db)
+            return catalogo_json(await producto_service.obtener_filas(), cursor)
+        return await respuesta_catalogo(request, producto_service, ("productos",), cargar_todo)
+
+    async def cargar_pagina():
+        return pagina_json(await producto_service.obtener_filas(limit, after), limit)
+
+    return await respuesta_catalogo(request, producto_service, ("productos", limit, after), cargar_pagina)
+
+@router.get("/productos/facetas", response_model=schemas.Facetas)
+async def facetas_productos(request: Request, db: AsyncSession = Depends(get_db_lectura_async)):
+    """Marcas y categorías distintas con su número de productos, para los filtros"""
+    producto_service = ProductoServiceAsync(db)
+
+    async def cargar():
+        return serializar(_facetas, await producto_service.obtener_facetas()), {}
+    return await respuesta_catalogo(request, producto_service, ("facetas",), cargar)
+
+@router.get("/productos/stock-bajo", response_model=list[schemas.Producto])
+async def productos_stock_bajo(limite: Optional[int] = Query(None, ge=0), token: Optional[str] = Cookie(None), db: AsyncSession = Depends(get_db_lectura_async)):
+    """Obtener productos con stock bajo (solo para admins); sin `limite` se usa el stock mínimo de cada producto"""
+    await verificar_admin(token)
+    return await ProductoServiceAsync(db).verificar_stock_bajo(limite)
+
+@router.get("/productos/categoria/{categoria}", response_model=list[schemas.Producto])
+async def buscar_productos_por_categoria(categoria: str, request: Request, db: AsyncSession = Depends(get_db_lectura_async)):
+    """Buscar productos por categoría"""
+    producto_service = ProductoServiceAsync(db)
+
+    async def cargar():
+        return filas_json(schemas.Producto, await producto_service.buscar_filas("categoria", categoria)), {}
+    return await respuesta_catalogo(request, producto_service, ("categoria", categoria), cargar)
+
+@router.get("/productos/marca/{marca}", response_model=list[schemas.Producto])
+async def buscar_productos_por_marca(marca: str, request: Request, db: AsyncSession = Depends(get_db_lectura_async)):
+    """Buscar productos por marca"""
+    producto_service = ProductoServiceAsync(db)
+
+    async def cargar():
+        return filas_json(schemas.Producto, await producto_service.buscar_filas("marca", marca)), {}
+    return await respuesta_catalogo(request, producto_service, ("marca", marca), cargar)
+
+@router.delete("/productos/{producto_id}")
+async def eliminar_producto(producto_id: int, token: Optional[str] = Cookie(None), db: AsyncSession = Depends(get_db_async)):
+    await verificar_admin(token)
+    return await ProductoServiceAsync(db).eliminar_producto(producto_id)
+
+@router.patch("/productos/{producto_id}", response_model=schemas.Producto)
+async def actualizar_producto_parcial(producto_id: int, producto: schemas.ProductoUpdate, token: Optional[str] = Cookie(None), db: AsyncSession = Depends(get_db_async)):
+    """Actualizar solo los campos enviados de un producto (solo para admins)"""
+    await verificar_admin(token)
+    return await ProductoServiceAsync(db).actualizar_producto_parcial(producto_id, producto)
+
+@router.patch("/productos/{producto_id}/stock", response_model=schemas.Producto)
+async def ajustar_stock(producto_id: int, ajuste: schemas.AjusteStock, token: Optional[str] = Cookie(None), db: AsyncSession = Depends(get_db_async)):
+    """Sumar o restar unidades al stock de forma atómica (solo para admins)"""
+    await verificar_admin(token)
+    return await ProductoServiceAsync(db).ajustar_stock(producto_id, ajuste.delta, ajuste.permitir_negativo)
+
+@router.put("/productos/{producto_id}", response_model=schemas.Producto)
+async def actualizar_producto(producto_id: int, producto: schemas.ProductoCreate, token: Optional[str] = Cookie(None), db: AsyncSession = Depends(get_db_async)):
+    await verificar_admin(token)
+    return await ProductoServiceAsync(db).actualizar_producto(producto_id, producto)
+
+# ============ AUTENTICACIÓN Y USUARIOS ============
+
+@router.post("/auth/register", response_model=schemas.Usuario)
+async def registrar_usuario(usuario: schemas.UsuarioCreate, db: AsyncSession = Depends(get_db_async)):
+    """Registrar un nuevo usuario"""
+    return await UsuarioServiceAsync(db).crear_usuario(usuario)
+
+@router.post("/auth/login")
+async def login(credentials: schemas.UsuarioLogin, db: AsyncSession = Depends(get_db_async)):
+    """Autenticar usuario y crear sesión"""
+    user = await UsuarioServiceAsync(db).validar_credenciales(credentials.username, credentials.password)
+    if not user:
+        raise HTTPException(status_code=401, detail="Credenciales incorrectas")
+
+    user_data = {
+        "id": user.id,
+        "username": user.username,
+        "email": user.email,
+        "is_admin": user.is_admin
+    }
+    token = await en_hilo_si_bloquea(auth_service.create_session, user_data)
+
+    response = JSONResponse(content={
+        "message": "Login exitoso",
+        "user": user_data,
+        "redirect_url": "/admin" if user_data["is_admin"] else "/"
+    })
+    response.set_cookie(key="token", value=token, httponly=True, max_age=86400)  # 24 horas
+    return response
+
+@router.get("/usuarios/", response_model=list[schemas.Usuario])
+async def listar_usuarios(request: Request, token: Optional[str] = Cookie(None), db: AsyncSession = Depends(get_db_lectura_async)):
+    """Listar todos los usuarios (solo para admins)"""
+    await verificar_admin(token)
+    return respuesta_comprimida(request, filas_json(schemas.Usuario, await UsuarioServiceAsync(db).obtener_filas()))
+
+@router.get("/usuarios/administradores", response_model=list[schemas.Usuario])
+async def listar_administradores(request: Request, token: Optional[str] = Cookie(None), db: AsyncSession = Depends(get_db_lectura_async)):
+    """Listar usuarios administradores (solo para admins)"""
+    await verificar_admin(token)
+    return respuesta_comprimida(request, filas_json(schemas.Usuario, await UsuarioServiceAsync(db).obtener_filas(solo_admins=True)))
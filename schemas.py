@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 class ProductoBase(BaseModel):
     nombre: str
@@ -6,17 +6,76 @@ class ProductoBase(BaseModel):
     descripcion: str
     marca: str
     categoria: str
+    stock_minimo: int = Field(5, ge=0)
     imagen_url: str | None = None
+    imagen_thumb_url: str | None = None
+    imagen_webp_url: str | None = None
+    imagen_avif_url: str | None = None
 
 class ProductoCreate(ProductoBase):
     pass
 
 class Producto(ProductoBase):
     id: int
+    version: int = 0
 
     class Config:
         from_attributes = True
 
+class ProductoUpdate(BaseModel):
+    nombre: str | None = None
+    cantidad: int | None = None
+    descripcion: str | None = None
+    marca: str | None = None
+    categoria: str | None = None
+    stock_minimo: int | None = Field(None, ge=0)
+    imagen_url: str | None = None
+    imagen_thumb_url: str | None = None
+    imagen_webp_url: str | None = None
+    imagen_avif_url: str | None = None
+
+class ProductoUpdateLote(ProductoUpdate):
+    id: int
+
+class ActualizacionLote(BaseModel):
+    productos: list[ProductoUpdateLote] = Field(max_length=1000)
+
+class EliminacionLote(BaseModel):
+    ids: list[int] = Field(max_length=1000)
+
+class ResultadoLote(BaseModel):
+    id: int
+    ok: bool
+    error: str | None = None
+
+class CambiosProductos(BaseModel):
+    cursor: int
+    hay_mas: bool
+    productos: list[Producto]
+    eliminados: list[int]
+
+class AjusteStock(BaseModel):
+    delta: int
+    permitir_negativo: bool = False
+
+class Faceta(BaseModel):
+    valor: str
+    cantidad: int
+
+class Facetas(BaseModel):
+    marcas: list[Faceta]
+    categorias: list[Faceta]
+
+class ErrorImportacion(BaseModel):
+    fila: int
+    error: str
+
+class ResultadoImportacion(BaseModel):
+    total_filas: int
+    insertados: int
+    con_error: int
+    errores: list[ErrorImportacion]
+
 class UsuarioBase(BaseModel):
     username: str
     email: str
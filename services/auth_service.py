@@ -1,62 +1,415 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Optional
+from fastapi import HTTPException
+from starlette.concurrency import run_in_threadpool
+from typing import Any, Callable, List, Optional, Tuple
+import asyncio
+import base64
 import hashlib
+import hmac
+import json
+import os
 import secrets
+import threading
+import time
+from services.revocacion_store import RevocacionTokens, crear_revocacion
+from services.session_store import MemorySessionStore, SessionStore, crear_session_store
+
+# Parámetros de scrypt (ver calibrar_kdf.py para elegir N según la latencia deseada)
+SCRYPT_N = int(os.getenv("PASSWORD_SCRYPT_N", str(2 ** 14)))
+SCRYPT_R = int(os.getenv("PASSWORD_SCRYPT_R", "8"))
+SCRYPT_P = int(os.getenv("PASSWORD_SCRYPT_P", "1"))
+
+# Hilos que calculan hashes a la vez (scrypt libera el GIL) y cuántas
+# solicitudes pueden esperar turno antes de responder 503
+KDF_HILOS = int(os.getenv("PASSWORD_KDF_HILOS", "4"))
+KDF_MAX_PENDIENTES = int(os.getenv("PASSWORD_KDF_MAX_PENDIENTES", "16"))
+KDF_ESPERA_MAXIMA = float(os.getenv("PASSWORD_KDF_ESPERA", "2"))
+
+_kdf_pool = ThreadPoolExecutor(max_workers=KDF_HILOS, thread_name_prefix="kdf")
+
+class _CupoKDF:
+    """
+    Cupo de cálculos de KDF en curso o en espera, compartido por las llamadas
+    síncronas y async.
+
+    Quien no encuentra lugar se forma en una cola FIFO y el que libera un cupo se
+    lo entrega directamente al primero de la fila (un hilo esperando un Event o
+    una corrutina esperando un futuro), así que nadie sondea ni se adelanta.
+    """
+
+    def __init__(self, maximo: int):
+        self._libres = maximo
+        self._lock = threading.Lock()
+        self._fila: deque = deque()
+
+    def _formarse(self, despertar: Callable[[], None]) -> Optional[dict]:
+        """Toma un cupo libre (None) o deja un turno en la fila"""
+        with self._lock:
+            if self._libres > 0 and not self._fila:
+                self._libres -= 1
+                return None
+            turno = {"despertar": despertar, "asignado": False}
+            self._fila.append(turno)
+            return turno
+
+    def _retirar(self, turno: dict) -> bool:
+        """Saca de la fila un turno que dejó de esperar; True si alcanzó a recibir el cupo"""
+        with self._lock:
+            if turno["asignado"]:
+                return True
+            self._fila.remove(turno)
+            return False
+
+    def tomar(self, timeout: Optional[float]) -> bool:
+        """Espera un cupo bloqueando el hilo actual (timeout=None espera sin límite)"""
+        evento = threading.Event()
+        turno = self._formarse(evento.set)
+        return turno is None or evento.wait(timeout) or self._retirar(turno)
+
+    async def tomar_async(self, timeout: float) -> bool:
+        """Espera un cupo desde el event loop sin bloquearlo"""
+        loop = asyncio.get_running_loop()
+        futuro = loop.create_future()
+        turno = self._formarse(lambda: _despertar(loop, futuro))
+        if turno is None:
+            return True
+        try:
+            await asyncio.wait({futuro}, timeout=timeout)
+        except asyncio.CancelledError:
+            if self._retirar(turno):
+                self.liberar()
+            raise
+        return self._retirar(turno)
+
+    def liberar(self):
+        """Devuelve un cupo, entregándolo al primero de la fila si hay alguien esperando"""
+        with self._lock:
+            if not self._fila:
+                self._libres += 1
+                return
+            turno = self._fila.popleft()
+            turno["asignado"] = True
+        turno["despertar"]()
+
+def _despertar(loop: asyncio.AbstractEventLoop, futuro: asyncio.Future):
+    try:
+        loop.call_soon_threadsafe(_resolver, futuro)
+    except RuntimeError:
+        pass  # la espera ya terminó y su loop se cerró; el cupo lo tomó al retirarse
+
+def _resolver(futuro: asyncio.Future):
+    if not futuro.done():
+        futuro.set_result(None)
+
+_kdf_pendientes = _CupoKDF(KDF_MAX_PENDIENTES)
+
+def scrypt_hash(password: str, salt: bytes, n: int, r: int, p: int) -> bytes:
+    """Deriva la llave de una contraseña con scrypt"""
+    return hashlib.scrypt(
+        password.encode(), salt=salt, n=n, r=r, p=p,
+        maxmem=128 * r * (n + p + 2) + 1024 * 1024, dklen=32,
+    )
+
+def _b64(datos: bytes) -> str:
+    return base64.b64encode(datos).decode()
+
+def _b64url(datos: bytes) -> str:
+    return base64.urlsafe_b64encode(datos).rstrip(b"=").decode()
+
+def _desde_b64url(texto: str) -> bytes:
+    return base64.urlsafe_b64decode(texto + "=" * (-len(texto) % 4))
 
 class PasswordManager:
-    """Clase para gestionar el hash y verificación de contraseñas"""
+    """
+    Clase para gestionar el hash y verificación de contraseñas.
+    
+    Usa scrypt con sal aleatoria, en el formato "scrypt$N$r$p$sal$hash". Los
+    cálculos corren en un pool de hilos acotado para que una ráfaga de logins no
+    acapare los hilos que atienden el resto de solicitudes; las rutas async usan
+    las variantes *_async, que esperan el cálculo desde el event loop sin ocupar
+    ningún otro hilo. Los hashes MD5 antiguos se siguen aceptando y se reemplazan
+    en el siguiente login.
+    """
+    
+    @staticmethod
+    def _en_pool(funcion, *args):
+        """Ejecuta un cálculo de KDF en el pool, rechazando si hay demasiados en espera"""
+        if not _kdf_pendientes.tomar(KDF_ESPERA_MAXIMA):
+            raise HTTPException(status_code=503, detail="Servidor ocupado, intenta de nuevo")
+        try:
+            return _kdf_pool.submit(funcion, *args).result()
+        finally:
+            _kdf_pendientes.liberar()
+
+    @staticmethod
+    async def _en_pool_async(funcion, *args):
+        """Igual que _en_pool, pero la espera no bloquea el event loop ni ocupa un hilo del servidor"""
+        if not await _kdf_pendientes.tomar_async(KDF_ESPERA_MAXIMA):
+            raise HTTPException(status_code=503, detail="Servidor ocupado, intenta de nuevo")
+        return await asyncio.wrap_future(PasswordManager._enviar_con_cupo(funcion, *args))
+
+    @staticmethod
+    def _enviar_con_cupo(funcion, *args):
+        """Envía al pool un cálculo que ya tiene cupo; el cupo se libera al terminar, aunque nadie espere el resultado"""
+        try:
+            futuro = _kdf_pool.submit(funcion, *args)
+        except Exception:
+            _kdf_pendientes.liberar()
+            raise
+        futuro.add_done_callback(lambda _: _kdf_pendientes.liberar())
+        return futuro
     
     @staticmethod
     def hash_password(password: str) -> str:
         """Genera un hash de la contraseña"""
-        # Para simplicidad usamos MD5, en producción usaría bcrypt
-        return hashlib.md5(password.encode()).hexdigest()
-    
+        salt = secrets.token_bytes(16)
+        llave = PasswordManager._en_pool(scrypt_hash, password, salt, SCRYPT_N, SCRYPT_R, SCRYPT_P)
+        return f"scrypt${SCRYPT_N}${SCRYPT_R}${SCRYPT_P}${_b64(salt)}${_b64(llave)}"
+
+    @staticmethod
+    async def hash_password_async(password: str) -> str:
+        """Igual que hash_password, para rutas async"""
+        salt = secrets.token_bytes(16)
+        llave = await PasswordManager._en_pool_async(scrypt_hash, password, salt, SCRYPT_N, SCRYPT_R, SCRYPT_P)
+        return f"scrypt${SCRYPT_N}${SCRYPT_R}${SCRYPT_P}${_b64(salt)}${_b64(llave)}"
+
+    @staticmethod
+    def hash_passwords(passwords: List[str]) -> List[str]:
+        """
+        Genera los hashes de muchas contraseñas en paralelo (importación masiva).
+
+        Nunca deja más de KDF_HILOS cálculos en la cola del pool y cada uno toma su
+        lugar en el mismo cupo que los logins: los que llegan mientras tanto se
+        forman en la fila entre un hash y otro en vez de esperar todo el lote.
+
+        Args:
+            passwords (List[str]): Contraseñas en texto plano
+
+        Returns:
+            List[str]: Hashes en el mismo orden
+        """
+        hashes: List[str] = []
+        pendientes = deque()
+        for password in passwords:
+            if len(pendientes) >= KDF_HILOS:
+                hashes.append(PasswordManager._formato_scrypt(*pendientes.popleft()))
+            salt = secrets.token_bytes(16)
+            _kdf_pendientes.tomar(None)
+            pendientes.append((salt, PasswordManager._enviar_con_cupo(scrypt_hash, password, salt, SCRYPT_N, SCRYPT_R, SCRYPT_P)))
+        while pendientes:
+            hashes.append(PasswordManager._formato_scrypt(*pendientes.popleft()))
+        return hashes
+
+    @staticmethod
+    def _formato_scrypt(salt: bytes, futuro) -> str:
+        return f"scrypt${SCRYPT_N}${SCRYPT_R}${SCRYPT_P}${_b64(salt)}${_b64(futuro.result())}"
+
+    @staticmethod
+    def _verificacion_directa(password: str, hashed_password: str) -> Optional[bool]:
+        """Resultado de los casos que no requieren scrypt (hash vacío o MD5); None si hay que calcularlo"""
+        if not hashed_password:
+            return False
+        if not hashed_password.startswith("scrypt$"):
+            # Hash MD5 de versiones anteriores
+            return hmac.compare_digest(hashlib.md5(password.encode()).hexdigest(), hashed_password)
+        return None
+
+    @staticmethod
+    def _parametros_scrypt(hashed_password: str) -> Tuple[bytes, int, int, int, bytes]:
+        """(sal, N, r, p, llave esperada) de un hash scrypt; ValueError si está mal formado"""
+        _, n, r, p, salt, esperado = hashed_password.split("$")
+        return base64.b64decode(salt), int(n), int(r), int(p), base64.b64decode(esperado)
+
     @staticmethod
     def verify_password(password: str, hashed_password: str) -> bool:
         """Verifica si la contraseña coincide con el hash"""
-        return hashlib.md5(password.encode()).hexdigest() == hashed_password
+        directa = PasswordManager._verificacion_directa(password, hashed_password)
+        if directa is not None:
+            return directa
+        try:
+            salt, n, r, p, esperado = PasswordManager._parametros_scrypt(hashed_password)
+            llave = PasswordManager._en_pool(scrypt_hash, password, salt, n, r, p)
+        except (ValueError, TypeError):
+            return False
+        return hmac.compare_digest(llave, esperado)
+
+    @staticmethod
+    async def verify_password_async(password: str, hashed_password: str) -> bool:
+        """Igual que verify_password, para rutas async"""
+        directa = PasswordManager._verificacion_directa(password, hashed_password)
+        if directa is not None:
+            return directa
+        try:
+            salt, n, r, p, esperado = PasswordManager._parametros_scrypt(hashed_password)
+            llave = await PasswordManager._en_pool_async(scrypt_hash, password, salt, n, r, p)
+        except (ValueError, TypeError):
+            return False
+        return hmac.compare_digest(llave, esperado)
+    
+    @staticmethod
+    def needs_rehash(hashed_password: str) -> bool:
+        """Indica si el hash usa un algoritmo o parámetros distintos a los configurados"""
+        return not (hashed_password or "").startswith(f"scrypt${SCRYPT_N}${SCRYPT_R}${SCRYPT_P}$")
 
 class TokenManager:
     """Clase para gestionar tokens de sesión"""
     
-    def __init__(self):
-        self.active_tokens = {}  # token -> user_data
+    # Token válido por 24 horas
+    DURACION_SESION = timedelta(hours=24)
+    
+    def __init__(self, store: Optional[SessionStore] = None):
+        # token -> user_data, en el backend configurado con SESSION_BACKEND
+        self.store = store or crear_session_store()
     
     def create_token(self, user_id: int, username: str, is_admin: bool) -> str:
         """Crea un token de sesión para el usuario"""
         token = secrets.token_urlsafe(32)
-        self.active_tokens[token] = {
+        self.store.guardar(token, {
             "user_id": user_id,
             "username": username,
             "is_admin": is_admin,
             "created_at": datetime.now()
-        }
+        }, self.DURACION_SESION.total_seconds())
         return token
     
     def validate_token(self, token: str) -> Optional[dict]:
         """Valida un token y retorna los datos del usuario"""
-        if token in self.active_tokens:
-            token_data = self.active_tokens[token]
-            # Token válido por 24 horas
-            if datetime.now() - token_data["created_at"] < timedelta(hours=24):
-                return token_data
-            else:
-                # Token expirado
-                del self.active_tokens[token]
+        token_data = self.store.obtener(token)
+        if token_data is not None and datetime.now() - token_data["created_at"] < self.DURACION_SESION:
+            return token_data
         return None
     
     def invalidate_token(self, token: str):
         """Invalida un token (logout)"""
-        if token in self.active_tokens:
-            del self.active_tokens[token]
+        self.store.eliminar(token)
+    
+    @property
+    def bloquea(self) -> bool:
+        """Indica si validar un token hace I/O (todos los almacenes salvo el de memoria)"""
+        return not isinstance(self.store, MemorySessionStore)
+    
+    def metricas(self) -> dict:
+        return self.store.metricas()
+
+class TokenFirmadoManager:
+    """
+    Tokens sin estado firmados con HMAC-SHA256 (TOKEN_MODO=firmado).
+    
+    El token lleva el user_id, username, is_admin, la emisión y el vencimiento, así
+    que validarlo solo requiere recalcular la firma: cualquier worker o nodo con el
+    mismo TOKEN_SECRETO lo acepta sin consultar un almacén. El logout agrega el id
+    del token (jti) al registro de revocaciones hasta que vence.
+    
+    Un cambio de rol o un usuario borrado no afecta a los tokens ya emitidos hasta
+    que vencen o se cierran con logout.
+    
+    Formato: "v1.<datos en base64url>.<firma en base64url>".
+    """
+    
+    DURACION_SESION = TokenManager.DURACION_SESION
+    VERSION = "v1"
+    
+    def __init__(self, secretos: List[bytes], revocacion: Optional[RevocacionTokens] = None):
+        """
+        Args:
+            secretos (List[bytes]): Llaves HMAC; se firma con la primera y se aceptan
+                                    todas (las demás son las anteriores a una rotación)
+            revocacion (RevocacionTokens | None): Registro de logouts (por defecto según TOKEN_REVOCACION)
+        """
+        if not secretos:
+            raise ValueError("Se necesita al menos un secreto para firmar los tokens")
+        self.secretos = secretos
+        self.revocacion = revocacion or crear_revocacion(self.DURACION_SESION.total_seconds())
+    
+    @staticmethod
+    def _firma(mensaje: bytes, secreto: bytes) -> bytes:
+        return hmac.new(secreto, mensaje, hashlib.sha256).digest()
+    
+    def create_token(self, user_id: int, username: str, is_admin: bool) -> str:
+        """Crea un token firmado para el usuario"""
+        emitido = int(time.time())
+        datos = {
+            "uid": user_id,
+            "usr": username,
+            "adm": bool(is_admin),
+            "iat": emitido,
+            "exp": emitido + int(self.DURACION_SESION.total_seconds()),
+            "jti": secrets.token_urlsafe(12),
+        }
+        mensaje = f"{self.VERSION}.{_b64url(json.dumps(datos, separators=(',', ':')).encode())}"
+        return f"{mensaje}.{_b64url(self._firma(mensaje.encode(), self.secretos[0]))}"
+    
+    def _verificar(self, token: str) -> Optional[dict]:
+        """Datos del token si la firma es válida y no ha vencido (sin mirar revocaciones)"""
+        try:
+            version, datos, firma = token.split(".")
+            if version != self.VERSION:
+                return None
+            mensaje = f"{version}.{datos}".encode()
+            firma = _desde_b64url(firma)
+            if not any(hmac.compare_digest(firma, self._firma(mensaje, secreto)) for secreto in self.secretos):
+                return None
+            datos = json.loads(_desde_b64url(datos))
+        except ValueError:
+            # Formato, base64 o JSON inválidos
+            return None
+        if datos["exp"] <= time.time():
+            return None
+        return datos
+    
+    def validate_token(self, token: str) -> Optional[dict]:
+        """Valida un token y retorna los datos del usuario, sin I/O"""
+        datos = self._verificar(token)
+        if datos is None or self.revocacion.esta_revocado(datos["jti"]):
+            return None
+        return {
+            "user_id": datos["uid"],
+            "username": datos["usr"],
+            "is_admin": datos["adm"],
+            "created_at": datetime.fromtimestamp(datos["iat"]),
+        }
+    
+    def invalidate_token(self, token: str):
+        """Revoca un token (logout) hasta su vencimiento"""
+        datos = self._verificar(token)
+        if datos is not None:
+            self.revocacion.revocar(datos["jti"], datos["exp"])
+    
+    @property
+    def bloquea(self) -> bool:
+        return False
+    
+    def metricas(self) -> dict:
+        return {"modo_token": "firmado", **self.revocacion.metricas()}
+
+def crear_token_manager():
+    """
+    Crea el gestor de tokens según TOKEN_MODO: "sesion" (por defecto, sesiones en
+    el almacén de SESSION_BACKEND) o "firmado" (tokens HMAC sin estado, con la llave
+    TOKEN_SECRETO y las anteriores en TOKEN_SECRETOS_ANTERIORES separadas por coma).
+    """
+    modo = os.getenv("TOKEN_MODO", "sesion").lower()
+    if modo == "sesion":
+        return TokenManager()
+    if modo != "firmado":
+        raise ValueError(f"TOKEN_MODO no soportado: {modo}")
+    
+    secreto = os.getenv("TOKEN_SECRETO")
+    if not secreto:
+        # Sin secreto compartido cada proceso firma con su propia llave: solo sirve con un worker
+        print("AuthService: TOKEN_SECRETO no está configurado, se usa una llave aleatoria de este proceso")
+        secreto = secrets.token_urlsafe(32)
+    anteriores = [s.strip() for s in os.getenv("TOKEN_SECRETOS_ANTERIORES", "").split(",") if s.strip()]
+    return TokenFirmadoManager([s.encode() for s in [secreto, *anteriores]])
 
 class AuthService:
     """Servicio principal de autenticación"""
     
     def __init__(self):
         self.password_manager = PasswordManager()
-        self.token_manager = TokenManager()
+        self.token_manager = crear_token_manager()
     
     def authenticate_user(self, db, username: str, password: str) -> Optional[dict]:
         """Autentica un usuario y retorna datos si es válido"""
@@ -95,6 +448,16 @@ class AuthService:
     def logout(self, token: str):
         """Cierra la sesión del usuario"""
         self.token_manager.invalidate_token(token)
+    
+    def metricas_sesiones(self) -> dict:
+        """Métricas del almacén de sesiones o de las revocaciones de tokens firmados"""
+        return self.token_manager.metricas()
 
 # Instancia global del servicio de autenticación
 auth_service = AuthService()
+
+async def en_hilo_si_bloquea(funcion: Callable, *args) -> Any:
+    """Las sesiones en memoria y los tokens firmados se validan directo; los demás almacenes hacen I/O y van a un hilo"""
+    if not auth_service.token_manager.bloquea:
+        return funcion(*args)
+    return await run_in_threadpool(funcion, *args)
@@ -0,0 +1,150 @@
+from sqlalchemy import Integer, column, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+import models
+from typing import List
+
+# Columnas de productos que admiten búsqueda por subcadena
+CAMPOS_BUSQUEDA = ("categoria", "marca")
+
+# El índice de trigramas no puede resolver subcadenas más cortas que esto
+LARGO_MINIMO_TRIGRAMA = 3
+
+# Motores en los que ya se verificó que existe el índice de búsqueda
+_indices_listos = {}
+
+class BusquedaProductos:
+    """
+    Búsqueda de productos por subcadena (sin distinguir mayúsculas) apoyada en índices.
+
+    - PostgreSQL: índices GIN de trigramas (pg_trgm), que ILIKE '%texto%' usa directamente.
+    - SQLite: tabla virtual FTS5 con tokenizador trigram, mantenida con triggers.
+
+    Si el índice no existe, o el texto tiene menos de 3 caracteres (no forma ni un
+    trigrama), se usa el ILIKE de siempre, así que los resultados son los mismos
+    con o sin índices.
+    """
+
+    TABLA_FTS = "productos_busqueda"
+
+    def __init__(self, db: Session):
+        """
+        Constructor del buscador.
+
+        Args:
+            db (Session): Sesión de base de datos SQLAlchemy
+        """
+        self.db = db
+
+    @classmethod
+    def preparar_indices(cls, engine: Engine):
+        """
+        Crea los índices de búsqueda si no existen. Es idempotente y se ejecuta
+        junto con la creación de las tablas.
+
+        Args:
+            engine (Engine): Motor de la base de datos principal
+        """
+        dialecto = engine.dialect.name
+        try:
+            with engine.begin() as conn:
+                if dialecto == "postgresql":
+                    conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+                    for campo in CAMPOS_BUSQUEDA:
+                        conn.execute(text(
+                            f"CREATE INDEX IF NOT EXISTS ix_productos_{campo}_trgm "
+                            f"ON productos USING gin ({campo} gin_trgm_ops)"
+                        ))
+                elif dialecto == "sqlite":
+                    cls._preparar_fts_sqlite(conn)
+                else:
+                    print(f"BusquedaProductos: Sin índice de búsqueda para el dialecto '{dialecto}'")
+                    return
+            _indices_listos.pop(engine.url, None)
+            print("BusquedaProductos: Índices de búsqueda listos")
+        except Exception as e:
+            print(f"BusquedaProductos: No se pudieron crear los índices de búsqueda: {e}")
+
+    @classmethod
+    def _preparar_fts_sqlite(cls, conn):
+        """Crea la tabla FTS5 sobre productos, sus triggers y la llena la primera vez"""
+        existe = conn.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :nombre"),
+            {"nombre": cls.TABLA_FTS},
+        ).first()
+        columnas = ", ".join(CAMPOS_BUSQUEDA)
+        nuevas = ", ".join(f"new.{c}" for c in CAMPOS_BUSQUEDA)
+        viejas = ", ".join(f"old.{c}" for c in CAMPOS_BUSQUEDA)
+
+        conn.execute(text(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {cls.TABLA_FTS} USING fts5("
+            f"{columnas}, content='productos', content_rowid='id', tokenize='trigram')"
+        ))
+        conn.execute(text(
+            f"CREATE TRIGGER IF NOT EXISTS {cls.TABLA_FTS}_ai AFTER INSERT ON productos BEGIN "
+            f"INSERT INTO {cls.TABLA_FTS}(rowid, {columnas}) VALUES (new.id, {nuevas}); END"
+        ))
+        conn.execute(text(
+            f"CREATE TRIGGER IF NOT EXISTS {cls.TABLA_FTS}_ad AFTER DELETE ON productos BEGIN "
+            f"INSERT INTO {cls.TABLA_FTS}({cls.TABLA_FTS}, rowid, {columnas}) "
+            f"VALUES ('delete', old.id, {viejas}); END"
+        ))
+        conn.execute(text(
+            f"CREATE TRIGGER IF NOT EXISTS {cls.TABLA_FTS}_au AFTER UPDATE ON productos BEGIN "
+            f"INSERT INTO {cls.TABLA_FTS}({cls.TABLA_FTS}, rowid, {columnas}) "
+            f"VALUES ('delete', old.id, {viejas}); "
+            f"INSERT INTO {cls.TABLA_FTS}(rowid, {columnas}) VALUES (new.id, {nuevas}); END"
+        ))
+        if not existe:
+            conn.execute(text(f"INSERT INTO {cls.TABLA_FTS}({cls.TABLA_FTS}) VALUES ('rebuild')"))
+
+    def _usa_fts(self) -> bool:
+        """Indica si la base de datos actual es SQLite y tiene la tabla FTS creada"""
+        engine = self.db.get_bind()
+        if engine.dialect.name != "sqlite":
+            return False
+        if engine.url not in _indices_listos:
+            existe = self.db.execute(
+                text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :nombre"),
+                {"nombre": self.TABLA_FTS},
+            ).first()
+            _indices_listos[engine.url] = existe is not None
+        return _indices_listos[engine.url]
+
+    def buscar(self, campo: str, texto: str) -> List[models.Producto]:
+        """
+        Busca productos cuyo campo contiene el texto, sin distinguir mayúsculas.
+
+        Args:
+            campo (str): "categoria" o "marca"
+            texto (str): Subcadena a buscar (se interpreta igual que en ILIKE '%texto%')
+
+        Returns:
+            List[Producto]: Productos encontrados, ordenados por ID
+        """
+        return self.db.query(models.Producto).filter(self.condicion(campo, texto)).order_by(models.Producto.id).all()
+
+    def condicion(self, campo: str, texto: str):
+        """
+        Condición WHERE de la búsqueda, para usarla en consultas que solo leen algunas columnas.
+
+        Args:
+            campo (str): "categoria" o "marca"
+            texto (str): Subcadena a buscar
+
+        Returns:
+            ColumnElement: Condición sobre models.Producto
+        """
+        if campo not in CAMPOS_BUSQUEDA:
+            raise ValueError(f"Campo de búsqueda no soportado: {campo}")
+
+        patron = f"%{texto}%"
+        if len(texto) >= LARGO_MINIMO_TRIGRAMA and self._usa_fts():
+            ids = (
+                text(f"SELECT rowid FROM {self.TABLA_FTS} WHERE {campo} LIKE :patron")
+                .bindparams(patron=patron)
+                .columns(column("rowid", Integer))
+            )
+            return models.Producto.id.in_(ids)
+        # En PostgreSQL este ILIKE usa el índice GIN de trigramas (con 3 caracteres o más)
+        return getattr(models.Producto, campo).ilike(patron)
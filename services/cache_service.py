@@ -0,0 +1,109 @@
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+import os
+import secrets
+import threading
+import time
+
+class CatalogoCache:
+    """
+    Caché LRU en memoria para las lecturas públicas del catálogo.
+
+    Cada escritura de productos incrementa la versión del catálogo y descarta todas
+    las entradas. La versión también sirve para generar el ETag de las respuestas.
+
+    Como la caché vive en cada proceso, una escritura hecha en otro worker no se
+    ve aquí de inmediato; por eso la versión avanza sola cada `ttl` segundos, lo
+    que acota el tiempo que un worker puede servir datos viejos (ttl=0 lo desactiva).
+
+    También recuerda el último número de cambio de la base (secuencia_cambios)
+    confirmado por este proceso, para no guardar lecturas de una réplica que
+    todavía no lo alcanza.
+    """
+
+    def __init__(self, max_entradas: int = 256, ttl: float = 30):
+        """
+        Constructor de la caché del catálogo.
+
+        Args:
+            max_entradas (int): Número máximo de respuestas guardadas antes de expulsar la menos usada
+            ttl (float): Segundos que dura una versión sin escrituras locales
+        """
+        self.max_entradas = max_entradas
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entradas: "OrderedDict[Hashable, Any]" = OrderedDict()
+        # Identifica este proceso para que un ETag de otro arranque nunca coincida
+        self._arranque = secrets.token_hex(4)
+        self._version = 0
+        self._desde = time.monotonic()
+        self._version_bd = 0
+
+    @property
+    def version(self) -> int:
+        """Versión actual del catálogo en este proceso"""
+        with self._lock:
+            if self.ttl and time.monotonic() - self._desde >= self.ttl:
+                self._avanzar_version()
+            return self._version
+
+    @property
+    def version_bd(self) -> int:
+        """Último número de cambio de la base confirmado por este proceso"""
+        return self._version_bd
+
+    def registrar_escritura(self, version_bd: int):
+        """Anota un número de cambio recién confirmado (lo llama cambios_service tras el commit)"""
+        with self._lock:
+            self._version_bd = max(self._version_bd, version_bd)
+
+    # Sufijo del ETag por codificación: cada representación necesita su propio validador fuerte
+    _SUFIJOS_CODIFICACION = {"gzip": "-gz", "br": "-br"}
+
+    def etag(self, version: int, codificacion: Optional[str] = None) -> str:
+        """Genera el ETag fuerte de una versión del catálogo en la codificación negociada"""
+        return f'"{self._arranque}-{version}{self._SUFIJOS_CODIFICACION.get(codificacion, "")}"'
+
+    def obtener(self, clave: Hashable, version: int) -> Optional[Any]:
+        """
+        Busca una entrada guardada para la versión indicada.
+
+        Returns:
+            Any | None: El valor guardado o None si no existe o es de otra versión
+        """
+        with self._lock:
+            if version != self._version or clave not in self._entradas:
+                return None
+            self._entradas.move_to_end(clave)
+            return self._entradas[clave]
+
+    def guardar(self, clave: Hashable, valor: Any, version: int):
+        """
+        Guarda una entrada calculada con la versión indicada.
+
+        Si el catálogo cambió mientras se calculaba el valor, no se guarda para no
+        dejar datos viejos bajo la versión nueva.
+        """
+        with self._lock:
+            if version != self._version:
+                return
+            self._entradas[clave] = valor
+            self._entradas.move_to_end(clave)
+            while len(self._entradas) > self.max_entradas:
+                self._entradas.popitem(last=False)
+
+    def invalidar(self):
+        """Descarta todas las entradas y avanza la versión (llamar después de cada escritura)"""
+        with self._lock:
+            self._avanzar_version()
+
+    def _avanzar_version(self):
+        self._version += 1
+        self._desde = time.monotonic()
+        self._entradas.clear()
+
+# Instancia global de la caché del catálogo
+catalogo_cache = CatalogoCache(
+    max_entradas=int(os.getenv("CATALOGO_CACHE_MAX_ENTRADAS", "256")),
+    ttl=float(os.getenv("CATALOGO_CACHE_TTL", "30")),
+)
@@ -0,0 +1,327 @@
+from datetime import datetime, timedelta
+from sqlalchemy import delete, event, func, insert, select, text, update
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from fastapi import HTTPException
+import models
+import os
+from services.cache_service import catalogo_cache
+from typing import Iterable, List, Optional, Tuple
+
+# Marca de consolidación: todo cambio con número menor o igual ya está confirmado
+SECUENCIA_PRODUCTOS = "productos"
+# Marca de purga: las lápidas con número menor o igual ya se borraron (cursor mínimo aceptado)
+SECUENCIA_PURGADOS = "productos_purgados"
+
+# Tiempo tras el cual un hueco en la numeración se da por transacción revertida
+TOLERANCIA = timedelta(seconds=int(os.getenv("CAMBIOS_TOLERANCIA", "60")))
+# Días que se conservan las lápidas de productos eliminados
+RETENCION = timedelta(days=int(os.getenv("CAMBIOS_RETENCION_DIAS", "30")))
+
+def _registrar():
+    return (
+        insert(models.CambioCatalogo)
+        .values(registrado_en=datetime.now())
+        .returning(models.CambioCatalogo.version)
+    )
+
+def siguiente_version(db: Session) -> int:
+    """
+    Reserva el siguiente número de cambio dentro de la transacción actual.
+
+    Cada escritura inserta su propia fila en cambios_catalogo, así que las
+    transacciones no se bloquean entre sí. Como pueden confirmar en otro orden que
+    el de sus números, los lectores no usan el máximo sino version_actual(), que se
+    detiene antes de cualquier número que todavía puede estar en curso.
+
+    Las escrituras que pueden no encontrar la fila (UPDATE con condición) usan
+    version_en_sentencia() en su lugar, para no reservar un número que se pierde.
+    """
+    version = db.execute(_registrar()).scalar_one()
+    _anotar_pendiente(db, version)
+    return version
+
+async def siguiente_version_async(db) -> int:
+    """Igual que siguiente_version, para AsyncSession"""
+    version = (await db.execute(_registrar())).scalar_one()
+    _anotar_pendiente(db, version)
+    return version
+
+def version_en_sentencia(db):
+    """
+    Expresión que toma el número de cambio dentro del propio UPDATE: solo se
+    evalúa si la fila coincide, así un 404 o un 409 no consume ningún número.
+    Después se registra con registrar_version(), en la misma transacción.
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        return func.nextval(func.pg_get_serial_sequence(models.CambioCatalogo.__tablename__, "version"))
+    # SQLite admite un solo escritor a la vez: el siguiente número es el mayor registrado + 1
+    return select(func.coalesce(func.max(models.CambioCatalogo.version), 0) + 1).scalar_subquery()
+
+def _registro(version: int):
+    return insert(models.CambioCatalogo).values(version=version, registrado_en=datetime.now())
+
+def registrar_version(db: Session, version: int):
+    """Registra en cambios_catalogo un número tomado con version_en_sentencia()"""
+    db.execute(_registro(version))
+    _anotar_pendiente(db, version)
+
+async def registrar_version_async(db, version: int):
+    """Igual que registrar_version, para AsyncSession"""
+    await db.execute(_registro(version))
+    _anotar_pendiente(db, version)
+
+# Números reservados en la transacción en curso
+_VERSIONES_RESERVADAS = "versiones_cambios_reservadas"
+
+def _anotar_pendiente(db, version: int):
+    db.info.setdefault(_VERSIONES_RESERVADAS, []).append(version)
+
+@event.listens_for(Session, "after_commit")
+def _anotar_version_confirmada(sesion: Session):
+    versiones = sesion.info.pop(_VERSIONES_RESERVADAS, None)
+    if versiones:
+        catalogo_cache.registrar_escritura(max(versiones))
+
+@event.listens_for(Session, "after_rollback")
+def _cerrar_huecos(sesion: Session):
+    """
+    En PostgreSQL un número de la secuencia se consume aunque la transacción se
+    revierta; el hueco detendría version_actual() durante TOLERANCIA. Se confirma
+    una fila sin cambios con cada número perdido para cerrar el hueco de inmediato.
+    """
+    versiones = sesion.info.pop(_VERSIONES_RESERVADAS, None)
+    if not versiones:
+        return
+    try:
+        with sesion.get_bind().begin() as conn:
+            for version in versiones:
+                # En SQLite el rollback devolvió el número y otra escritura pudo tomarlo
+                if conn.execute(select(models.CambioCatalogo.version)
+                                .where(models.CambioCatalogo.version == version)).first() is None:
+                    conn.execute(_registro(version))
+    except Exception as e:
+        print(f"CambiosService: No se pudieron registrar los números revertidos {versiones}: {e}")
+
+def _consulta_marca(nombre: str):
+    return select(models.SecuenciaCambios.valor).where(models.SecuenciaCambios.nombre == nombre)
+
+def _avanzar_marca(nombre: str, valor: int):
+    # Solo avanza: varios workers pueden consolidar o purgar a la vez
+    return (
+        update(models.SecuenciaCambios)
+        .where(models.SecuenciaCambios.nombre == nombre, models.SecuenciaCambios.valor < valor)
+        .values(valor=valor)
+    )
+
+def consulta_registrados(base: int):
+    """SELECT de los números de cambio registrados después de la marca de consolidación"""
+    return (
+        select(models.CambioCatalogo.version, models.CambioCatalogo.registrado_en)
+        .where(models.CambioCatalogo.version > base)
+        .order_by(models.CambioCatalogo.version)
+    )
+
+def cursor_seguro(base: int, registrados: Iterable[Tuple[int, datetime]], ahora: Optional[datetime] = None) -> int:
+    """
+    Mayor número N tal que todo cambio con número menor o igual ya está confirmado.
+
+    Un hueco en la numeración es una transacción en curso o revertida; se da por
+    revertida cuando el número siguiente se registró hace más de TOLERANCIA. Una
+    escritura que tarde más que eso puede quedar fuera de la sincronización incremental.
+
+    Args:
+        base (int): Marca de consolidación
+        registrados (iterable): (version, registrado_en) posteriores a la base, en orden
+        ahora (datetime | None): Momento de referencia (por defecto el actual)
+    """
+    limite = (ahora or datetime.now()) - TOLERANCIA
+    hasta = base
+    for version, registrado_en in registrados:
+        if version != hasta + 1 and registrado_en > limite:
+            break
+        hasta = version
+    return hasta
+
+async def version_actual_async(db) -> int:
+    """Igual que CambiosService.version_actual, para AsyncSession"""
+    base = (await db.execute(_consulta_marca(SECUENCIA_PRODUCTOS))).scalar() or 0
+    return cursor_seguro(base, (await db.execute(consulta_registrados(base))).all())
+
+def sentencias_lapidas(ids: List[int], version: int) -> list:
+    """Sentencias que registran (o renuevan) la lápida de los productos eliminados"""
+    ahora = datetime.now()
+    return [
+        delete(models.ProductoEliminado).where(models.ProductoEliminado.producto_id.in_(ids)),
+        insert(models.ProductoEliminado).values([
+            {"producto_id": producto_id, "version": version, "eliminado_en": ahora} for producto_id in ids
+        ]),
+    ]
+
+def registrar_eliminados(db: Session, ids: List[int], version: int):
+    """Guarda las lápidas de los productos eliminados en la transacción actual"""
+    if ids:
+        for sentencia in sentencias_lapidas(ids, version):
+            db.execute(sentencia)
+
+def preparar_secuencia(engine: Engine):
+    """Crea las marcas de la secuencia de cambios si no existen (idempotente)"""
+    with engine.begin() as conn:
+        base = conn.execute(_consulta_marca(SECUENCIA_PRODUCTOS)).scalar()
+        if base is None:
+            base = conn.execute(select(func.max(models.Producto.version))).scalar() or 0
+            conn.execute(insert(models.SecuenciaCambios).values(nombre=SECUENCIA_PRODUCTOS, valor=base))
+        if conn.execute(_consulta_marca(SECUENCIA_PURGADOS)).scalar() is None:
+            conn.execute(insert(models.SecuenciaCambios).values(nombre=SECUENCIA_PURGADOS, valor=0))
+
+        # Bases que usaban el contador de una sola fila: la numeración nueva sigue después de él.
+        # La consolidación siempre conserva la última fila, así que esto ocurre una sola vez
+        if base and conn.execute(select(func.max(models.CambioCatalogo.version))).scalar() is None:
+            conn.execute(insert(models.CambioCatalogo).values(version=base, registrado_en=datetime.now()))
+            if engine.dialect.name == "postgresql":
+                conn.execute(
+                    text("SELECT setval(pg_get_serial_sequence('cambios_catalogo', 'version'), :valor)"),
+                    {"valor": base},
+                )
+
+class CambiosService:
+    """
+    Sincronización incremental del catálogo.
+
+    Cada escritura de productos toma un número de la secuencia global y lo guarda
+    en `productos.version`; los borrados dejan una lápida en `productos_eliminados`.
+    Un cliente guarda el cursor de su última sincronización y pide solo lo que
+    cambió después. Las lápidas se conservan RETENCION; un cursor anterior a la
+    última purga recibe 410 y el cliente vuelve a descargar el catálogo completo.
+    """
+
+    def __init__(self, db: Session):
+        """
+        Constructor del servicio de cambios.
+
+        Args:
+            db (Session): Sesión de base de datos SQLAlchemy
+        """
+        self.db = db
+
+    def version_actual(self) -> int:
+        """Último número de cambio hasta el cual no queda ninguna escritura en curso (ver cursor_seguro)"""
+        base = self.db.scalar(_consulta_marca(SECUENCIA_PRODUCTOS)) or 0
+        return cursor_seguro(base, self.db.execute(consulta_registrados(base)).all())
+
+    def cursor_minimo(self) -> int:
+        """Cursor más antiguo que todavía se acepta en obtener_cambios"""
+        return self.db.scalar(_consulta_marca(SECUENCIA_PURGADOS)) or 0
+
+    def consolidar(self) -> int:
+        """
+        Avanza la marca de consolidación hasta version_actual() y borra los números
+        anteriores de cambios_catalogo, para que version_actual solo recorra los recientes.
+        Conserva la última fila para que la numeración nunca retroceda.
+
+        Returns:
+            int: Nueva marca de consolidación
+        """
+        hasta = self.version_actual()
+        self.db.execute(_avanzar_marca(SECUENCIA_PRODUCTOS, hasta))
+        self.db.execute(delete(models.CambioCatalogo).where(models.CambioCatalogo.version < hasta))
+        return hasta
+
+    def purgar(self, retencion: timedelta = RETENCION) -> dict:
+        """
+        Consolida la secuencia y borra las lápidas más antiguas que `retencion`.
+
+        Los cursores anteriores a la lápida purgada más reciente dejan de aceptarse,
+        porque ya no se les puede informar ese borrado.
+
+        Returns:
+            dict: {"consolidado", "cursor_minimo", "lapidas_purgadas"}
+        """
+        try:
+            consolidado = self.consolidar()
+            purgada = self.db.scalar(
+                select(func.max(models.ProductoEliminado.version))
+                .where(models.ProductoEliminado.eliminado_en < datetime.now() - retencion)
+            )
+            purgadas = 0
+            if purgada is not None:
+                purgadas = self.db.execute(
+                    delete(models.ProductoEliminado).where(models.ProductoEliminado.version <= purgada)
+                ).rowcount
+                self.db.execute(_avanzar_marca(SECUENCIA_PURGADOS, purgada))
+            self.db.commit()
+            if purgadas:
+                print(f"CambiosService: {purgadas} lápidas purgadas; cursor mínimo {purgada}")
+            return {"consolidado": consolidado, "cursor_minimo": self.cursor_minimo(), "lapidas_purgadas": purgadas}
+        except Exception as e:
+            self.db.rollback()
+            print(f"CambiosService: Error al purgar cambios: {e}")
+            raise
+
+    def obtener_cambios(self, since: Optional[int] = None, limite: int = 1000) -> dict:
+        """
+        Obtiene los productos creados o modificados y los eliminados después de un cursor.
+
+        Args:
+            since (int | None): Cursor de la sincronización anterior; None retorna el catálogo completo
+            limite (int): Máximo de productos por respuesta (los cambios de una misma
+                          versión nunca se parten entre dos respuestas)
+
+        Returns:
+            dict: {"cursor", "hay_mas", "productos", "eliminados"}; se vuelve a pedir
+                  con since=cursor mientras hay_mas sea True
+
+        Raises:
+            HTTPException: 410 si el cursor es anterior a la última purga de lápidas,
+                           500 si hay error en la consulta
+        """
+        try:
+            # La versión se lee antes que las filas: todo cambio hasta ella ya está confirmado
+            hasta = self.version_actual()
+            desde = since if since is not None else -1
+            version = models.Producto.version
+            productos = self.db.scalars(
+                select(models.Producto)
+                .where(version > desde, version <= hasta)
+                .order_by(version, models.Producto.id)
+                .limit(limite + 1)
+            ).all()
+
+            hay_mas = len(productos) > limite
+            if hay_mas:
+                siguiente = productos[limite].version
+                productos = [p for p in productos if p.version < siguiente]
+                if not productos:
+                    # Una sola versión con más filas que el límite: se envía completa
+                    productos = self.db.scalars(
+                        select(models.Producto).where(version == siguiente).order_by(models.Producto.id)
+                    ).all()
+                hasta = productos[-1].version
+
+            eliminados = []
+            if since is not None:
+                vigentes = {p.id for p in productos}
+                eliminados = [
+                    producto_id for producto_id in self.db.scalars(
+                        select(models.ProductoEliminado.producto_id)
+                        .where(models.ProductoEliminado.version > desde, models.ProductoEliminado.version <= hasta)
+                        .order_by(models.ProductoEliminado.producto_id)
+                    )
+                    # Un ID reutilizado después del borrado aparece como producto vigente
+                    if producto_id not in vigentes
+                ]
+                # Se comprueba después de leer las lápidas: una purga confirmada antes ya se ve aquí
+                if since < self.cursor_minimo():
+                    raise HTTPException(
+                        status_code=410,
+                        detail="El cursor es anterior a los cambios conservados; descargue el catálogo completo",
+                    )
+
+            print(f"CambiosService: {len(productos)} productos y {len(eliminados)} eliminados "
+                  f"entre las versiones {since} y {hasta}")
+            return {"cursor": hasta, "hay_mas": hay_mas, "productos": productos, "eliminados": eliminados}
+        except HTTPException:
+            raise
+        except Exception as e:
+            print(f"CambiosService: Error al obtener cambios: {e}")
+            raise HTTPException(status_code=500, detail=f"Error al obtener cambios: {str(e)}")
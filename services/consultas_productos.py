@@ -0,0 +1,150 @@
+"""
+Consultas y sentencias del catálogo, compartidas por ProductoService (Session) y
+ProductoServiceAsync (AsyncSession).
+
+Los servicios solo las ejecutan y manejan los errores; así las rutas síncronas y
+las de /async leen y escriben exactamente lo mismo.
+"""
+
+from fastapi import HTTPException
+from sqlalchemy import case, func, literal, select, update
+from sqlalchemy.sql import ColumnElement, Select, Update
+import models, schemas
+from services.serializacion_service import seleccionar
+from typing import Optional
+
+# Campos que no pueden quedar en NULL al actualizar parcialmente
+CAMPOS_OBLIGATORIOS = ("nombre", "cantidad", "descripcion", "marca", "categoria", "stock_minimo")
+
+def consulta_filas(limit: Optional[int] = None, after: Optional[int] = None) -> Select:
+    """SELECT por columnas del catálogo completo o de una página por cursor, ordenado por ID"""
+    consulta = seleccionar(schemas.Producto, models.Producto)
+    if after is not None:
+        consulta = consulta.where(models.Producto.id > after)
+    consulta = consulta.order_by(models.Producto.id)
+    return consulta.limit(limit) if limit is not None else consulta
+
+def consulta_facetas() -> Select:
+    """Conteo de productos por (marca, categoría), para agrupar_facetas"""
+    marca = func.trim(models.Producto.marca)
+    categoria = func.trim(models.Producto.categoria)
+    return select(marca, categoria, func.count(models.Producto.id)).group_by(marca, categoria)
+
+def agrupar_facetas(filas) -> dict:
+    """Suma los conteos de las filas (marca, categoría, cantidad) por marca y por categoría"""
+    marcas, categorias = {}, {}
+    for valor_marca, valor_categoria, cantidad in filas:
+        if valor_marca:
+            marcas[valor_marca] = marcas.get(valor_marca, 0) + cantidad
+        if valor_categoria:
+            categorias[valor_categoria] = categorias.get(valor_categoria, 0) + cantidad
+    return {
+        "marcas": [{"valor": v, "cantidad": n} for v, n in sorted(marcas.items())],
+        "categorias": [{"valor": v, "cantidad": n} for v, n in sorted(categorias.items())],
+    }
+
+def filtro_stock_bajo(limite: Optional[int] = None) -> ColumnElement:
+    """
+    Condición de stock bajo. Sin límite se usa el umbral de cada producto, la misma
+    expresión del índice parcial ix_productos_stock_bajo, para que el planificador lo use.
+    """
+    if limite is None:
+        return models.Producto.cantidad <= models.Producto.stock_minimo
+    return models.Producto.cantidad <= limite
+
+def consulta_stock_bajo(limite: Optional[int] = None) -> Select:
+    """Productos con stock bajo, ordenados por ID"""
+    return select(models.Producto).where(filtro_stock_bajo(limite)).order_by(models.Producto.id)
+
+def nulos_obligatorios(valores: dict) -> list:
+    """Campos obligatorios que una actualización parcial intenta dejar en NULL"""
+    return [campo for campo in CAMPOS_OBLIGATORIOS if campo in valores and valores[campo] is None]
+
+def valores_parciales(data: schemas.ProductoUpdate) -> dict:
+    """
+    Campos enviados en una actualización parcial.
+
+    Raises:
+        HTTPException: 400 si algún campo obligatorio llega en NULL
+    """
+    valores = data.model_dump(exclude_unset=True)
+    nulos = nulos_obligatorios(valores)
+    if nulos:
+        raise HTTPException(status_code=400, detail=f"Campos obligatorios sin valor: {', '.join(nulos)}")
+    return valores
+
+def sentencia_parcial(producto_id: int, valores: dict, version) -> Update:
+    """
+    UPDATE ... RETURNING de los campos enviados, sin SELECT previo. `version` es
+    la expresión de cambios_service.version_en_sentencia.
+    """
+    return (
+        update(models.Producto)
+        .where(models.Producto.id == producto_id)
+        .values(**valores, version=version)
+        .returning(models.Producto)
+        .execution_options(synchronize_session=False, populate_existing=True)
+    )
+
+def sentencia_lote(cambios: dict, version: int) -> Update:
+    """
+    Un solo UPDATE ... RETURNING id para varios productos con campos distintos.
+
+    Cada columna enviada toma su valor con CASE id WHEN ... y conserva el actual en
+    los productos que no la cambian. El RETURNING trae solo los IDs que el UPDATE
+    encontró, así un producto borrado mientras tanto se informa como no encontrado.
+
+    Args:
+        cambios (dict): ID -> campos a cambiar
+        version (int): Número de cambio de la transacción
+    """
+    columnas = models.Producto.__table__.c
+    campos = sorted({campo for valores in cambios.values() for campo in valores if campo != "id"})
+    valores = {
+        campo: case(
+            {producto_id: literal(datos[campo], columnas[campo].type)
+             for producto_id, datos in cambios.items() if campo in datos},
+            value=columnas.id,
+            else_=columnas[campo],
+        )
+        for campo in campos
+    }
+    return (
+        update(models.Producto)
+        .where(models.Producto.id.in_(list(cambios)))
+        .values(**valores, version=version)
+        .returning(models.Producto.id)
+        .execution_options(synchronize_session=False)
+    )
+
+def sentencia_variantes(imagen_url: str, valores: dict, version) -> Update:
+    """
+    UPDATE ... RETURNING de las URLs de variantes en los productos que siguen usando
+    la imagen original `imagen_url`. `version` es la expresión de
+    cambios_service.version_en_sentencia.
+    """
+    return (
+        update(models.Producto)
+        .where(models.Producto.imagen_url == imagen_url)
+        .values(**valores, version=version)
+        .returning(models.Producto)
+        .execution_options(synchronize_session=False, populate_existing=True)
+    )
+
+def sentencia_stock(producto_id: int, delta: int, version, permitir_negativo: bool = False) -> Update:
+    """
+    UPDATE ... SET cantidad = cantidad + delta ... RETURNING, atómico frente a ajustes
+    concurrentes. Sin `permitir_negativo` no actualiza ninguna fila si el stock quedaría negativo.
+    `version` es la expresión de cambios_service.version_en_sentencia.
+    """
+    nueva_cantidad = func.coalesce(models.Producto.cantidad, 0) + delta
+    sentencia = (
+        update(models.Producto)
+        .where(models.Producto.id == producto_id)
+        .values(cantidad=nueva_cantidad, version=version)
+        .returning(models.Producto)
+        .execution_options(synchronize_session=False, populate_existing=True)
+    )
+    if not permitir_negativo:
+        sentencia = sentencia.where(nueva_cantidad >= 0)
+    return sentencia
@@ -0,0 +1,44 @@
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+import models
+from services.busqueda_service import BusquedaProductos
+from services.cambios_service import preparar_secuencia
+
+def agregar_columnas_faltantes(engine: Engine):
+    """
+    Agrega a las tablas existentes las columnas nuevas de los modelos.
+
+    create_all solo crea tablas que no existen; esta función cubre las columnas
+    opcionales que se añaden a tablas ya creadas (por ejemplo las variantes de imagen).
+    """
+    inspector = inspect(engine)
+    tablas = set(inspector.get_table_names())
+    with engine.begin() as conn:
+        for tabla in models.Base.metadata.sorted_tables:
+            if tabla.name not in tablas:
+                continue
+            existentes = {c["name"] for c in inspector.get_columns(tabla.name)}
+            for columna in tabla.columns:
+                if columna.name in existentes:
+                    continue
+                tipo = columna.type.compile(dialect=engine.dialect)
+                ddl = f"ALTER TABLE {tabla.name} ADD COLUMN {columna.name} {tipo}"
+                if columna.server_default is not None:
+                    ddl += f" DEFAULT {columna.server_default.arg}"
+                conn.execute(text(ddl))
+                print(f"Esquema: Columna {tabla.name}.{columna.name} agregada")
+
+def crear_indices_faltantes(engine: Engine):
+    """Crea los índices de los modelos que no existen en tablas ya creadas (create_all no lo hace)"""
+    with engine.begin() as conn:
+        for tabla in models.Base.metadata.sorted_tables:
+            for indice in tabla.indexes:
+                indice.create(bind=conn, checkfirst=True)
+
+def actualizar_esquema(engine: Engine):
+    """Crea las tablas, agrega columnas e índices nuevos y prepara la búsqueda y la secuencia de cambios"""
+    models.Base.metadata.create_all(bind=engine)
+    agregar_columnas_faltantes(engine)
+    crear_indices_faltantes(engine)
+    preparar_secuencia(engine)
+    BusquedaProductos.preparar_indices(engine)
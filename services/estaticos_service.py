@@ -0,0 +1,197 @@
+from fastapi import Request
+from fastapi.responses import FileResponse, Response
+from fastapi.staticfiles import StaticFiles
+from starlette.datastructures import Headers
+from starlette.staticfiles import NotModifiedResponse
+from typing import Dict, Optional
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import shutil
+import tempfile
+
+try:
+    import brotli
+except ImportError:  # Brotli es opcional: sin él solo se generan variantes gzip
+    brotli = None
+
+# Archivos que vale la pena comprimir (las imágenes PNG/JPG ya vienen comprimidas)
+EXTENSIONES_COMPRIMIBLES = (".html", ".js", ".css", ".svg", ".ico", ".json", ".txt", ".map")
+CACHE_INMUTABLE = "public, max-age=31536000, immutable"
+CACHE_REVALIDAR = "no-cache"
+MANIFIESTO = "manifest.json"
+
+# Referencias absolutas a /static/... dentro de HTML y CSS
+_REFERENCIA = re.compile(r"/static/([\w./-]+)")
+
+def _huella(contenido: bytes) -> str:
+    return hashlib.sha256(contenido).hexdigest()[:10]
+
+def _nombre_con_huella(ruta: str, huella: str) -> str:
+    base, extension = os.path.splitext(ruta)
+    return f"{base}.{huella}{extension}"
+
+def _escribir_comprimidos(ruta: str, contenido: bytes):
+    """Guarda junto al archivo sus variantes .gz y .br (si está instalado brotli)"""
+    if not ruta.endswith(EXTENSIONES_COMPRIMIBLES):
+        return
+    with open(ruta + ".gz", "wb") as archivo:
+        archivo.write(gzip.compress(contenido, compresslevel=9, mtime=0))
+    if brotli is not None:
+        with open(ruta + ".br", "wb") as archivo:
+            archivo.write(brotli.compress(contenido, quality=11))
+
+def construir_estaticos(origen: str, destino: str) -> Dict[str, str]:
+    """
+    Prepara los archivos estáticos para producción.
+
+    - Copia cada recurso con su huella de contenido en el nombre (admin.3f2a9c1b0d.js),
+      además del nombre original para URLs antiguas.
+    - Reescribe en HTML y CSS las referencias /static/... al nombre con huella.
+      Los CSS se procesan antes de calcular su huella, para que cambie si cambia una imagen.
+    - Genera variantes precomprimidas .gz y .br de los archivos de texto.
+
+    Args:
+        origen (str): Carpeta static del proyecto
+        destino (str): Carpeta donde se escribe el resultado (se reemplaza)
+
+    Returns:
+        Dict[str, str]: Manifiesto ruta original -> ruta con huella (relativas a static)
+    """
+    if os.path.isdir(destino):
+        shutil.rmtree(destino)
+    os.makedirs(destino)
+
+    archivos = []
+    for carpeta, _, nombres in os.walk(origen):
+        for nombre in nombres:
+            archivos.append(os.path.relpath(os.path.join(carpeta, nombre), origen).replace(os.sep, "/"))
+
+    # Los recursos sin referencias primero, luego CSS (que apuntan a imágenes) y al final HTML
+    def orden(ruta):
+        return 2 if ruta.endswith(".html") else 1 if ruta.endswith(".css") else 0
+
+    manifiesto: Dict[str, str] = {}
+
+    def reescribir(texto: str) -> str:
+        return _REFERENCIA.sub(lambda m: "/static/" + manifiesto.get(m.group(1), m.group(1)), texto)
+
+    for ruta in sorted(archivos, key=orden):
+        with open(os.path.join(origen, ruta), "rb") as archivo:
+            contenido = archivo.read()
+        if ruta.endswith((".html", ".css")):
+            contenido = reescribir(contenido.decode("utf-8")).encode("utf-8")
+
+        salidas = [ruta]
+        if not ruta.endswith(".html"):
+            # Las páginas conservan su nombre: se sirven siempre con revalidación
+            manifiesto[ruta] = _nombre_con_huella(ruta, _huella(contenido))
+            salidas.append(manifiesto[ruta])
+        for salida in salidas:
+            ruta_salida = os.path.join(destino, salida)
+            os.makedirs(os.path.dirname(ruta_salida), exist_ok=True)
+            with open(ruta_salida, "wb") as archivo:
+                archivo.write(contenido)
+            _escribir_comprimidos(ruta_salida, contenido)
+
+    with open(os.path.join(destino, MANIFIESTO), "w") as archivo:
+        json.dump(manifiesto, archivo, indent=2, sort_keys=True)
+    print(f"Estáticos: {len(manifiesto)} recursos con huella en {destino}"
+          f"{'' if brotli else ' (sin brotli: solo gzip)'}")
+    return manifiesto
+
+def variante_comprimida(ruta: str, accept_encoding: str) -> tuple[str, Optional[str]]:
+    """Ruta de la variante precomprimida que acepta el cliente (br antes que gzip), o la original"""
+    aceptadas = {c.split(";")[0].strip() for c in accept_encoding.lower().split(",")}
+    for codificacion, extension in (("br", ".br"), ("gzip", ".gz")):
+        if codificacion in aceptadas and os.path.isfile(ruta + extension):
+            return ruta + extension, codificacion
+    return ruta, None
+
+class EstaticosProduccion(StaticFiles):
+    """
+    Archivos estáticos ya construidos por construir_estaticos.
+
+    Los nombres con huella se sirven con caché inmutable de un año; los demás
+    (páginas y nombres originales) con revalidación por ETag. Si el cliente lo
+    acepta se envía la variante .br o .gz ya comprimida.
+    """
+
+    def __init__(self, *args, huellas: set, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.huellas = huellas
+
+    def file_response(self, full_path, stat_result, scope, status_code=200):
+        cabeceras = Headers(scope=scope)
+        ruta, codificacion = variante_comprimida(str(full_path), cabeceras.get("accept-encoding", ""))
+        relativa = os.path.relpath(str(full_path), self.directory).replace(os.sep, "/")
+
+        if codificacion is None:
+            respuesta = super().file_response(full_path, stat_result, scope, status_code)
+        else:
+            respuesta = FileResponse(
+                ruta, status_code=status_code, stat_result=os.stat(ruta),
+                media_type=mimetypes.guess_type(str(full_path))[0],
+            )
+            if self.is_not_modified(respuesta.headers, cabeceras):
+                respuesta = NotModifiedResponse(respuesta.headers)
+            else:
+                respuesta.headers["Content-Encoding"] = codificacion
+        respuesta.headers["Vary"] = "Accept-Encoding"
+        respuesta.headers["Cache-Control"] = CACHE_INMUTABLE if relativa in self.huellas else CACHE_REVALIDAR
+        return respuesta
+
+class EstaticosService:
+    """
+    Modo de los archivos estáticos según STATIC_MODO:
+
+    - "dev" (por defecto): se sirven desde static/ sin caché, como siempre.
+    - "produccion": se usan los archivos construidos en STATIC_BUILD_DIR (con
+      `python construir_estaticos.py`); si no existen se construyen al arrancar
+      en una carpeta temporal del proceso.
+    """
+
+    def __init__(self, origen: str = "static"):
+        self.origen = origen
+        self.produccion = os.getenv("STATIC_MODO", "dev").lower() in ("produccion", "prod")
+        self.directorio = origen
+        self.manifiesto: Dict[str, str] = {}
+        if self.produccion:
+            self._preparar()
+
+    def _preparar(self):
+        construido = os.getenv("STATIC_BUILD_DIR", "static_build")
+        ruta_manifiesto = os.path.join(construido, MANIFIESTO)
+        if not os.path.isfile(ruta_manifiesto):
+            construido = tempfile.mkdtemp(prefix="static_")
+            construir_estaticos(self.origen, construido)
+        with open(os.path.join(construido, MANIFIESTO)) as archivo:
+            self.manifiesto = json.load(archivo)
+        self.directorio = construido
+
+    def montar(self, clase_dev=StaticFiles) -> StaticFiles:
+        """Aplicación ASGI que sirve /static en el modo configurado"""
+        if self.produccion:
+            return EstaticosProduccion(directory=self.directorio, huellas=set(self.manifiesto.values()))
+        return clase_dev(directory=self.directorio)
+
+    def pagina(self, nombre: str, request: Request) -> Response:
+        """Página HTML del modo configurado; en producción con referencias a los recursos con huella"""
+        ruta = os.path.join(self.directorio, nombre)
+        if not self.produccion:
+            return FileResponse(ruta)
+        ruta_variante, codificacion = variante_comprimida(ruta, request.headers.get("accept-encoding", ""))
+        respuesta = FileResponse(ruta_variante, media_type="text/html", stat_result=os.stat(ruta_variante))
+        cabeceras = {"Vary": "Accept-Encoding", "Cache-Control": CACHE_REVALIDAR, "ETag": respuesta.headers["etag"]}
+        if request.headers.get("if-none-match") == respuesta.headers["etag"]:
+            return Response(status_code=304, headers=cabeceras)
+        if codificacion:
+            cabeceras["Content-Encoding"] = codificacion
+        respuesta.headers.update(cabeceras)
+        return respuesta
+
+# Instancia global de los estáticos
+estaticos_service = EstaticosService()
@@ -0,0 +1,214 @@
+from collections import deque
+from fastapi import HTTPException
+from starlette.concurrency import run_in_threadpool
+from typing import AsyncIterator, Callable, Optional
+import asyncio
+import json
+import os
+import threading
+import schemas
+from database import SessionLocal
+from services.cambios_service import CambiosService
+
+# Intervalo de los comentarios de keep-alive para proxies y para detectar clientes caídos
+INTERVALO_PING = 15
+# Pausa máxima entre lecturas de la secuencia de cambios mientras la base falla
+SONDEO_ESPERA_MAXIMA = 30
+
+class _Suscriptor:
+    """Un cliente conectado: buffer acotado de mensajes pendientes y un aviso para despertarlo"""
+    __slots__ = ("pendientes", "aviso", "desbordado")
+
+    def __init__(self):
+        self.pendientes: deque = deque()
+        self.aviso = asyncio.Event()
+        self.desbordado = False
+
+class DifusorEventos:
+    """
+    Reparte los cambios del catálogo a todos los clientes conectados por Server-Sent Events.
+
+    Cada evento se serializa una sola vez y se entrega a cada suscriptor dentro del
+    event loop, así que un cliente inactivo solo cuesta una corrutina dormida y un
+    buffer vacío. Si un cliente no alcanza a leer y su buffer se llena, se descartan
+    sus pendientes y recibe un único evento "recargar" para que vuelva a pedir el catálogo.
+
+    Las publicaciones pueden venir de rutas síncronas (hilos del threadpool) o asíncronas.
+
+    Cada worker tiene su propio difusor en memoria. Con `sondeo=0` (por defecto) las
+    escrituras se publican directo y los clientes solo reciben los cambios hechos en
+    su worker, lo que sirve con un único worker. Con varios workers se configura
+    `sondeo` > 0: publicar() deja de entregar nada y, mientras haya suscriptores,
+    el difusor lee cada `sondeo` segundos la secuencia de cambios de la base
+    (services/cambios_service.py) y reparte lo que confirmó cualquier worker.
+    """
+
+    def __init__(self, tamano_buffer: int = 100, max_suscriptores: int = 10000,
+                 sondeo: float = 0, leer_cambios: Optional[Callable[[Optional[int]], dict]] = None):
+        """
+        Constructor del difusor.
+
+        Args:
+            tamano_buffer (int): Eventos pendientes por cliente antes de considerarlo atrasado
+            max_suscriptores (int): Conexiones simultáneas admitidas en este worker
+            sondeo (float): Segundos entre lecturas de la secuencia de cambios; 0 publica directo
+            leer_cambios (Callable): Fuente de cambios del modo sondeo (ver leer_cambios)
+        """
+        self.tamano_buffer = tamano_buffer
+        self.max_suscriptores = max_suscriptores
+        self.sondeo = sondeo
+        self._leer_cambios = leer_cambios or leer_cambios_catalogo
+        self._suscriptores: set = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock = threading.Lock()
+        self._tarea: Optional[asyncio.Task] = None
+        self.publicados = 0
+        self.desbordes = 0
+
+    @property
+    def suscriptores(self) -> int:
+        return len(self._suscriptores)
+
+    @staticmethod
+    def formatear(evento: str, datos: dict) -> bytes:
+        """Mensaje en formato text/event-stream"""
+        return f"event: {evento}\ndata: {json.dumps(datos, default=str)}\n\n".encode()
+
+    def publicar(self, evento: str, datos: dict):
+        """
+        Publica un evento para todos los suscriptores. No bloquea y se puede llamar desde cualquier hilo.
+
+        Args:
+            evento (str): "producto" (producto nuevo o campos cambiados, siempre con su id),
+                          "eliminado" (ids borrados) o "recargar" (volver a pedir el catálogo)
+            datos (dict): Contenido del evento, serializable a JSON
+        """
+        if self.sondeo:
+            # Los eventos salen de la secuencia de cambios, también los de este worker
+            return
+        self._enviar(evento, datos)
+
+    def _enviar(self, evento: str, datos: dict):
+        if not self._suscriptores or self._loop is None:
+            return
+        mensaje = self.formatear(evento, datos)
+        try:
+            self._loop.call_soon_threadsafe(self._repartir, mensaje)
+        except RuntimeError:
+            # El event loop ya se cerró (apagado del servidor)
+            pass
+
+    def _repartir(self, mensaje: bytes):
+        """Entrega un mensaje a cada suscriptor; corre dentro del event loop"""
+        self.publicados += 1
+        for suscriptor in self._suscriptores:
+            if suscriptor.desbordado:
+                continue
+            if len(suscriptor.pendientes) >= self.tamano_buffer:
+                suscriptor.pendientes.clear()
+                suscriptor.pendientes.append(self.formatear("recargar", {}))
+                suscriptor.desbordado = True
+                self.desbordes += 1
+            else:
+                suscriptor.pendientes.append(mensaje)
+            suscriptor.aviso.set()
+
+    def puede_suscribir(self) -> bool:
+        return len(self._suscriptores) < self.max_suscriptores
+
+    async def suscribir(self) -> AsyncIterator[bytes]:
+        """
+        Flujo de mensajes SSE para un cliente, hasta que se desconecta.
+
+        Yields:
+            bytes: Eventos en formato text/event-stream y comentarios de keep-alive
+        """
+        with self._lock:
+            self._loop = asyncio.get_running_loop()
+        suscriptor = _Suscriptor()
+        self._suscriptores.add(suscriptor)
+        if self.sondeo and (self._tarea is None or self._tarea.done()):
+            self._tarea = asyncio.create_task(self._sondear())
+        try:
+            # El cliente indica en cuánto tiempo reconectarse si se cae la conexión
+            yield b"retry: 3000\n: conectado\n\n"
+            while True:
+                try:
+                    await asyncio.wait_for(suscriptor.aviso.wait(), INTERVALO_PING)
+                except asyncio.TimeoutError:
+                    yield b": ping\n\n"
+                    continue
+                suscriptor.aviso.clear()
+                pendientes = b"".join(suscriptor.pendientes)
+                suscriptor.pendientes.clear()
+                suscriptor.desbordado = False
+                yield pendientes
+        finally:
+            self._suscriptores.discard(suscriptor)
+
+    async def _sondear(self):
+        """Reparte los cambios confirmados por cualquier worker mientras haya suscriptores"""
+        cursor = None
+        pausa = self.sondeo
+        while self._suscriptores:
+            try:
+                cursor = await run_in_threadpool(self._publicar_cambios, cursor)
+                pausa = self.sondeo
+            except Exception as e:
+                # Error de la base: se conserva el cursor y se reintenta cada vez más espaciado
+                pausa = min(pausa * 2, SONDEO_ESPERA_MAXIMA)
+                print(f"DifusorEventos: Error al leer la secuencia de cambios, reintento en {pausa:.1f} s: {e}")
+            await asyncio.sleep(pausa)
+
+    def _publicar_cambios(self, cursor: Optional[int]) -> int:
+        """Publica los cambios posteriores al cursor y retorna el nuevo cursor (corre en un hilo)"""
+        try:
+            cambios = self._leer_cambios(cursor)
+        except HTTPException as e:
+            if e.status_code != 410:
+                raise
+            # Cursor anterior a la purga de lápidas: los clientes vuelven a pedir el catálogo
+            cambios = {"hay_mas": True}
+        if cambios["hay_mas"]:
+            # Demasiados cambios juntos (p. ej. una importación): es más barato recargar.
+            # El cursor nuevo se lee antes de avisar, por si la base falla
+            actual = self._leer_cambios(None)["cursor"]
+            self._enviar("recargar", {})
+            return actual
+        for producto in cambios["productos"]:
+            self._enviar("producto", producto)
+        if cambios["eliminados"]:
+            self._enviar("eliminado", {"ids": cambios["eliminados"]})
+        return cambios["cursor"]
+
+    def metricas(self) -> dict:
+        return {
+            "suscriptores": len(self._suscriptores),
+            "eventos_publicados": self.publicados,
+            "clientes_desbordados": self.desbordes,
+        }
+
+def leer_cambios_catalogo(since: Optional[int], limite: int = 200) -> dict:
+    """
+    Cambios confirmados después de `since` por cualquier worker, con los productos ya
+    serializados. Sin cursor solo retorna el actual, desde donde empieza el sondeo.
+    """
+    db = SessionLocal()
+    try:
+        servicio = CambiosService(db)
+        actual = servicio.version_actual()
+        if since is None or since >= actual:
+            return {"cursor": since if since is not None else actual, "hay_mas": False, "productos": [], "eliminados": []}
+        cambios = servicio.obtener_cambios(since, limite)
+        cambios["productos"] = [schemas.Producto.model_validate(p).model_dump(mode="json") for p in cambios["productos"]]
+        return cambios
+    finally:
+        db.close()
+
+# Instancia global del difusor de cambios del catálogo. Con más de un worker
+# configurar EVENTOS_SONDEO (segundos, p. ej. 1) para repartir los cambios de todos
+difusor_eventos = DifusorEventos(
+    tamano_buffer=int(os.getenv("EVENTOS_BUFFER", "100")),
+    max_suscriptores=int(os.getenv("EVENTOS_MAX_SUSCRIPTORES", "10000")),
+    sondeo=float(os.getenv("EVENTOS_SONDEO", "0")),
+)
@@ -0,0 +1,167 @@
+from concurrent.futures import ProcessPoolExecutor
+from typing import Awaitable, Callable, Dict, Optional
+import asyncio
+import os
+import tempfile
+import time
+from services.storage_service import storage_service
+
+# Variantes generadas por cada imagen: nombre -> (formato, lado máximo en píxeles, calidad)
+VARIANTES = {
+    "thumb": ("WEBP", 400, 80),
+    "webp": ("WEBP", 1600, 82),
+    "avif": ("AVIF", 1600, 60),
+}
+
+def formatos_disponibles() -> Dict[str, tuple]:
+    """Variantes que el Pillow instalado puede codificar"""
+    try:
+        from PIL import features
+    except ImportError:  # Sin Pillow no se generan variantes, solo se guarda el original
+        return {}
+    return {nombre: spec for nombre, spec in VARIANTES.items() if features.check(spec[0].lower())}
+
+def generar_variantes(ruta_original: str, directorio: str, variantes: Dict[str, tuple]) -> Dict[str, str]:
+    """
+    Genera las variantes de una imagen. Se ejecuta dentro del pool de procesos.
+
+    Args:
+        ruta_original (str): Archivo temporal con la imagen original
+        directorio (str): Carpeta donde se escriben las variantes
+        variantes (dict): Variantes a generar (ver VARIANTES)
+
+    Returns:
+        dict: nombre de variante -> ruta del archivo generado
+    """
+    from PIL import Image, ImageOps
+
+    generadas = {}
+    with Image.open(ruta_original) as abierta:
+        # Las fotos de celular guardan la rotación en EXIF: se aplica a los píxeles
+        # porque las variantes no conservan esa etiqueta
+        original = ImageOps.exif_transpose(abierta)
+        if original.mode not in ("RGB", "RGBA"):
+            # "LA", "PA" y "P" con color transparente conservan el canal alfa
+            tiene_alfa = "A" in original.getbands() or "transparency" in original.info
+            original = original.convert("RGBA" if tiene_alfa else "RGB")
+        for nombre, (formato, lado_maximo, calidad) in variantes.items():
+            imagen = original.copy()
+            imagen.thumbnail((lado_maximo, lado_maximo))
+            ruta = os.path.join(directorio, f"{nombre}.{formato.lower()}")
+            imagen.save(ruta, formato, quality=calidad)
+            generadas[nombre] = ruta
+    return generadas
+
+class ImagenService:
+    """
+    Pipeline de variantes de imagen (miniatura, WebP y AVIF).
+
+    Las variantes se generan en un pool de procesos, después de responder la
+    subida, y se suben al mismo bucket con nombres derivados del original. Sus
+    URLs se guardan en los productos solo cuando ya están escritas.
+    """
+
+    def __init__(self, storage, max_procesos: int = 2, espera_producto: float = 30):
+        """
+        Constructor del servicio de imágenes.
+
+        Args:
+            storage (StorageService): Cliente de almacenamiento donde se suben las variantes
+            max_procesos (int): Procesos del pool de conversión
+            espera_producto (float): Segundos que se espera a que algún producto use la
+                                     imagen antes de descartar las URLs de sus variantes
+        """
+        self.storage = storage
+        self.max_procesos = max_procesos
+        self.espera_producto = espera_producto
+        self.pausa_producto = 1.0
+        self._variantes: Optional[Dict[str, tuple]] = None
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    @property
+    def variantes(self) -> Dict[str, tuple]:
+        """Variantes soportadas; Pillow se importa la primera vez que se consultan, no al arrancar"""
+        if self._variantes is None:
+            self._variantes = formatos_disponibles()
+        return self._variantes
+
+    @property
+    def pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.max_procesos)
+        return self._pool
+
+    def nombre_variante(self, nombre_archivo: str, variante: str) -> str:
+        """Nombre en el bucket de una variante del archivo original"""
+        base = os.path.splitext(nombre_archivo)[0]
+        return f"{base}_{variante}.{self.variantes[variante][0].lower()}"
+
+    async def procesar(self, nombre_archivo: str, ruta_original: str,
+                       guardar: Callable[[str, Dict[str, str]], Awaitable[int]]):
+        """
+        Genera y sube las variantes de una imagen ya subida (tarea en segundo plano).
+
+        Args:
+            nombre_archivo (str): Nombre del original en el bucket
+            ruta_original (str): Copia local temporal del original; se borra al terminar
+            guardar (callable): Recibe la URL del original y las URLs de las variantes
+                                escritas, y retorna cuántos productos actualizó
+        """
+        escritas: Dict[str, str] = {}
+        try:
+            with tempfile.TemporaryDirectory() as directorio:
+                loop = asyncio.get_running_loop()
+                generadas = await loop.run_in_executor(
+                    self.pool, generar_variantes, ruta_original, directorio, self.variantes
+                )
+                for variante, ruta in generadas.items():
+                    with open(ruta, "rb") as f:
+                        contenido = f.read()
+                    escritas[variante] = await self.storage.subir(
+                        self.nombre_variante(nombre_archivo, variante),
+                        contenido,
+                        tipo_contenido=f"image/{self.variantes[variante][0].lower()}",
+                    )
+            print(f"ImagenService: Variantes de {nombre_archivo} generadas: {list(generadas)}")
+        except Exception as e:
+            print(f"ImagenService: Error al generar variantes de {nombre_archivo}: {e}")
+        finally:
+            os.unlink(ruta_original)
+        if escritas:
+            # Solo las variantes que quedaron en el bucket; si alguna falló, su URL no se guarda
+            await self._guardar_urls(guardar, self.storage.url_publica(nombre_archivo), escritas)
+
+    async def _guardar_urls(self, guardar: Callable[[str, Dict[str, str]], Awaitable[int]],
+                            imagen_url: str, escritas: Dict[str, str]):
+        """
+        Guarda las URLs de las variantes escritas en los productos que usan la imagen.
+
+        El formulario de administración crea o edita el producto justo después de
+        recibir la URL del original, así que si todavía ningún producto la usa se
+        reintenta durante `espera_producto` segundos.
+        """
+        limite = time.monotonic() + self.espera_producto
+        while True:
+            try:
+                if await guardar(imagen_url, escritas):
+                    return
+            except Exception as e:
+                print(f"ImagenService: Error al guardar variantes de {imagen_url}: {e}")
+                return
+            if time.monotonic() >= limite:
+                print(f"ImagenService: Ningún producto usa {imagen_url}; sus variantes quedan sin asignar")
+                return
+            await asyncio.sleep(self.pausa_producto)
+
+    def cerrar(self):
+        """Detiene el pool de procesos (al apagar la aplicación)"""
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+# Instancia global del pipeline de imágenes
+imagen_service = ImagenService(
+    storage_service,
+    max_procesos=int(os.getenv("IMAGEN_PROCESOS", "2")),
+    espera_producto=float(os.getenv("IMAGEN_ESPERA_PRODUCTO", "30")),
+)
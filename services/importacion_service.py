@@ -0,0 +1,292 @@
+from pydantic import ValidationError
+from sqlalchemy import insert, or_, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from typing import BinaryIO, Dict, Iterable, Iterator, List, Tuple
+import csv
+import io
+import json
+import models, schemas
+from services.auth_service import PasswordManager
+from services.cache_service import catalogo_cache
+from services.cambios_service import siguiente_version
+from services.eventos_service import difusor_eventos
+
+# Solo formatos que se pueden leer fila por fila (un arreglo JSON tendría que cargarse completo)
+FORMATOS = ("csv", "jsonl")
+
+def detectar_formato(nombre_archivo: str) -> str:
+    """Deduce el formato de importación a partir de la extensión del archivo"""
+    nombre = (nombre_archivo or "").lower()
+    if nombre.endswith(".csv"):
+        return "csv"
+    if nombre.endswith((".jsonl", ".ndjson")):
+        return "jsonl"
+    raise ValueError("Formato no soportado: usa un archivo .csv o .jsonl (un objeto JSON por línea)")
+
+def leer_filas(archivo: BinaryIO, formato: str) -> Iterator[Tuple[int, object]]:
+    """
+    Lee un archivo de importación fila por fila, sin cargarlo completo en memoria.
+
+    Args:
+        archivo (BinaryIO): Archivo binario abierto (CSV con encabezado o un objeto JSON por línea)
+        formato (str): "csv" o "jsonl"
+
+    Yields:
+        (int, dict | str): Número de fila y sus datos, o el mensaje de error si no se pudo leer
+    """
+    texto = io.TextIOWrapper(archivo, encoding="utf-8-sig", newline="")
+    try:
+        if formato == "csv":
+            # La fila 1 es el encabezado
+            for numero, fila in enumerate(csv.DictReader(texto), start=2):
+                yield numero, {campo: (valor if valor != "" else None) for campo, valor in fila.items()}
+        elif formato == "jsonl":
+            for numero, linea in enumerate(texto, start=1):
+                if not linea.strip():
+                    continue
+                try:
+                    yield numero, json.loads(linea)
+                except json.JSONDecodeError as e:
+                    yield numero, f"JSON inválido: {e}"
+        else:
+            raise ValueError(f"Formato no soportado: {formato}")
+    finally:
+        # No cerrar el archivo original, solo separarlo del lector de texto
+        texto.detach()
+
+class ImportadorProductos:
+    """
+    Importación masiva de productos.
+
+    Valida cada fila con schemas.ProductoCreate e inserta las válidas en lotes
+    (un INSERT con muchas filas y un commit por lote). Las filas inválidas se
+    reportan con su número sin detener la carga. Si un lote falla en la base de
+    datos, se reintenta fila por fila para aislar las que causan el error.
+    """
+
+    # Errores detallados que se reportan como máximo (el resto solo se cuenta)
+    MAX_ERRORES_REPORTADOS = 1000
+
+    def __init__(self, db: Session, tamano_lote: int = 1000):
+        """
+        Constructor del importador.
+
+        Args:
+            db (Session): Sesión de base de datos SQLAlchemy
+            tamano_lote (int): Filas insertadas por cada INSERT/commit
+        """
+        self.db = db
+        self.tamano_lote = tamano_lote
+
+    def importar(self, filas: Iterable[Tuple[int, object]]) -> dict:
+        """
+        Importa productos desde un iterable de (número de fila, datos).
+
+        Returns:
+            dict: Filas procesadas, insertadas, con error y el detalle de los errores
+        """
+        resultado = {"total_filas": 0, "insertados": 0, "con_error": 0, "errores": []}
+        lote: List[Tuple[int, dict]] = []
+
+        for numero, datos in filas:
+            resultado["total_filas"] += 1
+            if isinstance(datos, str):
+                self._registrar_error(resultado, numero, datos)
+                continue
+            if isinstance(datos, dict):
+                datos = self._sin_vacios(datos)
+            try:
+                producto = schemas.ProductoCreate.model_validate(datos)
+            except ValidationError as e:
+                errores = "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors())
+                self._registrar_error(resultado, numero, errores)
+                continue
+            lote.append((numero, producto.model_dump()))
+            if len(lote) >= self.tamano_lote:
+                self._insertar_lote(lote, resultado)
+                lote = []
+
+        if lote:
+            self._insertar_lote(lote, resultado)
+        if resultado["insertados"]:
+            # Demasiados cambios para enviarlos uno por uno: los clientes recargan el catálogo
+            difusor_eventos.publicar("recargar", {})
+
+        print(f"ImportadorProductos: {resultado['insertados']} productos importados, "
+              f"{resultado['con_error']} filas con error")
+        return resultado
+
+    @staticmethod
+    def _sin_vacios(datos: dict) -> dict:
+        """
+        Quita las celdas vacías (None) para que tomen su valor por defecto. La
+        descripción vacía queda como texto vacío, igual que desde el formulario.
+        """
+        if "descripcion" in datos and datos["descripcion"] is None:
+            datos = {**datos, "descripcion": ""}
+        return {campo: valor for campo, valor in datos.items() if valor is not None}
+
+    def _insertar_lote(self, lote: List[Tuple[int, dict]], resultado: dict):
+        """Inserta un lote en una sola transacción; si falla, fila por fila"""
+        try:
+            version = siguiente_version(self.db)
+            self.db.execute(insert(models.Producto), [{**datos, "version": version} for _, datos in lote])
+            self.db.commit()
+            resultado["insertados"] += len(lote)
+        except Exception as e:
+            self.db.rollback()
+            print(f"ImportadorProductos: Lote con error ({e}), reintentando fila por fila")
+            for numero, datos in lote:
+                try:
+                    self.db.execute(insert(models.Producto), [{**datos, "version": siguiente_version(self.db)}])
+                    self.db.commit()
+                    resultado["insertados"] += 1
+                except Exception as error_fila:
+                    self.db.rollback()
+                    self._registrar_error(resultado, numero, f"Error de base de datos: {error_fila}")
+        finally:
+            catalogo_cache.invalidar()
+
+    def _registrar_error(self, resultado: dict, numero: int, mensaje: str):
+        resultado["con_error"] += 1
+        if len(resultado["errores"]) < self.MAX_ERRORES_REPORTADOS:
+            resultado["errores"].append({"fila": numero, "error": mensaje})
+
+class ImportadorUsuarios:
+    """
+    Importación masiva de usuarios (alta de cuentas del personal).
+
+    Por cada lote hace una sola consulta que encuentra todos los usernames y
+    emails que ya existen, calcula los hashes de las contraseñas restantes en
+    paralelo en el pool de KDF e inserta el lote con un INSERT y un commit. Las
+    restricciones UNIQUE de la tabla siguen siendo la garantía final: si otro
+    registro concurrente gana la carrera, el lote se reintenta fila por fila y
+    solo la fila en conflicto se reporta como error.
+    """
+
+    MAX_ERRORES_REPORTADOS = ImportadorProductos.MAX_ERRORES_REPORTADOS
+
+    def __init__(self, db: Session, tamano_lote: int = 500):
+        """
+        Constructor del importador.
+
+        Args:
+            db (Session): Sesión de base de datos SQLAlchemy
+            tamano_lote (int): Filas insertadas por cada INSERT/commit
+        """
+        self.db = db
+        self.tamano_lote = tamano_lote
+        self.password_manager = PasswordManager()
+
+    def importar(self, filas: Iterable[Tuple[int, object]]) -> dict:
+        """
+        Importa usuarios desde un iterable de (número de fila, datos).
+
+        Cada fila sigue schemas.UsuarioCreate (username, email, password y
+        opcionalmente is_admin). Un username o email repetido dentro del mismo
+        archivo se reporta en la segunda aparición.
+
+        Returns:
+            dict: Filas procesadas, insertadas, con error y el detalle de los errores
+        """
+        resultado = {"total_filas": 0, "insertados": 0, "con_error": 0, "errores": []}
+        lote: List[Tuple[int, schemas.UsuarioCreate]] = []
+        usernames_vistos, emails_vistos = set(), set()
+
+        for numero, datos in filas:
+            resultado["total_filas"] += 1
+            if isinstance(datos, str):
+                self._registrar_error(resultado, numero, datos)
+                continue
+            if isinstance(datos, dict):
+                # En CSV las celdas vacías llegan como None: se toman como columnas ausentes
+                datos = {campo: valor for campo, valor in datos.items() if valor is not None}
+            try:
+                usuario = schemas.UsuarioCreate.model_validate(datos)
+            except ValidationError as e:
+                errores = "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors())
+                self._registrar_error(resultado, numero, errores)
+                continue
+            if usuario.username in usernames_vistos:
+                self._registrar_error(resultado, numero, f"El usuario '{usuario.username}' está repetido en el archivo")
+                continue
+            if usuario.email in emails_vistos:
+                self._registrar_error(resultado, numero, f"El email '{usuario.email}' está repetido en el archivo")
+                continue
+            usernames_vistos.add(usuario.username)
+            emails_vistos.add(usuario.email)
+            lote.append((numero, usuario))
+            if len(lote) >= self.tamano_lote:
+                self._procesar_lote(lote, resultado)
+                lote = []
+
+        if lote:
+            self._procesar_lote(lote, resultado)
+
+        print(f"ImportadorUsuarios: {resultado['insertados']} usuarios importados, "
+              f"{resultado['con_error']} filas con error")
+        return resultado
+
+    def _existentes(self, lote: List[Tuple[int, schemas.UsuarioCreate]]) -> Tuple[set, set]:
+        """Usernames y emails del lote que ya están registrados, en una sola consulta"""
+        usernames = [usuario.username for _, usuario in lote]
+        emails = [usuario.email for _, usuario in lote]
+        filas = self.db.execute(
+            select(models.Usuario.username, models.Usuario.email)
+            .where(or_(models.Usuario.username.in_(usernames), models.Usuario.email.in_(emails)))
+        ).all()
+        return {username for username, _ in filas}, {email for _, email in filas}
+
+    def _procesar_lote(self, lote: List[Tuple[int, schemas.UsuarioCreate]], resultado: dict):
+        """Descarta los conflictos con usuarios existentes, calcula los hashes e inserta"""
+        usernames, emails = self._existentes(lote)
+        nuevos = []
+        for numero, usuario in lote:
+            if usuario.username in usernames:
+                self._registrar_error(resultado, numero, f"El usuario '{usuario.username}' ya existe")
+            elif usuario.email in emails:
+                self._registrar_error(resultado, numero, f"El email '{usuario.email}' ya está registrado")
+            else:
+                nuevos.append((numero, usuario))
+        if not nuevos:
+            return
+
+        # Los hashes se calculan antes de abrir la transacción: son la parte lenta del lote
+        hashes = self.password_manager.hash_passwords([usuario.password for _, usuario in nuevos])
+        self._insertar_lote([
+            (numero, {
+                "username": usuario.username,
+                "email": usuario.email,
+                "password": password,
+                "is_admin": usuario.is_admin,
+            })
+            for (numero, usuario), password in zip(nuevos, hashes)
+        ], resultado)
+
+    def _insertar_lote(self, lote: List[Tuple[int, Dict]], resultado: dict):
+        """Inserta un lote en una sola transacción; si falla, fila por fila"""
+        try:
+            self.db.execute(insert(models.Usuario), [datos for _, datos in lote])
+            self.db.commit()
+            resultado["insertados"] += len(lote)
+        except Exception as e:
+            self.db.rollback()
+            print(f"ImportadorUsuarios: Lote con error ({e}), reintentando fila por fila")
+            for numero, datos in lote:
+                try:
+                    self.db.execute(insert(models.Usuario), [datos])
+                    self.db.commit()
+                    resultado["insertados"] += 1
+                except IntegrityError:
+                    # Se registró al mismo tiempo por otra vía (registro o una importación paralela)
+                    self.db.rollback()
+                    self._registrar_error(resultado, numero, "El usuario o el email ya existe")
+                except Exception as error_fila:
+                    self.db.rollback()
+                    self._registrar_error(resultado, numero, f"Error de base de datos: {error_fila}")
+
+    def _registrar_error(self, resultado: dict, numero: int, mensaje: str):
+        resultado["con_error"] += 1
+        if len(resultado["errores"]) < self.MAX_ERRORES_REPORTADOS:
+            resultado["errores"].append({"fila": numero, "error": mensaje})
@@ -0,0 +1,208 @@
+from bisect import bisect_left
+from contextvars import ContextVar
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.routing import Match
+from typing import Callable, Dict, Optional, Tuple
+import threading
+import time
+
+# Límites (en segundos) de los buckets de los histogramas de latencia
+BUCKETS_LATENCIA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+BUCKETS_CONSULTAS = (0, 1, 2, 3, 5, 10, 25, 50, 100)
+
+class Histograma:
+    """Histograma acumulativo al estilo Prometheus, con una serie por combinación de etiquetas"""
+
+    def __init__(self, nombre: str, ayuda: str, buckets: tuple):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.buckets = buckets
+        self._series: Dict[Tuple, list] = {}  # etiquetas -> [conteo por bucket..., conteo sobre el último, suma]
+
+    def observar(self, etiquetas: Tuple, valor: float):
+        serie = self._series.get(etiquetas)
+        if serie is None:
+            serie = self._series.setdefault(etiquetas, [0] * (len(self.buckets) + 2))
+        # Se guarda el conteo del primer bucket que contiene el valor; se acumula al exportar
+        serie[bisect_left(self.buckets, valor)] += 1
+        serie[-1] += valor
+
+    def exportar(self, nombres_etiquetas: Tuple[str, ...]) -> list:
+        lineas = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} histogram"]
+        for etiquetas, serie in sorted(self._series.items()):
+            base = ",".join(f'{n}="{_escapar(v)}"' for n, v in zip(nombres_etiquetas, etiquetas))
+            separador = "," if base else ""
+            acumulado = 0
+            for limite, conteo in zip(self.buckets, serie):
+                acumulado += conteo
+                lineas.append(f'{self.nombre}_bucket{{{base}{separador}le="{limite}"}} {acumulado}')
+            acumulado += serie[len(self.buckets)]
+            lineas.append(f'{self.nombre}_bucket{{{base}{separador}le="+Inf"}} {acumulado}')
+            etiquetas_serie = f"{{{base}}}" if base else ""
+            lineas.append(f"{self.nombre}_sum{etiquetas_serie} {serie[-1]}")
+            lineas.append(f"{self.nombre}_count{etiquetas_serie} {acumulado}")
+        return lineas
+
+def _escapar(valor) -> str:
+    return str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+class _ConsultasSolicitud:
+    """Consultas SQL y tiempo de base de datos acumulados durante una solicitud"""
+    __slots__ = ("consultas", "segundos")
+
+    def __init__(self):
+        self.consultas = 0
+        self.segundos = 0.0
+
+# Contador de la solicitud en curso; se propaga a los hilos que atienden rutas síncronas
+_solicitud_actual: ContextVar[Optional[_ConsultasSolicitud]] = ContextVar("solicitud_actual", default=None)
+
+class MetricasService:
+    """
+    Registro de métricas de la aplicación en formato de texto de Prometheus.
+
+    - Latencia, códigos de estado y solicitudes en curso por ruta (MetricasMiddleware).
+    - Consultas SQL y tiempo de base de datos por solicitud (eventos del engine).
+    - Métricas adicionales registradas con agregar_fuente (por ejemplo sesiones).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencia = Histograma(
+            "http_request_duration_seconds", "Latencia de las solicitudes HTTP por ruta", BUCKETS_LATENCIA
+        )
+        self.consultas_por_solicitud = Histograma(
+            "http_request_db_queries", "Consultas SQL ejecutadas por solicitud", BUCKETS_CONSULTAS
+        )
+        self.tiempo_db_por_solicitud = Histograma(
+            "http_request_db_duration_seconds", "Tiempo en base de datos por solicitud", BUCKETS_LATENCIA
+        )
+        self.consultas_db = Histograma(
+            "db_query_duration_seconds", "Duración de cada consulta SQL", BUCKETS_LATENCIA
+        )
+        self.respuestas: Dict[Tuple, int] = {}  # (método, ruta, estado) -> total
+        self.en_curso: Dict[Tuple, int] = {}  # (método, ruta) -> solicitudes activas
+        self._fuentes: Dict[str, Callable[[], dict]] = {}
+
+    def agregar_fuente(self, prefijo: str, fuente: Callable[[], dict]):
+        """Registra una función que retorna valores numéricos a exportar como gauges `<prefijo>_<clave>`"""
+        self._fuentes[prefijo] = fuente
+
+    def inicio_solicitud(self, metodo: str, ruta: str):
+        with self._lock:
+            clave = (metodo, ruta)
+            self.en_curso[clave] = self.en_curso.get(clave, 0) + 1
+
+    def fin_solicitud(self, metodo: str, ruta: str, estado: int, duracion: float,
+                      consultas: _ConsultasSolicitud):
+        with self._lock:
+            self.en_curso[(metodo, ruta)] -= 1
+            clave = (metodo, ruta, str(estado))
+            self.respuestas[clave] = self.respuestas.get(clave, 0) + 1
+            self.latencia.observar((metodo, ruta), duracion)
+            self.consultas_por_solicitud.observar((metodo, ruta), consultas.consultas)
+            self.tiempo_db_por_solicitud.observar((metodo, ruta), consultas.segundos)
+
+    def registrar_consulta(self, duracion: float):
+        solicitud = _solicitud_actual.get()
+        if solicitud is not None:
+            solicitud.consultas += 1
+            solicitud.segundos += duracion
+        with self._lock:
+            self.consultas_db.observar((), duracion)
+
+    def instrumentar_engine(self, engine: Engine):
+        """Mide cada consulta ejecutada por el engine"""
+        @event.listens_for(engine, "before_cursor_execute")
+        def _antes(conn, cursor, statement, parameters, context, executemany):
+            conn.info.setdefault("inicio_consulta", []).append(time.perf_counter())
+
+        @event.listens_for(engine, "after_cursor_execute")
+        def _despues(conn, cursor, statement, parameters, context, executemany):
+            inicio = conn.info["inicio_consulta"].pop()
+            self.registrar_consulta(time.perf_counter() - inicio)
+
+    def exportar(self) -> str:
+        """Texto en formato de exposición de Prometheus"""
+        with self._lock:
+            lineas = self.latencia.exportar(("method", "route"))
+            lineas.append("# HELP http_responses_total Respuestas HTTP por ruta y código de estado")
+            lineas.append("# TYPE http_responses_total counter")
+            for (metodo, ruta, estado), total in sorted(self.respuestas.items()):
+                lineas.append(
+                    f'http_responses_total{{method="{metodo}",route="{_escapar(ruta)}",status="{estado}"}} {total}'
+                )
+            lineas.append("# HELP http_requests_in_flight Solicitudes HTTP en curso")
+            lineas.append("# TYPE http_requests_in_flight gauge")
+            for (metodo, ruta), activas in sorted(self.en_curso.items()):
+                lineas.append(f'http_requests_in_flight{{method="{metodo}",route="{_escapar(ruta)}"}} {activas}')
+            lineas += self.consultas_por_solicitud.exportar(("method", "route"))
+            lineas += self.tiempo_db_por_solicitud.exportar(("method", "route"))
+            lineas += self.consultas_db.exportar(())
+
+        for prefijo, fuente in self._fuentes.items():
+            try:
+                valores = fuente()
+            except Exception as e:
+                print(f"MetricasService: Error al leer métricas de '{prefijo}': {e}")
+                continue
+            for clave, valor in valores.items():
+                if isinstance(valor, (int, float)):
+                    lineas.append(f"# TYPE {prefijo}_{clave} gauge")
+                    lineas.append(f"{prefijo}_{clave} {valor}")
+        return "\n".join(lineas) + "\n"
+
+class MetricasMiddleware:
+    """Middleware ASGI que mide cada solicitud HTTP hasta que termina de enviarse la respuesta"""
+
+    def __init__(self, app, metricas: MetricasService, rutas: list):
+        """
+        Args:
+            app: Aplicación ASGI siguiente
+            metricas (MetricasService): Registro donde se guardan las mediciones
+            rutas (list): Rutas de la aplicación (app.routes), para etiquetar por plantilla de ruta
+        """
+        self.app = app
+        self.metricas = metricas
+        self.rutas = rutas
+
+    def _plantilla_ruta(self, scope, rutas: Optional[list] = None) -> str:
+        """Plantilla de la ruta que atenderá la solicitud (p. ej. /productos/{producto_id})"""
+        for ruta in self.rutas if rutas is None else rutas:
+            coincidencia, _ = ruta.matches(scope)
+            if coincidencia == Match.FULL:
+                # Los routers incluidos con include_router no tienen path propio: se busca en sus rutas
+                subrutas = getattr(getattr(ruta, "original_router", None), "routes", None)
+                if subrutas is not None:
+                    return self._plantilla_ruta(scope, subrutas)
+                return getattr(ruta, "path", "desconocida")
+        return "desconocida"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        metodo = scope["method"]
+        ruta = self._plantilla_ruta(scope)
+        self.metricas.inicio_solicitud(metodo, ruta)
+        consultas = _ConsultasSolicitud()
+        token = _solicitud_actual.set(consultas)
+        estado = 500
+        inicio = time.perf_counter()
+
+        async def enviar(mensaje):
+            nonlocal estado
+            if mensaje["type"] == "http.response.start":
+                estado = mensaje["status"]
+            await send(mensaje)
+
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            _solicitud_actual.reset(token)
+            self.metricas.fin_solicitud(metodo, ruta, estado, time.perf_counter() - inicio, consultas)
+
+# Instancia global del registro de métricas
+metricas_service = MetricasService()
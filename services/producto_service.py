@@ -1,12 +1,24 @@
+from sqlalchemy import delete, select
+from sqlalchemy.engine import Row
 from sqlalchemy.orm import Session
 from fastapi import HTTPException
 import models, schemas
-from typing import List, Optional
+from services import consultas_productos as consultas
+from services.busqueda_service import BusquedaProductos
+from services.cache_service import catalogo_cache
+from services.cambios_service import (
+    CambiosService, registrar_eliminados, registrar_version, siguiente_version, version_en_sentencia,
+)
+from services.eventos_service import difusor_eventos
+from typing import Any, Callable, Dict, Hashable, Iterator, List, Optional
 
 class ProductoService:
     """
     Servicio para operaciones CRUD de productos usando programación orientada a objetos.
     Implementa el patrón Repository con encapsulación de la lógica de negocio.
+    
+    Las consultas y sentencias vienen de consultas_productos, compartidas con
+    ProductoServiceAsync.
     """
     
     def __init__(self, db: Session):
@@ -17,6 +29,67 @@ class ProductoService:
             db (Session): Sesión de base de datos SQLAlchemy
         """
         self.db = db
+        self._al_dia: Optional[bool] = None
+
+    def _invalidar_cache(self):
+        """Descarta los datos derivados del catálogo después de una escritura"""
+        catalogo_cache.invalidar()
+
+    @staticmethod
+    def notificar_cambio(producto: models.Producto):
+        """Envía el producto creado o modificado a los clientes suscritos a /productos/eventos"""
+        if difusor_eventos.suscriptores:
+            difusor_eventos.publicar("producto", schemas.Producto.model_validate(producto).model_dump(mode="json"))
+
+    @staticmethod
+    def notificar_eliminados(ids: List[int]):
+        """Avisa a los clientes suscritos qué productos se eliminaron"""
+        if ids:
+            difusor_eventos.publicar("eliminado", {"ids": list(ids)})
+
+    def obtener_cacheado(self, clave: Hashable, version: int, cargar: Callable[[], Any]) -> Any:
+        """
+        Obtiene un resultado de lectura desde la caché del catálogo o lo calcula.
+        
+        Args:
+            clave (Hashable): Identifica la consulta (ruta y parámetros)
+            version (int): Versión del catálogo leída antes de consultar
+            cargar (Callable): Función que consulta y serializa el resultado si no está en caché
+            
+        Returns:
+            Any: El valor guardado o el recién calculado
+        """
+        valor = catalogo_cache.obtener(clave, version)
+        if valor is None:
+            guardar = self._lectura_al_dia()
+            valor = cargar()
+            if guardar:
+                catalogo_cache.guardar(clave, valor, version)
+        else:
+            print(f"ProductoService: Respuesta {clave} servida desde caché")
+        return valor
+
+    @property
+    def lectura_atrasada(self) -> bool:
+        """True si la última carga vino de una réplica atrasada (no se guardó en caché)"""
+        return self._al_dia is False
+
+    def _lectura_al_dia(self) -> bool:
+        """
+        Indica si lo que se lea con esta sesión incluye todas las escrituras de este
+        proceso. En la réplica se compara su contador de cambios (leído antes que las
+        filas) con el último confirmado aquí; si va atrasada el resultado se responde
+        pero no se guarda en caché. Se consulta una vez por servicio (por petición).
+        """
+        if self._al_dia is None:
+            minima = catalogo_cache.version_bd
+            if not minima or not self.db.info.get("replica"):
+                self._al_dia = True
+            else:
+                self._al_dia = CambiosService(self.db).version_actual() >= minima
+                if not self._al_dia:
+                    print("ProductoService: Réplica atrasada, la respuesta no se guarda en caché")
+        return self._al_dia
 
     def crear_producto(self, data: schemas.ProductoCreate) -> models.Producto:
         """
@@ -33,10 +106,12 @@ class ProductoService:
         """
         try:
             print(f"ProductoService: Creando producto con datos: {data.dict()}")
-            producto = models.Producto(**data.dict())
+            producto = models.Producto(**data.dict(), version=siguiente_version(self.db))
             self.db.add(producto)
             self.db.commit()
+            self._invalidar_cache()
             self.db.refresh(producto)
+            self.notificar_cambio(producto)
             print(f"ProductoService: Producto creado exitosamente con ID: {producto.id}")
             return producto
         except Exception as e:
@@ -44,24 +119,73 @@ class ProductoService:
             print(f"ProductoService: Error al crear producto: {e}")
             raise HTTPException(status_code=500, detail=f"Error al crear producto: {str(e)}")
 
-    def obtener_productos(self) -> List[models.Producto]:
+    def obtener_filas(self, limit: Optional[int] = None, after: Optional[int] = None) -> List[Row]:
         """
-        Obtiene todos los productos de la base de datos.
+        Obtiene los productos como tuplas de columnas, para serializarlos con filas_json.
         
+        Las rutas solo convierten el resultado a JSON, así que no se crean objetos
+        ORM ni de Pydantic.
+        
+        Args:
+            limit (int | None): Cantidad máxima de productos; None retorna todos
+            after (int | None): ID del último producto de la página anterior
+            
         Returns:
-            List[Producto]: Lista de todos los productos
+            List[Row]: Filas con las columnas de schemas.Producto, ordenadas por ID
             
         Raises:
             HTTPException: Si hay error en la consulta
         """
         try:
-            productos = self.db.query(models.Producto).all()
-            print(f"ProductoService: Obtenidos {len(productos)} productos")
-            return productos
+            filas = self.db.execute(consultas.consulta_filas(limit, after)).all()
+            print(f"ProductoService: Obtenidos {len(filas)} productos después del ID {after}")
+            return filas
         except Exception as e:
             print(f"ProductoService: Error al obtener productos: {e}")
             raise HTTPException(status_code=500, detail=f"Error al obtener productos: {str(e)}")
 
+    def buscar_filas(self, campo: str, texto: str) -> List[Row]:
+        """
+        Busca productos por categoría o marca y los retorna como tuplas de columnas.
+        
+        Args:
+            campo (str): "categoria" o "marca"
+            texto (str): Subcadena a buscar
+            
+        Returns:
+            List[Row]: Filas con las columnas de schemas.Producto, ordenadas por ID
+        """
+        try:
+            condicion = BusquedaProductos(self.db).condicion(campo, texto)
+            filas = self.db.execute(consultas.consulta_filas().where(condicion)).all()
+            print(f"ProductoService: Encontrados {len(filas)} productos con {campo} '{texto}'")
+            return filas
+        except Exception as e:
+            print(f"ProductoService: Error al buscar por {campo}: {e}")
+            return []
+
+    def iterar_productos(self, tamano_lote: int = 500) -> Iterator[models.Producto]:
+        """
+        Recorre todos los productos con un cursor del lado del servidor.
+        
+        Las filas se leen en lotes de `tamano_lote`, de modo que la memoria usada
+        se mantiene constante sin importar el tamaño del catálogo.
+        
+        Args:
+            tamano_lote (int): Número de filas a traer por cada lectura del cursor
+            
+        Yields:
+            Producto: Cada producto en orden de ID
+        """
+        query = (
+            self.db.query(models.Producto)
+            .order_by(models.Producto.id)
+            .execution_options(stream_results=True)
+            .yield_per(tamano_lote)
+        )
+        for producto in query:
+            yield producto
+
     def obtener_producto_por_id(self, producto_id: int) -> Optional[models.Producto]:
         """
         Obtiene un producto específico por su ID.
@@ -101,8 +225,11 @@ class ProductoService:
             if not producto:
                 raise HTTPException(status_code=404, detail="Producto no encontrado")
             
+            registrar_eliminados(self.db, [producto_id], siguiente_version(self.db))
             self.db.delete(producto)
             self.db.commit()
+            self._invalidar_cache()
+            self.notificar_eliminados([producto_id])
             print(f"ProductoService: Producto {producto_id} eliminado exitosamente")
             return {"mensaje": "Producto eliminado exitosamente"}
         except HTTPException:
@@ -134,9 +261,12 @@ class ProductoService:
             print(f"ProductoService: Actualizando producto {producto_id} con datos: {data.dict()}")
             for campo, valor in data.dict().items():
                 setattr(producto, campo, valor)
+            producto.version = siguiente_version(self.db)
             
             self.db.commit()
+            self._invalidar_cache()
             self.db.refresh(producto)
+            self.notificar_cambio(producto)
             print(f"ProductoService: Producto {producto_id} actualizado exitosamente")
             return producto
         except HTTPException:
@@ -146,54 +276,276 @@ class ProductoService:
             print(f"ProductoService: Error al actualizar producto: {e}")
             raise HTTPException(status_code=500, detail=f"Error al actualizar producto: {str(e)}")
 
-    def buscar_productos_por_categoria(self, categoria: str) -> List[models.Producto]:
+    def actualizar_producto_parcial(self, producto_id: int, data: schemas.ProductoUpdate) -> schemas.Producto:
         """
-        Busca productos por categoría.
+        Actualiza solo los campos enviados de un producto.
+        
+        Los cambios se escriben con un único UPDATE ... RETURNING, sin SELECT previo
+        ni refresh posterior: la respuesta se arma con la fila que retorna el UPDATE.
+        El número de cambio se toma dentro del UPDATE y solo se registra si encontró la fila.
         
         Args:
-            categoria (str): Categoría a buscar
+            producto_id (int): ID del producto a actualizar
+            data (ProductoUpdate): Campos a cambiar (los no enviados se conservan)
             
         Returns:
-            List[Producto]: Lista de productos de la categoría
+            Producto: El producto actualizado
+            
+        Raises:
+            HTTPException: Si el producto no existe, algún campo obligatorio llega vacío
+                           o hay error en la actualización
         """
+        valores = consultas.valores_parciales(data)
+        if not valores:
+            producto = self.obtener_producto_por_id(producto_id)
+            if not producto:
+                raise HTTPException(status_code=404, detail="Producto no encontrado")
+            return producto
+
         try:
-            productos = self.db.query(models.Producto).filter(models.Producto.categoria.ilike(f"%{categoria}%")).all()
-            print(f"ProductoService: Encontrados {len(productos)} productos en categoría '{categoria}'")
-            return productos
+            print(f"ProductoService: Actualizando parcialmente producto {producto_id} con datos: {valores}")
+            producto = self.db.scalars(
+                consultas.sentencia_parcial(producto_id, valores, version_en_sentencia(self.db))
+            ).one_or_none()
+            if producto is None:
+                self.db.rollback()
+                raise HTTPException(status_code=404, detail="Producto no encontrado")
+            registrar_version(self.db, producto.version)
+            # Se serializa antes del commit, que expira la instancia y forzaría otro SELECT
+            producto = schemas.Producto.model_validate(producto)
+            self.db.commit()
+
+            self._invalidar_cache()
+            self.notificar_cambio(producto)
+            print(f"ProductoService: Producto {producto_id} actualizado exitosamente")
+            return producto
+        except HTTPException:
+            raise
         except Exception as e:
-            print(f"ProductoService: Error al buscar por categoría: {e}")
-            return []
+            self.db.rollback()
+            print(f"ProductoService: Error al actualizar producto: {e}")
+            raise HTTPException(status_code=500, detail=f"Error al actualizar producto: {str(e)}")
 
-    def buscar_productos_por_marca(self, marca: str) -> List[models.Producto]:
+    def ajustar_stock(self, producto_id: int, delta: int, permitir_negativo: bool = False) -> schemas.Producto:
         """
-        Busca productos por marca.
+        Suma (o resta) unidades al stock de un producto de forma atómica.
+        
+        Se ejecuta un solo UPDATE ... SET cantidad = cantidad + delta ... RETURNING,
+        así los ajustes concurrentes (ventas y reposiciones) nunca se pisan. Un ajuste
+        rechazado no consume número de cambio (ver version_en_sentencia).
         
         Args:
-            marca (str): Marca a buscar
+            producto_id (int): ID del producto
+            delta (int): Unidades a sumar (negativo para restar)
+            permitir_negativo (bool): Si es False, rechaza el ajuste cuando el stock quedaría negativo
             
         Returns:
-            List[Producto]: Lista de productos de la marca
+            Producto: El producto con la cantidad actualizada
+            
+        Raises:
+            HTTPException: 404 si el producto no existe, 409 si el stock quedaría negativo
         """
         try:
-            productos = self.db.query(models.Producto).filter(models.Producto.marca.ilike(f"%{marca}%")).all()
-            print(f"ProductoService: Encontrados {len(productos)} productos de marca '{marca}'")
-            return productos
+            producto = self.db.scalars(
+                consultas.sentencia_stock(producto_id, delta, version_en_sentencia(self.db), permitir_negativo)
+            ).one_or_none()
+
+            if producto is None:
+                self.db.rollback()
+                # Solo en el caso de fallo se consulta por qué no se aplicó
+                if self.db.get(models.Producto, producto_id) is None:
+                    raise HTTPException(status_code=404, detail="Producto no encontrado")
+                raise HTTPException(status_code=409, detail="Stock insuficiente para el ajuste")
+            registrar_version(self.db, producto.version)
+            # Se serializa antes del commit, que expira la instancia y forzaría otro SELECT
+            producto = schemas.Producto.model_validate(producto)
+            self.db.commit()
+
+            self._invalidar_cache()
+            self.notificar_cambio(producto)
+            print(f"ProductoService: Stock del producto {producto_id} ajustado en {delta} (nuevo: {producto.cantidad})")
+            return producto
+        except HTTPException:
+            raise
         except Exception as e:
-            print(f"ProductoService: Error al buscar por marca: {e}")
-            return []
+            self.db.rollback()
+            print(f"ProductoService: Error al ajustar stock: {e}")
+            raise HTTPException(status_code=500, detail=f"Error al ajustar stock: {str(e)}")
+
+    def asignar_variantes(self, imagen_url: str, urls: Dict[str, str]) -> int:
+        """
+        Guarda las URLs de variantes ya subidas en los productos que usan la imagen original.
+
+        Lo llama el pipeline de imágenes después de escribir cada variante, así un
+        producto nunca apunta a una variante que no existe.
+
+        Args:
+            imagen_url (str): URL de la imagen original
+            urls (dict): Variante ("thumb", "webp", "avif") -> URL de la variante escrita
+
+        Returns:
+            int: Cantidad de productos actualizados (0 si ninguno usa todavía la imagen)
+
+        Raises:
+            HTTPException: Si hay error en la actualización
+        """
+        valores = {f"imagen_{variante}_url": url for variante, url in urls.items()}
+        try:
+            productos = self.db.scalars(
+                consultas.sentencia_variantes(imagen_url, valores, version_en_sentencia(self.db))
+            ).all()
+            if not productos:
+                self.db.rollback()
+                return 0
+            # En PostgreSQL cada fila toma su propio número; en SQLite todas comparten uno
+            for version in sorted({producto.version for producto in productos}):
+                registrar_version(self.db, version)
+            productos = [schemas.Producto.model_validate(producto) for producto in productos]
+            self.db.commit()
+
+            self._invalidar_cache()
+            for producto in productos:
+                self.notificar_cambio(producto)
+            print(f"ProductoService: Variantes {list(urls)} asignadas a {len(productos)} productos")
+            return len(productos)
+        except Exception as e:
+            self.db.rollback()
+            print(f"ProductoService: Error al asignar variantes de imagen: {e}")
+            raise HTTPException(status_code=500, detail=f"Error al asignar variantes: {str(e)}")
+
+    def actualizar_productos_lote(self, cambios: List[schemas.ProductoUpdateLote]) -> List[dict]:
+        """
+        Actualiza varios productos en una sola transacción.
+        
+        Cada elemento trae el ID y solo los campos a cambiar. Se aplican con un solo
+        UPDATE ... RETURNING id (ver consultas.sentencia_lote), sin cargar los productos;
+        los IDs que el UPDATE no encontró se informan como no encontrados.
+        
+        Args:
+            cambios (List[ProductoUpdateLote]): Cambios a aplicar, uno por producto
+            
+        Returns:
+            List[dict]: Resultado por elemento ({"id", "ok", "error"}); los elementos que dejan
+                        un campo obligatorio en NULL se rechazan sin afectar a los demás
+            
+        Raises:
+            HTTPException: Si hay error en la actualización (no se aplica ningún cambio)
+        """
+        try:
+            resultados, combinados = [], {}
+            for cambio in cambios:
+                valores = cambio.model_dump(exclude_unset=True)
+                nulos = consultas.nulos_obligatorios(valores)
+                if nulos:
+                    resultados.append({"id": cambio.id, "ok": False,
+                                       "error": f"Campos obligatorios sin valor: {', '.join(nulos)}"})
+                else:
+                    resultados.append({"id": cambio.id, "ok": True})
+                    # Un ID repetido acumula sus campos; el último valor de cada campo gana
+                    combinados.setdefault(cambio.id, {}).update(valores)
+
+            con_campos = {producto_id: valores for producto_id, valores in combinados.items() if len(valores) > 1}
+            actualizados = set()
+            if con_campos:
+                version = siguiente_version(self.db)
+                actualizados = set(self.db.scalars(consultas.sentencia_lote(con_campos, version)))
+            existentes = set(actualizados)
+            sin_campos = set(combinados) - set(con_campos)
+            if sin_campos:
+                # Elementos solo con ID: no se escriben, solo se comprueba que existan
+                existentes |= set(self.db.scalars(select(models.Producto.id).where(models.Producto.id.in_(sin_campos))))
+            for resultado in resultados:
+                if resultado["ok"] and resultado["id"] not in existentes:
+                    resultado.update(ok=False, error="Producto no encontrado")
+
+            if actualizados:
+                self.db.commit()
+                self._invalidar_cache()
+                # Solo se conocen los campos enviados: los clientes los aplican sobre su copia
+                for producto_id in actualizados:
+                    difusor_eventos.publicar("producto", {**con_campos[producto_id], "version": version})
+            else:
+                self.db.rollback()
+            print(f"ProductoService: {len(actualizados)} productos actualizados en lote")
+            return resultados
+        except Exception as e:
+            self.db.rollback()
+            print(f"ProductoService: Error al actualizar productos en lote: {e}")
+            raise HTTPException(status_code=500, detail=f"Error al actualizar productos: {str(e)}")
+
+    def eliminar_productos_lote(self, ids: List[int]) -> List[dict]:
+        """
+        Elimina varios productos con un solo DELETE ... RETURNING.
+        
+        Args:
+            ids (List[int]): IDs de los productos a eliminar
+            
+        Returns:
+            List[dict]: Resultado por ID ({"id", "ok", "error"})
+            
+        Raises:
+            HTTPException: Si hay error en la eliminación (no se elimina ninguno)
+        """
+        # Un ID repetido se reporta una sola vez
+        ids = list(dict.fromkeys(ids))
+        try:
+            version = siguiente_version(self.db)
+            eliminados = set(self.db.scalars(
+                delete(models.Producto)
+                .where(models.Producto.id.in_(ids))
+                .returning(models.Producto.id)
+                .execution_options(synchronize_session=False)
+            ))
+            registrar_eliminados(self.db, sorted(eliminados), version)
+            self.db.commit()
+            if eliminados:
+                self._invalidar_cache()
+                self.notificar_eliminados(sorted(eliminados))
+            print(f"ProductoService: {len(eliminados)} productos eliminados en lote")
+            return [
+                {"id": producto_id, "ok": True} if producto_id in eliminados
+                else {"id": producto_id, "ok": False, "error": "Producto no encontrado"}
+                for producto_id in ids
+            ]
+        except Exception as e:
+            self.db.rollback()
+            print(f"ProductoService: Error al eliminar productos en lote: {e}")
+            raise HTTPException(status_code=500, detail=f"Error al eliminar productos: {str(e)}")
+
+    def obtener_facetas(self) -> dict:
+        """
+        Obtiene las marcas y categorías distintas con la cantidad de productos de cada una.
+        
+        Se calcula con una sola consulta GROUP BY por (marca, categoría).
+        
+        Returns:
+            dict: {"marcas": [...], "categorias": [...]} con elementos {"valor", "cantidad"}
+            
+        Raises:
+            HTTPException: Si hay error en la consulta
+        """
+        try:
+            facetas = consultas.agrupar_facetas(self.db.execute(consultas.consulta_facetas()).all())
+            print(f"ProductoService: Facetas calculadas ({len(facetas['marcas'])} marcas, "
+                  f"{len(facetas['categorias'])} categorías)")
+            return facetas
+        except Exception as e:
+            print(f"ProductoService: Error al obtener facetas: {e}")
+            raise HTTPException(status_code=500, detail=f"Error al obtener facetas: {str(e)}")
 
-    def verificar_stock_bajo(self, limite: int = 5) -> List[models.Producto]:
+    def verificar_stock_bajo(self, limite: Optional[int] = None) -> List[models.Producto]:
         """
         Obtiene productos con stock bajo.
         
         Args:
-            limite (int): Cantidad límite para considerar stock bajo
+            limite (int | None): Cantidad límite para todos los productos; si es None
+                                 se usa el stock_minimo de cada producto
             
         Returns:
-            List[Producto]: Lista de productos con stock bajo
+            List[Producto]: Lista de productos con stock bajo, ordenados por ID
         """
         try:
-            productos = self.db.query(models.Producto).filter(models.Producto.cantidad <= limite).all()
+            productos = self.db.scalars(consultas.consulta_stock_bajo(limite)).all()
             print(f"ProductoService: Encontrados {len(productos)} productos con stock bajo")
             return productos
         except Exception as e:
@@ -0,0 +1,330 @@
+from sqlalchemy.engine import Row
+from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi import HTTPException
+import models, schemas
+from services import consultas_productos as consultas
+from services.cache_service import catalogo_cache
+from services.cambios_service import (
+    registrar_version_async, sentencias_lapidas, siguiente_version_async, version_actual_async, version_en_sentencia,
+)
+from services.producto_service import ProductoService
+from typing import Any, Awaitable, Callable, Hashable, List, Optional
+
+class ProductoServiceAsync:
+    """
+    Versión asíncrona de ProductoService sobre AsyncSession (asyncpg o aiosqlite).
+
+    Mientras espera a la base de datos libera el event loop en lugar de ocupar un
+    hilo del threadpool, así la concurrencia no queda limitada por ese pool.
+    Las consultas y sentencias son las de consultas_productos, las mismas que usa
+    ProductoService; aquí solo se ejecutan con await.
+    """
+
+    def __init__(self, db: AsyncSession):
+        """
+        Constructor del servicio de productos.
+
+        Args:
+            db (AsyncSession): Sesión asíncrona de base de datos SQLAlchemy
+        """
+        self.db = db
+        self._al_dia: Optional[bool] = None
+
+    def _invalidar_cache(self):
+        """Descarta los datos derivados del catálogo después de una escritura"""
+        catalogo_cache.invalidar()
+
+    async def obtener_cacheado(self, clave: Hashable, version: int, cargar: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Obtiene un resultado de lectura desde la caché del catálogo o lo calcula.
+
+        Args:
+            clave (Hashable): Identifica la consulta (ruta y parámetros)
+            version (int): Versión del catálogo leída antes de consultar
+            cargar (Callable): Corrutina que consulta y serializa el resultado si no está en caché
+
+        Returns:
+            Any: El valor guardado o el recién calculado
+        """
+        valor = catalogo_cache.obtener(clave, version)
+        if valor is None:
+            guardar = await self._lectura_al_dia()
+            valor = await cargar()
+            if guardar:
+                catalogo_cache.guardar(clave, valor, version)
+        else:
+            print(f"ProductoServiceAsync: Respuesta {clave} servida desde caché")
+        return valor
+
+    @property
+    def lectura_atrasada(self) -> bool:
+        """True si la última carga vino de una réplica atrasada (no se guardó en caché)"""
+        return self._al_dia is False
+
+    async def _lectura_al_dia(self) -> bool:
+        """Igual que ProductoService._lectura_al_dia, para AsyncSession"""
+        if self._al_dia is None:
+            minima = catalogo_cache.version_bd
+            if not minima or not self.db.info.get("replica"):
+                self._al_dia = True
+            else:
+                self._al_dia = await version_actual_async(self.db) >= minima
+                if not self._al_dia:
+                    print("ProductoServiceAsync: Réplica atrasada, la respuesta no se guarda en caché")
+        return self._al_dia
+
+    async def crear_producto(self, data: schemas.ProductoCreate) -> models.Producto:
+        """
+        Crea un nuevo producto en la base de datos.
+
+        Args:
+            data (ProductoCreate): Datos del producto a crear
+
+        Returns:
+            Producto: El producto creado
+
+        Raises:
+            HTTPException: Si hay error en la creación
+        """
+        try:
+            producto = models.Producto(**data.model_dump(), version=await siguiente_version_async(self.db))
+            self.db.add(producto)
+            await self.db.commit()
+            self._invalidar_cache()
+            await self.db.refresh(producto)
+            ProductoService.notificar_cambio(producto)
+            print(f"ProductoServiceAsync: Producto creado exitosamente con ID: {producto.id}")
+            return producto
+        except Exception as e:
+            await self.db.rollback()
+            print(f"ProductoServiceAsync: Error al crear producto: {e}")
+            raise HTTPException(status_code=500, detail=f"Error al crear producto: {str(e)}")
+
+    async def obtener_filas(self, limit: Optional[int] = None, after: Optional[int] = None) -> List[Row]:
+        """
+        Obtiene los productos como tuplas de columnas, para serializarlos con filas_json.
+
+        Args:
+            limit (int | None): Cantidad máxima de productos; None retorna todos
+            after (int | None): ID del último producto de la página anterior
+
+        Returns:
+            List[Row]: Filas con las columnas de schemas.Producto, ordenadas por ID
+
+        Raises:
+            HTTPException: Si hay error en la consulta
+        """
+        try:
+            filas = (await self.db.execute(consultas.consulta_filas(limit, after))).all()
+            print(f"ProductoServiceAsync: Obtenidos {len(filas)} productos después del ID {after}")
+            return filas
+        except Exception as e:
+            print(f"ProductoServiceAsync: Error al obtener productos: {e}")
+            raise HTTPException(status_code=500, detail=f"Error al obtener productos: {str(e)}")
+
+    async def obtener_producto_por_id(self, producto_id: int) -> Optional[models.Producto]:
+        """
+        Obtiene un producto específico por su ID.
+
+        Args:
+            producto_id (int): ID del producto a buscar
+
+        Returns:
+            Producto | None: El producto encontrado o None si no existe
+        """
+        try:
+            return await self.db.get(models.Producto, producto_id)
+        except Exception as e:
+            print(f"ProductoServiceAsync: Error al buscar producto: {e}")
+            return None
+
+    async def eliminar_producto(self, producto_id: int) -> dict:
+        """
+        Elimina un producto de la base de datos.
+
+        Args:
+            producto_id (int): ID del producto a eliminar
+
+        Returns:
+            dict: Mensaje de confirmación
+
+        Raises:
+            HTTPException: Si el producto no existe o hay error en la eliminación
+        """
+        try:
+            producto = await self.obtener_producto_por_id(producto_id)
+            if not producto:
+                raise HTTPException(status_code=404, detail="Producto no encontrado")
+
+            for sentencia in sentencias_lapidas([producto_id], await siguiente_version_async(self.db)):
+                await self.db.execute(sentencia)
+            await self.db.delete(producto)
+            await self.db.commit()
+            self._invalidar_cache()
+            ProductoService.notificar_eliminados([producto_id])
+            print(f"ProductoServiceAsync: Producto {producto_id} eliminado exitosamente")
+            return {"mensaje": "Producto eliminado exitosamente"}
+        except HTTPException:
+            raise
+        except Exception as e:
+            await self.db.rollback()
+            print(f"ProductoServiceAsync: Error al eliminar producto: {e}")
+            raise HTTPException(status_code=500, detail=f"Error al eliminar producto: {str(e)}")
+
+    async def actualizar_producto(self, producto_id: int, data: schemas.ProductoCreate) -> models.Producto:
+        """
+        Actualiza un producto existente.
+
+        Args:
+            producto_id (int): ID del producto a actualizar
+            data (ProductoCreate): Nuevos datos del producto
+
+        Returns:
+            Producto: El producto actualizado
+
+        Raises:
+            HTTPException: Si el producto no existe o hay error en la actualización
+        """
+        try:
+            producto = await self.obtener_producto_por_id(producto_id)
+            if not producto:
+                raise HTTPException(status_code=404, detail="Producto no encontrado")
+
+            for campo, valor in data.model_dump().items():
+                setattr(producto, campo, valor)
+            producto.version = await siguiente_version_async(self.db)
+
+            await self.db.commit()
+            self._invalidar_cache()
+            await self.db.refresh(producto)
+            ProductoService.notificar_cambio(producto)
+            print(f"ProductoServiceAsync: Producto {producto_id} actualizado exitosamente")
+            return producto
+        except HTTPException:
+            raise
+        except Exception as e:
+            await self.db.rollback()
+            print(f"ProductoServiceAsync: Error al actualizar producto: {e}")
+            raise HTTPException(status_code=500, detail=f"Error al actualizar producto: {str(e)}")
+
+    async def actualizar_producto_parcial(self, producto_id: int, data: schemas.ProductoUpdate) -> models.Producto:
+        """
+        Actualiza solo los campos enviados de un producto con un único UPDATE ... RETURNING.
+
+        Args:
+            producto_id (int): ID del producto a actualizar
+            data (ProductoUpdate): Campos a cambiar (los no enviados se conservan)
+
+        Returns:
+            Producto: El producto actualizado
+
+        Raises:
+            HTTPException: Si el producto no existe, algún campo obligatorio llega vacío
+                           o hay error en la actualización
+        """
+        valores = consultas.valores_parciales(data)
+        if not valores:
+            producto = await self.obtener_producto_por_id(producto_id)
+            if not producto:
+                raise HTTPException(status_code=404, detail="Producto no encontrado")
+            return producto
+
+        try:
+            producto = (await self.db.scalars(
+                consultas.sentencia_parcial(producto_id, valores, version_en_sentencia(self.db))
+            )).one_or_none()
+            if producto is None:
+                await self.db.rollback()
+                raise HTTPException(status_code=404, detail="Producto no encontrado")
+            await registrar_version_async(self.db, producto.version)
+            await self.db.commit()
+
+            self._invalidar_cache()
+            ProductoService.notificar_cambio(producto)
+            print(f"ProductoServiceAsync: Producto {producto_id} actualizado exitosamente")
+            return producto
+        except HTTPException:
+            raise
+        except Exception as e:
+            await self.db.rollback()
+            print(f"ProductoServiceAsync: Error al actualizar producto: {e}")
+            raise HTTPException(status_code=500, detail=f"Error al actualizar producto: {str(e)}")
+
+    async def ajustar_stock(self, producto_id: int, delta: int, permitir_negativo: bool = False) -> models.Producto:
+        """
+        Suma (o resta) unidades al stock de un producto de forma atómica.
+
+        Args:
+            producto_id (int): ID del producto
+            delta (int): Unidades a sumar (negativo para restar)
+            permitir_negativo (bool): Si es False, rechaza el ajuste cuando el stock quedaría negativo
+
+        Returns:
+            Producto: El producto con la cantidad actualizada
+
+        Raises:
+            HTTPException: 404 si el producto no existe, 409 si el stock quedaría negativo
+        """
+        try:
+            producto = (await self.db.scalars(
+                consultas.sentencia_stock(producto_id, delta, version_en_sentencia(self.db), permitir_negativo)
+            )).one_or_none()
+
+            if producto is None:
+                await self.db.rollback()
+                if await self.db.get(models.Producto, producto_id) is None:
+                    raise HTTPException(status_code=404, detail="Producto no encontrado")
+                raise HTTPException(status_code=409, detail="Stock insuficiente para el ajuste")
+            await registrar_version_async(self.db, producto.version)
+            await self.db.commit()
+
+            self._invalidar_cache()
+            ProductoService.notificar_cambio(producto)
+            print(f"ProductoServiceAsync: Stock del producto {producto_id} ajustado en {delta} (nuevo: {producto.cantidad})")
+            return producto
+        except HTTPException:
+            raise
+        except Exception as e:
+            await self.db.rollback()
+            print(f"ProductoServiceAsync: Error al ajustar stock: {e}")
+            raise HTTPException(status_code=500, detail=f"Error al ajustar stock: {str(e)}")
+
+    async def buscar_filas(self, campo: str, texto: str) -> List[Row]:
+        """Busca productos por categoría o marca como tuplas de columnas (ver ProductoService.buscar_filas)"""
+        return await self.db.run_sync(lambda sesion: ProductoService(sesion).buscar_filas(campo, texto))
+
+    async def obtener_facetas(self) -> dict:
+        """
+        Obtiene las marcas y categorías distintas con la cantidad de productos de cada una.
+
+        Returns:
+            dict: {"marcas": [...], "categorias": [...]} con elementos {"valor", "cantidad"}
+
+        Raises:
+            HTTPException: Si hay error en la consulta
+        """
+        try:
+            filas = await self.db.execute(consultas.consulta_facetas())
+            return consultas.agrupar_facetas(filas.all())
+        except Exception as e:
+            print(f"ProductoServiceAsync: Error al obtener facetas: {e}")
+            raise HTTPException(status_code=500, detail=f"Error al obtener facetas: {str(e)}")
+
+    async def verificar_stock_bajo(self, limite: Optional[int] = None) -> List[models.Producto]:
+        """
+        Obtiene productos con stock bajo.
+
+        Args:
+            limite (int | None): Cantidad límite para todos los productos; si es None
+                                 se usa el stock_minimo de cada producto
+
+        Returns:
+            List[Producto]: Lista de productos con stock bajo, ordenados por ID
+        """
+        try:
+            productos = (await self.db.scalars(consultas.consulta_stock_bajo(limite))).all()
+            print(f"ProductoServiceAsync: Encontrados {len(productos)} productos con stock bajo")
+            return productos
+        except Exception as e:
+            print(f"ProductoServiceAsync: Error al verificar stock: {e}")
+            return []
@@ -0,0 +1,103 @@
+"""
+Respuestas JSON del catálogo compartidas por las rutas síncronas (main.py) y las
+de /async (rutas_async.py): serialización, compresión, caché con ETag y las
+cabeceras de paginación y de sincronización.
+"""
+
+from fastapi import Request, Response
+from pydantic import TypeAdapter
+import schemas
+from services.cache_service import catalogo_cache
+from services.serializacion_service import codificacion_aceptada, comprimir, filas_json
+from typing import Any, Awaitable, Callable, Hashable, List, Optional, Tuple
+
+def serializar(adaptador: TypeAdapter, datos: Any) -> bytes:
+    """Valida datos (ORM o dict) con el esquema de respuesta y los convierte a JSON"""
+    return adaptador.dump_json(adaptador.validate_python(datos, from_attributes=True))
+
+def respuesta_json(cuerpo: bytes, cabeceras: Optional[dict] = None, codificacion: Optional[str] = None) -> Response:
+    """Respuesta con un JSON ya serializado; `codificacion` indica si el cuerpo va comprimido"""
+    cabeceras = {**(cabeceras or {}), "Vary": "Accept-Encoding"}
+    if codificacion:
+        cabeceras["Content-Encoding"] = codificacion
+    return Response(content=cuerpo, media_type="application/json", headers=cabeceras)
+
+def respuesta_comprimida(request: Request, cuerpo: bytes, cabeceras: Optional[dict] = None) -> Response:
+    """Respuesta JSON comprimida con gzip o brotli si el cliente lo acepta (COMPRESION_RESPUESTAS)"""
+    cuerpo, codificacion = comprimir(cuerpo, codificacion_aceptada(request.headers.get("accept-encoding", "")))
+    return respuesta_json(cuerpo, cabeceras, codificacion)
+
+def catalogo_json(filas: List, cursor: int) -> Tuple[bytes, dict]:
+    """
+    Catálogo completo con el cursor para seguir con /productos/changes?since=...
+    El cursor debe leerse antes que las filas.
+    """
+    return filas_json(schemas.Producto, filas), {"X-Cursor-Cambios": str(cursor)}
+
+def pagina_json(filas: List, limit: int) -> Tuple[bytes, dict]:
+    """Página por cursor: el cliente pide la siguiente con ?after=<X-Siguiente-Cursor>"""
+    extra = {"X-Siguiente-Cursor": str(filas[-1].id)} if len(filas) == limit else {}
+    return filas_json(schemas.Producto, filas), extra
+
+def _validar_catalogo(request: Request) -> Tuple[int, Optional[str], dict, Optional[Response]]:
+    """
+    Versión, codificación negociada y cabeceras de la respuesta; incluye un 304 si
+    el navegador ya tiene esa versión en esa misma codificación.
+    """
+    version = catalogo_cache.version
+    codificacion = codificacion_aceptada(request.headers.get("accept-encoding", ""))
+    etag = catalogo_cache.etag(version, codificacion)
+    cabeceras = {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+
+    if_none_match = request.headers.get("if-none-match", "")
+    if if_none_match.strip() == "*" or etag in [e.strip() for e in if_none_match.split(",")]:
+        return version, codificacion, cabeceras, Response(status_code=304, headers=cabeceras)
+    return version, codificacion, cabeceras, None
+
+def _cabeceras_finales(producto_service, cabeceras: dict, extra: dict) -> dict:
+    """
+    Una lectura de réplica atrasada no lleva el ETag de la versión actual: el navegador
+    guardaría datos viejos con el validador nuevo y recibiría 304 hasta la próxima escritura.
+    """
+    if producto_service.lectura_atrasada:
+        cabeceras = {"Cache-Control": "no-store", "Vary": "Accept-Encoding"}
+    return {**cabeceras, **extra}
+
+def respuesta_catalogo(request: Request, producto_service, clave: Hashable,
+                       cargar: Callable[[], Tuple[bytes, dict]]) -> Response:
+    """
+    Responde una lectura pública del catálogo usando la caché y el ETag de la versión actual.
+    Si el navegador ya tiene esa versión se responde 304 sin consultar ni serializar. El
+    ETag lleva la codificación negociada (identity, gzip o br), porque cada una es una
+    representación distinta con su propio validador.
+
+    Args:
+        producto_service (ProductoService): Servicio cuya caché se usa
+        clave (Hashable): Identifica la consulta en la caché
+        cargar (Callable): Consulta y serializa; retorna (cuerpo, cabeceras extra)
+    """
+    version, codificacion, cabeceras, no_modificado = _validar_catalogo(request)
+    if no_modificado is not None:
+        return no_modificado
+
+    cuerpo, extra = producto_service.obtener_cacheado(clave, version, cargar)
+    if codificacion:
+        # La versión comprimida también se guarda: se comprime una vez por versión del catálogo
+        cuerpo, codificacion = producto_service.obtener_cacheado(
+            (clave, codificacion), version, lambda: comprimir(cuerpo, codificacion)
+        )
+    return respuesta_json(cuerpo, _cabeceras_finales(producto_service, cabeceras, extra), codificacion)
+
+async def respuesta_catalogo_async(request: Request, producto_service, clave: Hashable,
+                                   cargar: Callable[[], Awaitable[Tuple[bytes, dict]]]) -> Response:
+    """Igual que respuesta_catalogo, con ProductoServiceAsync y una corrutina `cargar`"""
+    version, codificacion, cabeceras, no_modificado = _validar_catalogo(request)
+    if no_modificado is not None:
+        return no_modificado
+
+    cuerpo, extra = await producto_service.obtener_cacheado(clave, version, cargar)
+    if codificacion:
+        async def comprimir_cuerpo():
+            return comprimir(cuerpo, codificacion)
+        cuerpo, codificacion = await producto_service.obtener_cacheado((clave, codificacion), version, comprimir_cuerpo)
+    return respuesta_json(cuerpo, _cabeceras_finales(producto_service, cabeceras, extra), codificacion)
@@ -0,0 +1,229 @@
+from typing import Dict, List
+import hashlib
+import math
+import os
+import threading
+import time
+
+class FiltroBloom:
+    """
+    Conjunto aproximado de claves en un arreglo de bits.
+
+    Nunca da falsos negativos: si dice que una clave no está, no está. Puede dar
+    falsos positivos con probabilidad cercana a `tasa_falsos` mientras no se
+    superen `capacidad` claves.
+    """
+
+    __slots__ = ("bits", "tamano", "funciones", "elementos")
+
+    def __init__(self, capacidad: int, tasa_falsos: float = 0.001):
+        """
+        Args:
+            capacidad (int): Claves esperadas como máximo
+            tasa_falsos (float): Probabilidad de falso positivo con el filtro lleno
+        """
+        self.tamano = max(64, int(-capacidad * math.log(tasa_falsos) / math.log(2) ** 2))
+        self.funciones = max(1, round(self.tamano / capacidad * math.log(2)))
+        self.bits = bytearray((self.tamano + 7) // 8)
+        self.elementos = 0
+
+    def _posiciones(self, clave: bytes):
+        # Doble hashing: k posiciones a partir de dos valores de 64 bits
+        resumen = hashlib.blake2b(clave, digest_size=16).digest()
+        h1 = int.from_bytes(resumen[:8], "little")
+        h2 = int.from_bytes(resumen[8:], "little") | 1
+        return [(h1 + i * h2) % self.tamano for i in range(self.funciones)]
+
+    def agregar(self, clave: bytes):
+        for posicion in self._posiciones(clave):
+            self.bits[posicion >> 3] |= 1 << (posicion & 7)
+        self.elementos += 1
+
+    def __contains__(self, clave: bytes) -> bool:
+        bits = self.bits
+        return all(bits[posicion >> 3] & (1 << (posicion & 7)) for posicion in self._posiciones(clave))
+
+class RevocacionTokens:
+    """
+    Tokens revocados (logout) hasta que vencen, en memoria del proceso.
+
+    La consulta de cada solicitud pasa primero por filtros de Bloom: casi todos los
+    tokens no están revocados y el filtro lo confirma sin tocar el diccionario. Solo
+    si el filtro responde "quizás" se consulta la lista exacta, así un falso
+    positivo nunca cierra la sesión de nadie.
+
+    Los filtros rotan por generaciones: cada `duracion / (generaciones - 1)`
+    segundos se descarta el más viejo, cuyos tokens ya vencieron todos, y la
+    memoria se mantiene acotada sin borrar claves de un filtro de Bloom.
+    """
+
+    def __init__(self, duracion: float, generaciones: int = 4, capacidad: int = 100_000):
+        """
+        Args:
+            duracion (float): Vida máxima de un token en segundos
+            generaciones (int): Filtros vivos a la vez (mínimo 2)
+            capacidad (int): Revocaciones esperadas por generación
+        """
+        self.generaciones = max(2, generaciones)
+        self.ventana = duracion / (self.generaciones - 1)
+        self.capacidad = capacidad
+        self._lock = threading.Lock()
+        self._filtros: List[FiltroBloom] = [FiltroBloom(capacidad)]
+        self._inicio_ventana = time.time()
+        self._exactos: Dict[str, float] = {}  # jti -> vencimiento
+        self.consultas = 0
+        self.falsos_positivos = 0
+
+    def _rotar_si_toca(self, ahora: float):
+        """Abre una generación nueva al terminar la ventana; se llama con el lock tomado"""
+        while ahora - self._inicio_ventana >= self.ventana:
+            self._filtros = [FiltroBloom(self.capacidad)] + self._filtros[:self.generaciones - 1]
+            self._inicio_ventana += self.ventana
+            self._exactos = {jti: expira for jti, expira in self._exactos.items() if expira > ahora}
+
+    def revocar(self, jti: str, expira: float):
+        """Marca un token como revocado hasta su vencimiento"""
+        ahora = time.time()
+        if expira <= ahora:
+            return
+        with self._lock:
+            self._rotar_si_toca(ahora)
+            if jti not in self._exactos:
+                self._filtros[0].agregar(jti.encode())
+            self._exactos[jti] = expira
+
+    def esta_revocado(self, jti: str) -> bool:
+        """Indica si el token fue revocado; no toma locks ni hace I/O"""
+        self.consultas += 1
+        if time.time() - self._inicio_ventana >= self.ventana:
+            with self._lock:
+                self._rotar_si_toca(time.time())
+        clave = jti.encode()
+        if not any(clave in filtro for filtro in self._filtros):
+            return False
+        if jti in self._exactos:
+            return True
+        self.falsos_positivos += 1
+        return False
+
+    def metricas(self) -> dict:
+        filtros = self._filtros
+        return {
+            "tokens_revocados": len(self._exactos),
+            "generaciones_bloom": len(filtros),
+            "memoria_bloom_bytes": sum(len(f.bits) for f in filtros),
+            "consultas_revocacion": self.consultas,
+            "falsos_positivos_bloom": self.falsos_positivos,
+        }
+
+# Revocaciones ya vistas que se vuelven a pedir en cada sincronización: en PostgreSQL
+# los ids de la secuencia pueden confirmarse en desorden entre transacciones concurrentes
+SOLAPE_SINCRONIZACION = 100
+
+class RevocacionSQL(RevocacionTokens):
+    """
+    Revocaciones compartidas por todos los workers y nodos en la tabla `tokens_revocados`.
+
+    La verificación sigue siendo local; un hilo trae cada `intervalo` segundos las
+    revocaciones nuevas de la tabla. Un logout hecho en otro nodo puede tardar hasta
+    `intervalo` segundos en notarse aquí (en el worker que lo hizo se nota de inmediato).
+    """
+
+    def __init__(self, duracion: float, generaciones: int = 4, capacidad: int = 100_000,
+                 intervalo: float = 5, session_factory=None):
+        """
+        Args:
+            intervalo (float): Segundos entre sincronizaciones con la tabla
+            session_factory: Fábrica de sesiones SQLAlchemy (por defecto SessionLocal)
+        """
+        super().__init__(duracion, generaciones, capacidad)
+        if session_factory is None:
+            from database import SessionLocal
+            session_factory = SessionLocal
+        self.session_factory = session_factory
+        self.intervalo = intervalo
+        self._ultimo_id = 0
+        self._detener = threading.Event()
+        # La carga inicial también la hace el hilo: crear el servicio no abre conexiones
+        self._hilo = threading.Thread(target=self._ejecutar, name="sincronizador-revocaciones", daemon=True)
+        self._hilo.start()
+
+    def revocar(self, jti: str, expira: float):
+        import models
+        super().revocar(jti, expira)
+        from sqlalchemy.exc import IntegrityError
+        db = self.session_factory()
+        try:
+            if db.query(models.TokenRevocado.id).filter(models.TokenRevocado.jti == jti).first() is None:
+                db.add(models.TokenRevocado(jti=jti, expira=expira))
+                db.commit()
+        except IntegrityError:
+            # Otro worker registró el mismo logout al mismo tiempo
+            db.rollback()
+        finally:
+            db.close()
+
+    def sincronizar(self) -> int:
+        """Trae las revocaciones nuevas de la tabla y retorna cuántas llegaron"""
+        import models
+        db = self.session_factory()
+        try:
+            filas = (
+                db.query(models.TokenRevocado.id, models.TokenRevocado.jti, models.TokenRevocado.expira)
+                .filter(models.TokenRevocado.id > self._ultimo_id - SOLAPE_SINCRONIZACION,
+                        models.TokenRevocado.expira > time.time())
+                .order_by(models.TokenRevocado.id)
+                .all()
+            )
+        finally:
+            db.close()
+        nuevas = 0
+        for id_fila, jti, expira in filas:
+            if jti not in self._exactos:
+                RevocacionTokens.revocar(self, jti, expira)
+                nuevas += 1
+            self._ultimo_id = max(self._ultimo_id, id_fila)
+        return nuevas
+
+    def limpiar_vencidas(self) -> int:
+        """Borra de la tabla las revocaciones de tokens que ya vencieron"""
+        import models
+        db = self.session_factory()
+        try:
+            borradas = db.query(models.TokenRevocado).filter(models.TokenRevocado.expira <= time.time()).delete()
+            db.commit()
+            return borradas
+        finally:
+            db.close()
+
+    def detener(self):
+        self._detener.set()
+
+    def _ejecutar(self):
+        ultima_limpieza = time.monotonic()
+        while True:
+            try:
+                self.sincronizar()
+                if time.monotonic() - ultima_limpieza >= self.ventana:
+                    self.limpiar_vencidas()
+                    ultima_limpieza = time.monotonic()
+            except Exception as e:
+                print(f"RevocacionSQL: Error al sincronizar revocaciones: {e}")
+            if self._detener.wait(self.intervalo):
+                return
+
+def crear_revocacion(duracion: float) -> RevocacionTokens:
+    """
+    Crea el registro de revocaciones según TOKEN_REVOCACION: "memoria" (por
+    defecto, un solo worker) o "sql" (tabla compartida, sincronizada cada
+    TOKEN_REVOCACION_SYNC segundos).
+    """
+    backend = os.getenv("TOKEN_REVOCACION", "memoria").lower()
+    generaciones = int(os.getenv("TOKEN_REVOCACION_GENERACIONES", "4"))
+    capacidad = int(os.getenv("TOKEN_REVOCACION_CAPACIDAD", "100000"))
+    if backend == "memoria":
+        return RevocacionTokens(duracion, generaciones, capacidad)
+    if backend == "sql":
+        return RevocacionSQL(duracion, generaciones, capacidad,
+                             intervalo=float(os.getenv("TOKEN_REVOCACION_SYNC", "5")))
+    raise ValueError(f"TOKEN_REVOCACION no soportado: {backend}")
@@ -0,0 +1,99 @@
+from functools import lru_cache
+from pydantic import BaseModel
+from sqlalchemy import select
+from sqlalchemy.sql import Select
+from typing import Iterable, Optional, Sequence, Type
+import gzip
+import json
+import os
+
+try:
+    import orjson
+except ImportError:  # orjson es opcional: sin él se usa el módulo json estándar
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # Brotli es opcional: sin él solo se comprime con gzip
+    brotli = None
+
+# Compresión de las respuestas JSON (COMPRESION_RESPUESTAS=false la desactiva)
+COMPRESION_HABILITADA = os.getenv("COMPRESION_RESPUESTAS", "true").lower() == "true"
+COMPRESION_MINIMO = int(os.getenv("COMPRESION_MINIMO_BYTES", "1024"))
+
+@lru_cache(maxsize=None)
+def campos(esquema: Type[BaseModel]) -> tuple:
+    """Nombres de los campos del esquema de respuesta, en el orden en que se serializan"""
+    return tuple(esquema.model_fields)
+
+def seleccionar(esquema: Type[BaseModel], modelo) -> Select:
+    """
+    SELECT de solo las columnas que aparecen en el esquema de respuesta.
+
+    Las filas llegan como tuplas, sin construir objetos ORM ni modelos de Pydantic.
+
+    Args:
+        esquema (Type[BaseModel]): Esquema de respuesta (schemas.Producto, schemas.Usuario)
+        modelo: Modelo ORM con una columna por cada campo del esquema
+
+    Returns:
+        Select: Consulta a la que se le agregan filtros, orden y límite
+    """
+    return select(*(getattr(modelo, campo) for campo in campos(esquema)))
+
+def a_json(datos) -> bytes:
+    """Convierte listas y diccionarios a JSON compacto en UTF-8, igual que el dump_json de Pydantic"""
+    if orjson is not None:
+        return orjson.dumps(datos)
+    return json.dumps(datos, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+def filas_json(esquema: Type[BaseModel], filas: Iterable[Sequence]) -> bytes:
+    """
+    Serializa filas obtenidas con `seleccionar` como una lista JSON del esquema.
+
+    Los valores vienen ya tipados por las columnas, así que el resultado es el mismo
+    que validar cada fila con el esquema y llamar a dump_json, sin ese costo por fila.
+
+    Args:
+        esquema (Type[BaseModel]): El mismo esquema usado en `seleccionar`
+        filas (Iterable[Sequence]): Filas con las columnas en el orden del esquema
+
+    Returns:
+        bytes: Lista JSON
+    """
+    nombres = campos(esquema)
+    return a_json([dict(zip(nombres, fila)) for fila in filas])
+
+def codificacion_aceptada(accept_encoding: str) -> Optional[str]:
+    """
+    Mejor codificación que acepta el cliente (br antes que gzip).
+
+    Args:
+        accept_encoding (str): Cabecera Accept-Encoding de la petición
+
+    Returns:
+        str | None: "br", "gzip" o None si la compresión está desactivada o el cliente no acepta ninguna
+    """
+    if not COMPRESION_HABILITADA:
+        return None
+    aceptadas = {c.split(";")[0].strip() for c in accept_encoding.lower().split(",")}
+    if brotli is not None and "br" in aceptadas:
+        return "br"
+    if "gzip" in aceptadas:
+        return "gzip"
+    return None
+
+def comprimir(cuerpo: bytes, codificacion: Optional[str]) -> tuple[bytes, Optional[str]]:
+    """
+    Comprime una respuesta con la codificación elegida por codificacion_aceptada.
+
+    Returns:
+        tuple[bytes, str | None]: Cuerpo y codificación usada; las respuestas más
+                                  pequeñas que COMPRESION_MINIMO_BYTES se dejan igual
+    """
+    if codificacion is None or len(cuerpo) < COMPRESION_MINIMO:
+        return cuerpo, None
+    if codificacion == "br":
+        # Calidad baja: en respuestas dinámicas importa más la CPU que los últimos bytes
+        return brotli.compress(cuerpo, quality=4), "br"
+    return gzip.compress(cuerpo, compresslevel=6, mtime=0), "gzip"
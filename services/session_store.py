@@ -0,0 +1,416 @@
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from datetime import datetime
+from typing import Optional
+import heapq
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+class SessionStore(ABC):
+    """
+    Interfaz de almacenamiento de sesiones usada por TokenManager.
+
+    Los datos de sesión son un dict con user_id, username, is_admin y created_at.
+    Cada backend decide dónde se guardan; todos deben ser seguros entre hilos.
+    """
+
+    @abstractmethod
+    def guardar(self, token: str, datos: dict, ttl: float):
+        """Guarda una sesión que expira en `ttl` segundos"""
+
+    @abstractmethod
+    def obtener(self, token: str) -> Optional[dict]:
+        """Retorna los datos de la sesión o None si no existe o expiró"""
+
+    @abstractmethod
+    def eliminar(self, token: str):
+        """Elimina una sesión (logout)"""
+
+    def limpiar_expiradas(self) -> int:
+        """Borra las sesiones expiradas y retorna cuántas se borraron"""
+        return 0
+
+    def metricas(self) -> dict:
+        """Métricas del almacén (sesiones vivas, memoria, expulsiones...)"""
+        return {}
+
+def _serializar(datos: dict) -> str:
+    return json.dumps({**datos, "created_at": datos["created_at"].isoformat()})
+
+def _deserializar(texto: str) -> dict:
+    datos = json.loads(texto)
+    datos["created_at"] = datetime.fromisoformat(datos["created_at"])
+    return datos
+
+class MemorySessionStore(SessionStore):
+    """
+    Sesiones en memoria del proceso, con memoria acotada. Solo sirve con un único worker.
+
+    - Las expiraciones se llevan en un min-heap por fecha de vencimiento, así
+      limpiar_expiradas solo recorre las sesiones que ya vencieron.
+    - `max_sesiones` limita las sesiones totales y `max_por_usuario` las de cada
+      usuario; al superarlos se expulsa la sesión más antigua.
+    """
+
+    def __init__(self, max_sesiones: int = 100_000, max_por_usuario: int = 10):
+        """
+        Args:
+            max_sesiones (int): Sesiones vivas como máximo en el proceso
+            max_por_usuario (int): Sesiones vivas como máximo por usuario
+        """
+        self.max_sesiones = max_sesiones
+        self.max_por_usuario = max_por_usuario
+        self._lock = threading.Lock()
+        self._sesiones: "OrderedDict[str, tuple]" = OrderedDict()  # token -> (expira, datos), en orden de creación
+        self._por_usuario = {}  # user_id -> OrderedDict de tokens en orden de creación
+        self._heap = []  # (expira, token); las entradas de sesiones ya borradas se descartan al salir
+        self._expiradas_total = 0
+        self._expulsadas_total = 0
+
+    def guardar(self, token: str, datos: dict, ttl: float):
+        expira = time.time() + ttl
+        with self._lock:
+            self._quitar(token)
+            self._sesiones[token] = (expira, datos)
+            self._por_usuario.setdefault(datos["user_id"], OrderedDict())[token] = None
+            heapq.heappush(self._heap, (expira, token))
+
+            tokens_usuario = self._por_usuario[datos["user_id"]]
+            while len(tokens_usuario) > self.max_por_usuario:
+                self._quitar(next(iter(tokens_usuario)))
+                self._expulsadas_total += 1
+            while len(self._sesiones) > self.max_sesiones:
+                self._quitar(next(iter(self._sesiones)))
+                self._expulsadas_total += 1
+
+            # Los logouts y expulsiones dejan entradas viejas en el heap; se compacta si crece de más
+            if len(self._heap) > 2 * len(self._sesiones) + 64:
+                self._heap = [(e, t) for t, (e, _) in self._sesiones.items()]
+                heapq.heapify(self._heap)
+
+    def obtener(self, token: str) -> Optional[dict]:
+        with self._lock:
+            entrada = self._sesiones.get(token)
+            if entrada is None:
+                return None
+            expira, datos = entrada
+            if expira <= time.time():
+                self._quitar(token)
+                self._expiradas_total += 1
+                return None
+            return datos
+
+    def eliminar(self, token: str):
+        with self._lock:
+            self._quitar(token)
+
+    def limpiar_expiradas(self) -> int:
+        ahora = time.time()
+        borradas = 0
+        with self._lock:
+            while self._heap and self._heap[0][0] <= ahora:
+                expira, token = heapq.heappop(self._heap)
+                entrada = self._sesiones.get(token)
+                # Solo cuenta si la entrada del heap corresponde a la sesión vigente
+                if entrada is not None and entrada[0] == expira:
+                    self._quitar(token)
+                    borradas += 1
+            self._expiradas_total += borradas
+        return borradas
+
+    def _quitar(self, token: str):
+        """Borra una sesión de los índices (el heap se limpia de forma perezosa)"""
+        entrada = self._sesiones.pop(token, None)
+        if entrada is None:
+            return
+        user_id = entrada[1]["user_id"]
+        tokens_usuario = self._por_usuario.get(user_id)
+        if tokens_usuario is not None:
+            tokens_usuario.pop(token, None)
+            if not tokens_usuario:
+                del self._por_usuario[user_id]
+
+    def metricas(self) -> dict:
+        with self._lock:
+            memoria = sys.getsizeof(self._sesiones) + sys.getsizeof(self._por_usuario) + sys.getsizeof(self._heap)
+            if self._sesiones:
+                # Estimación: tamaño de una entrada de muestra por el número de sesiones
+                token, (expira, datos) = next(iter(self._sesiones.items()))
+                por_entrada = (
+                    sys.getsizeof(token) + sys.getsizeof(datos)
+                    + sum(sys.getsizeof(v) for v in datos.values())
+                    + 2 * 64  # tuplas del dict y del heap
+                )
+                memoria += por_entrada * len(self._sesiones)
+            return {
+                "sesiones_activas": len(self._sesiones),
+                "usuarios_con_sesion": len(self._por_usuario),
+                "entradas_heap": len(self._heap),
+                "sesiones_expiradas_total": self._expiradas_total,
+                "sesiones_expulsadas_total": self._expulsadas_total,
+                "memoria_bytes_aprox": memoria,
+            }
+
+class SQLSessionStore(SessionStore):
+    """Sesiones en la tabla `sesiones` de la base de datos principal, compartidas por todos los nodos."""
+
+    def __init__(self, session_factory=None):
+        """
+        Args:
+            session_factory: Fábrica de sesiones SQLAlchemy (por defecto SessionLocal)
+        """
+        if session_factory is None:
+            from database import SessionLocal
+            session_factory = SessionLocal
+        self.session_factory = session_factory
+
+    def guardar(self, token: str, datos: dict, ttl: float):
+        import models
+        db = self.session_factory()
+        try:
+            db.add(models.Sesion(
+                token=token,
+                user_id=datos["user_id"],
+                username=datos["username"],
+                is_admin=datos["is_admin"],
+                created_at=datos["created_at"],
+                expira=time.time() + ttl,
+            ))
+            db.commit()
+        finally:
+            db.close()
+
+    def obtener(self, token: str) -> Optional[dict]:
+        import models
+        db = self.session_factory()
+        try:
+            sesion = db.get(models.Sesion, token)
+            if sesion is None:
+                return None
+            if sesion.expira <= time.time():
+                db.delete(sesion)
+                db.commit()
+                return None
+            return {
+                "user_id": sesion.user_id,
+                "username": sesion.username,
+                "is_admin": sesion.is_admin,
+                "created_at": sesion.created_at,
+            }
+        finally:
+            db.close()
+
+    def eliminar(self, token: str):
+        import models
+        db = self.session_factory()
+        try:
+            db.query(models.Sesion).filter(models.Sesion.token == token).delete()
+            db.commit()
+        finally:
+            db.close()
+
+    def limpiar_expiradas(self) -> int:
+        import models
+        db = self.session_factory()
+        try:
+            borradas = db.query(models.Sesion).filter(models.Sesion.expira <= time.time()).delete()
+            db.commit()
+            return borradas
+        finally:
+            db.close()
+
+    def metricas(self) -> dict:
+        import models
+        db = self.session_factory()
+        try:
+            return {"sesiones_activas": db.query(models.Sesion).filter(models.Sesion.expira > time.time()).count()}
+        finally:
+            db.close()
+
+class LocalKVSessionStore(SessionStore):
+    """
+    Sesiones en un archivo SQLite local en modo WAL, usado como almacén clave-valor.
+    Lo comparten todos los workers de un mismo nodo sin depender de la red.
+    """
+
+    def __init__(self, ruta: str = "sesiones.db"):
+        """
+        Args:
+            ruta (str): Archivo del almacén clave-valor
+        """
+        self.ruta = ruta
+        self._local = threading.local()
+        conn = self._conexion()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS sesiones (token TEXT PRIMARY KEY, datos TEXT NOT NULL, expira REAL NOT NULL)"
+        )
+        conn.commit()
+
+    def _conexion(self) -> sqlite3.Connection:
+        """Conexión propia de cada hilo (sqlite3 no comparte conexiones entre hilos)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.ruta, timeout=5)
+            self._local.conn = conn
+        return conn
+
+    def guardar(self, token: str, datos: dict, ttl: float):
+        conn = self._conexion()
+        conn.execute(
+            "INSERT OR REPLACE INTO sesiones (token, datos, expira) VALUES (?, ?, ?)",
+            (token, _serializar(datos), time.time() + ttl),
+        )
+        conn.commit()
+
+    def obtener(self, token: str) -> Optional[dict]:
+        conn = self._conexion()
+        fila = conn.execute("SELECT datos, expira FROM sesiones WHERE token = ?", (token,)).fetchone()
+        if fila is None:
+            return None
+        datos, expira = fila
+        if expira <= time.time():
+            self.eliminar(token)
+            return None
+        return _deserializar(datos)
+
+    def eliminar(self, token: str):
+        conn = self._conexion()
+        conn.execute("DELETE FROM sesiones WHERE token = ?", (token,))
+        conn.commit()
+
+    def limpiar_expiradas(self) -> int:
+        conn = self._conexion()
+        borradas = conn.execute("DELETE FROM sesiones WHERE expira <= ?", (time.time(),)).rowcount
+        conn.commit()
+        return borradas
+
+    def metricas(self) -> dict:
+        conn = self._conexion()
+        (activas,) = conn.execute("SELECT COUNT(*) FROM sesiones WHERE expira > ?", (time.time(),)).fetchone()
+        return {"sesiones_activas": activas}
+
+class CachedSessionStore(SessionStore):
+    """
+    Caché LRU de lectura por worker delante de un almacén compartido.
+
+    Las sesiones encontradas se recuerdan durante `ttl_cache` segundos, así la
+    mayoría de verificaciones no salen del proceso. Un logout hecho en otro worker
+    puede tardar hasta `ttl_cache` segundos en notarse aquí.
+    """
+
+    def __init__(self, backend: SessionStore, max_entradas: int = 1024, ttl_cache: float = 5):
+        """
+        Args:
+            backend (SessionStore): Almacén compartido de las sesiones
+            max_entradas (int): Sesiones recordadas como máximo
+            ttl_cache (float): Segundos que se confía en una sesión recordada
+        """
+        self.backend = backend
+        self.max_entradas = max_entradas
+        self.ttl_cache = ttl_cache
+        self._lock = threading.Lock()
+        self._cache: "OrderedDict[str, tuple]" = OrderedDict()  # token -> (vence_cache, datos)
+
+    def guardar(self, token: str, datos: dict, ttl: float):
+        self.backend.guardar(token, datos, ttl)
+
+    def obtener(self, token: str) -> Optional[dict]:
+        ahora = time.monotonic()
+        with self._lock:
+            entrada = self._cache.get(token)
+            if entrada is not None and entrada[0] > ahora:
+                self._cache.move_to_end(token)
+                return entrada[1]
+
+        # Los tokens inexistentes no se recuerdan: un login en otro worker debe verse de inmediato
+        datos = self.backend.obtener(token)
+        with self._lock:
+            if datos is None:
+                self._cache.pop(token, None)
+            else:
+                self._cache[token] = (ahora + self.ttl_cache, datos)
+                self._cache.move_to_end(token)
+                while len(self._cache) > self.max_entradas:
+                    self._cache.popitem(last=False)
+        return datos
+
+    def eliminar(self, token: str):
+        with self._lock:
+            self._cache.pop(token, None)
+        self.backend.eliminar(token)
+
+    def limpiar_expiradas(self) -> int:
+        ahora = time.monotonic()
+        with self._lock:
+            for token in [t for t, (vence, _) in self._cache.items() if vence <= ahora]:
+                del self._cache[token]
+        return self.backend.limpiar_expiradas()
+
+    def metricas(self) -> dict:
+        with self._lock:
+            en_cache = len(self._cache)
+        return {**self.backend.metricas(), "sesiones_en_cache": en_cache}
+
+class LimpiadorSesiones:
+    """Hilo en segundo plano que borra periódicamente las sesiones expiradas de un almacén."""
+
+    def __init__(self, store: SessionStore, intervalo: float = 60):
+        """
+        Args:
+            store (SessionStore): Almacén a limpiar
+            intervalo (float): Segundos entre limpiezas
+        """
+        self.store = store
+        self.intervalo = intervalo
+        self._detener = threading.Event()
+        self._hilo = threading.Thread(target=self._ejecutar, name="limpiador-sesiones", daemon=True)
+
+    def iniciar(self):
+        self._hilo.start()
+
+    def detener(self):
+        self._detener.set()
+
+    def _ejecutar(self):
+        while not self._detener.wait(self.intervalo):
+            try:
+                borradas = self.store.limpiar_expiradas()
+                if borradas:
+                    print(f"LimpiadorSesiones: {borradas} sesiones expiradas eliminadas")
+            except Exception as e:
+                print(f"LimpiadorSesiones: Error al limpiar sesiones: {e}")
+
+def crear_session_store() -> SessionStore:
+    """
+    Crea el almacén de sesiones según la variable de entorno SESSION_BACKEND:
+    "memory" (por defecto, un solo worker), "sql" (tabla compartida) o "local"
+    (archivo clave-valor del nodo, ruta en SESSION_KV_PATH).
+
+    Las sesiones expiradas se borran cada SESSION_LIMPIEZA_INTERVALO segundos.
+    """
+    backend = os.getenv("SESSION_BACKEND", "memory").lower()
+    if backend == "memory":
+        store = MemorySessionStore(
+            max_sesiones=int(os.getenv("SESSION_MAX_TOTAL", "100000")),
+            max_por_usuario=int(os.getenv("SESSION_MAX_POR_USUARIO", "10")),
+        )
+    else:
+        if backend == "sql":
+            compartido = SQLSessionStore()
+        elif backend == "local":
+            compartido = LocalKVSessionStore(os.getenv("SESSION_KV_PATH", "sesiones.db"))
+        else:
+            raise ValueError(f"SESSION_BACKEND no soportado: {backend}")
+        store = CachedSessionStore(
+            compartido,
+            max_entradas=int(os.getenv("SESSION_CACHE_MAX", "1024")),
+            ttl_cache=float(os.getenv("SESSION_CACHE_TTL", "5")),
+        )
+
+    LimpiadorSesiones(store, intervalo=float(os.getenv("SESSION_LIMPIEZA_INTERVALO", "60"))).iniciar()
+    return store
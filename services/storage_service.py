@@ -0,0 +1,130 @@
+from fastapi import UploadFile
+from typing import TYPE_CHECKING, AsyncIterator, BinaryIO, Optional, Union
+import os
+import uuid
+
+if TYPE_CHECKING:
+    import httpx
+
+class StorageService:
+    """
+    Cliente asíncrono del almacenamiento de imágenes de Supabase.
+
+    Usa un único httpx.AsyncClient con pool de conexiones compartido entre
+    solicitudes (se reutilizan las conexiones TCP/TLS) y envía los archivos por
+    bloques, sin cargarlos completos en memoria ni bloquear el event loop.
+    """
+
+    def __init__(self, base_url: Optional[str], api_key: Optional[str], bucket: str = "imagenes",
+                 tamano_bloque: int = 64 * 1024, max_conexiones: int = 20, timeout: float = 30.0):
+        """
+        Constructor del servicio de almacenamiento.
+
+        Args:
+            base_url (str): URL del proyecto de Supabase
+            api_key (str): Llave de servicio de Supabase
+            bucket (str): Bucket donde se guardan los archivos
+            tamano_bloque (int): Bytes leídos del archivo subido en cada bloque
+            max_conexiones (int): Tamaño máximo del pool de conexiones
+            timeout (float): Segundos de espera por cada operación de red
+        """
+        self.base_url = (base_url or "").rstrip("/")
+        self.api_key = api_key
+        self.bucket = bucket
+        self.tamano_bloque = tamano_bloque
+        self.max_conexiones = max_conexiones
+        self.timeout = timeout
+        self._cliente: Optional["httpx.AsyncClient"] = None
+
+    @property
+    def cliente(self) -> "httpx.AsyncClient":
+        """Cliente HTTP compartido, creado la primera vez que se usa (httpx se importa en ese momento)"""
+        if self._cliente is None or self._cliente.is_closed:
+            import httpx
+
+            self._cliente = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers={
+                    "apikey": self.api_key or "",
+                    "Authorization": f"Bearer {self.api_key}",
+                },
+                limits=httpx.Limits(max_connections=self.max_conexiones, max_keepalive_connections=self.max_conexiones),
+                timeout=self.timeout,
+            )
+        return self._cliente
+
+    def url_publica(self, nombre_archivo: str) -> str:
+        """URL pública de un archivo del bucket"""
+        return f"{self.base_url}/storage/v1/object/public/{self.bucket}/{nombre_archivo}"
+
+    def nombre_unico(self, nombre_original: Optional[str]) -> str:
+        """Nombre único en el bucket para un archivo subido"""
+        return f"{uuid.uuid4()}_{nombre_original}"
+
+    async def _leer_bloques(self, file: UploadFile, copia: Optional[BinaryIO] = None) -> AsyncIterator[bytes]:
+        """Lee el archivo subido por bloques, guardando opcionalmente una copia local"""
+        while True:
+            bloque = await file.read(self.tamano_bloque)
+            if not bloque:
+                break
+            if copia is not None:
+                copia.write(bloque)
+            yield bloque
+
+    async def subir(self, nombre_archivo: str, contenido: Union[bytes, AsyncIterator[bytes]],
+                    tipo_contenido: str = "application/octet-stream", tamano: Optional[int] = None) -> str:
+        """
+        Sube un archivo al bucket.
+
+        Args:
+            nombre_archivo (str): Nombre del objeto dentro del bucket
+            contenido (bytes | AsyncIterator[bytes]): Contenido completo o por bloques
+            tipo_contenido (str): Content-Type del archivo
+            tamano (int | None): Tamaño en bytes si se conoce (evita el envío chunked)
+
+        Returns:
+            str: URL pública del archivo subido
+
+        Raises:
+            httpx.HTTPError: Si falla la conexión o Supabase rechaza el archivo
+        """
+        headers = {"Content-Type": tipo_contenido}
+        if tamano is not None:
+            headers["Content-Length"] = str(tamano)
+
+        resp = await self.cliente.post(
+            f"/storage/v1/object/{self.bucket}/{nombre_archivo}",
+            content=contenido,
+            headers=headers,
+        )
+        resp.raise_for_status()
+        return self.url_publica(nombre_archivo)
+
+    async def subir_upload(self, file: UploadFile, nombre_archivo: Optional[str] = None,
+                           copia: Optional[BinaryIO] = None) -> str:
+        """
+        Sube un archivo recibido en una solicitud.
+
+        Args:
+            file (UploadFile): Archivo recibido por FastAPI
+            nombre_archivo (str | None): Nombre en el bucket (por defecto uno único)
+            copia (BinaryIO | None): Archivo local donde se copian los bloques enviados
+
+        Returns:
+            str: URL pública del archivo subido
+        """
+        nombre_archivo = nombre_archivo or self.nombre_unico(file.filename)
+        return await self.subir(nombre_archivo, self._leer_bloques(file, copia), tamano=file.size)
+
+    async def cerrar(self):
+        """Cierra las conexiones del pool (al apagar la aplicación)"""
+        if self._cliente is not None:
+            await self._cliente.aclose()
+            self._cliente = None
+
+# Instancia global del servicio de almacenamiento
+storage_service = StorageService(
+    base_url=os.getenv("SUPABASE_URL"),
+    api_key=os.getenv("SUPABASE_KEY"),
+    max_conexiones=int(os.getenv("STORAGE_MAX_CONEXIONES", "20")),
+)
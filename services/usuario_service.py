@@ -1,7 +1,11 @@
+from sqlalchemy import inspect
+from sqlalchemy.engine import Row
 from sqlalchemy.orm import Session
 from fastapi import HTTPException
+from starlette.concurrency import run_in_threadpool
 import models, schemas
 from services.auth_service import PasswordManager
+from services.serializacion_service import seleccionar
 from typing import List, Optional
 
 class UsuarioService:
@@ -264,6 +268,30 @@ class UsuarioService:
             print(f"UsuarioService: Error al obtener administradores: {e}")
             return []
 
+    def obtener_filas(self, solo_admins: bool = False) -> List[Row]:
+        """
+        Obtiene los usuarios como tuplas de columnas, para serializarlos con filas_json.
+        
+        Args:
+            solo_admins (bool): Retornar solo los administradores
+            
+        Returns:
+            List[Row]: Filas con las columnas de schemas.Usuario (nunca el hash de la contraseña)
+            
+        Raises:
+            HTTPException: Si hay error en la consulta
+        """
+        try:
+            consulta = seleccionar(schemas.Usuario, models.Usuario)
+            if solo_admins:
+                consulta = consulta.where(models.Usuario.is_admin == True)
+            filas = self.db.execute(consulta.order_by(models.Usuario.id)).all()
+            print(f"UsuarioService: Obtenidos {len(filas)} usuarios")
+            return filas
+        except Exception as e:
+            print(f"UsuarioService: Error al obtener usuarios: {e}")
+            raise HTTPException(status_code=500, detail=f"Error al obtener usuarios: {str(e)}")
+
     def obtener_usuarios_regulares(self) -> List[models.Usuario]:
         """
         Obtiene todos los usuarios regulares (no administradores).
@@ -294,10 +322,86 @@ class UsuarioService:
             usuario = self.obtener_usuario_por_username(username)
             if usuario and self.password_manager.verify_password(password, usuario.password):
                 print(f"UsuarioService: Credenciales válidas para usuario '{username}'")
+                if self.password_manager.needs_rehash(usuario.password):
+                    self._actualizar_hash(usuario, password)
+                return usuario
+            else:
+                print(f"UsuarioService: Credenciales inválidas para usuario '{username}'")
+                return None
+        except HTTPException:
+            raise
+        except Exception as e:
+            print(f"UsuarioService: Error al validar credenciales: {e}")
+            return None
+
+    async def validar_credenciales_async(self, username: str, password: str) -> Optional[models.Usuario]:
+        """
+        Igual que validar_credenciales, para rutas async con sesión síncrona.
+
+        Las consultas corren en un hilo (son cortas) y el KDF se espera desde el
+        event loop, así que ningún hilo queda bloqueado mientras se calcula el hash.
+        """
+        try:
+            usuario = await run_in_threadpool(self.obtener_usuario_por_username, username)
+            if usuario and await self.password_manager.verify_password_async(password, usuario.password):
+                print(f"UsuarioService: Credenciales válidas para usuario '{username}'")
+                if self.password_manager.needs_rehash(usuario.password):
+                    try:
+                        nuevo_hash = await self.password_manager.hash_password_async(password)
+                    except Exception as e:
+                        # Si falla, el login sigue siendo válido y se reintenta en el próximo
+                        print(f"UsuarioService: Error al actualizar hash de contraseña: {e}")
+                    else:
+                        await run_in_threadpool(self._guardar_hash_sin_expirar, usuario, nuevo_hash)
                 return usuario
             else:
                 print(f"UsuarioService: Credenciales inválidas para usuario '{username}'")
                 return None
+        except HTTPException:
+            raise
         except Exception as e:
             print(f"UsuarioService: Error al validar credenciales: {e}")
             return None
+
+    def _actualizar_hash(self, usuario: models.Usuario, password: str):
+        """
+        Reemplaza un hash antiguo (MD5 o parámetros viejos) con el KDF actual.
+        Se llama solo tras un login correcto, cuando se conoce la contraseña.
+        
+        Args:
+            usuario (Usuario): Usuario autenticado
+            password (str): Contraseña en texto plano recién verificada
+        """
+        try:
+            nuevo_hash = self.password_manager.hash_password(password)
+        except Exception as e:
+            # Si falla, el login sigue siendo válido y se reintenta en el próximo
+            print(f"UsuarioService: Error al actualizar hash de contraseña: {e}")
+            return
+        self._guardar_hash(usuario, nuevo_hash)
+
+    def _guardar_hash(self, usuario: models.Usuario, nuevo_hash: str):
+        """Guarda el hash recalculado de un usuario recién autenticado"""
+        try:
+            usuario.password = nuevo_hash
+            self.db.commit()
+            print(f"UsuarioService: Hash de contraseña actualizado para usuario '{usuario.username}'")
+        except Exception as e:
+            # Si falla, el login sigue siendo válido y se reintenta en el próximo
+            self.db.rollback()
+            print(f"UsuarioService: Error al actualizar hash de contraseña: {e}")
+
+    def _guardar_hash_sin_expirar(self, usuario: models.Usuario, nuevo_hash: str):
+        """
+        _guardar_hash para la ruta async: quien llama sigue leyendo el usuario en
+        el event loop, así que el commit no lo expira y, si hubo rollback, se
+        recarga aquí mismo (en el hilo) en vez de perezosamente en el loop.
+        """
+        expirar = self.db.expire_on_commit
+        self.db.expire_on_commit = False
+        try:
+            self._guardar_hash(usuario, nuevo_hash)
+        finally:
+            self.db.expire_on_commit = expirar
+        if inspect(usuario).expired_attributes:
+            self.db.refresh(usuario)
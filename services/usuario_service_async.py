@@ -0,0 +1,180 @@
+from sqlalchemy import select
+from sqlalchemy.engine import Row
+from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi import HTTPException
+import models, schemas
+from services.auth_service import PasswordManager
+from services.serializacion_service import seleccionar
+from typing import List, Optional
+
+class UsuarioServiceAsync:
+    """
+    Versión asíncrona de UsuarioService sobre AsyncSession (asyncpg o aiosqlite).
+
+    Las consultas no ocupan hilos; el hash de contraseñas sigue corriendo en el
+    pool acotado de PasswordManager y se espera desde el event loop, sin ocupar
+    un hilo del servidor mientras se calcula.
+    """
+
+    def __init__(self, db: AsyncSession):
+        """
+        Constructor del servicio de usuarios.
+
+        Args:
+            db (AsyncSession): Sesión asíncrona de base de datos SQLAlchemy
+        """
+        self.db = db
+        self.password_manager = PasswordManager()
+
+    async def crear_usuario(self, data: schemas.UsuarioCreate) -> models.Usuario:
+        """
+        Crea un nuevo usuario en la base de datos.
+
+        Args:
+            data (UsuarioCreate): Datos del usuario a crear
+
+        Returns:
+            Usuario: El usuario creado
+
+        Raises:
+            HTTPException: Si hay error en la creación o el usuario ya existe
+        """
+        try:
+            if await self.obtener_usuario_por_username(data.username):
+                raise HTTPException(status_code=400, detail="El usuario ya existe")
+
+            if await self.db.scalar(select(models.Usuario.id).where(models.Usuario.email == data.email)):
+                raise HTTPException(status_code=400, detail="El email ya está registrado")
+
+            hashed_password = await self.password_manager.hash_password_async(data.password)
+
+            # Forzar que ningún usuario pueda crearse como admin desde el registro
+            usuario = models.Usuario(
+                username=data.username,
+                email=data.email,
+                password=hashed_password,
+                is_admin=False
+            )
+
+            self.db.add(usuario)
+            await self.db.commit()
+            await self.db.refresh(usuario)
+            print(f"UsuarioServiceAsync: Usuario {data.username} creado exitosamente")
+            return usuario
+        except HTTPException:
+            raise
+        except Exception as e:
+            await self.db.rollback()
+            print(f"UsuarioServiceAsync: Error al crear usuario: {e}")
+            raise HTTPException(status_code=500, detail=f"Error al crear usuario: {str(e)}")
+
+    async def obtener_usuarios(self) -> List[models.Usuario]:
+        """
+        Obtiene todos los usuarios de la base de datos.
+
+        Returns:
+            List[Usuario]: Lista de todos los usuarios
+
+        Raises:
+            HTTPException: Si hay error en la consulta
+        """
+        try:
+            usuarios = (await self.db.scalars(select(models.Usuario))).all()
+            print(f"UsuarioServiceAsync: Obtenidos {len(usuarios)} usuarios")
+            return usuarios
+        except Exception as e:
+            print(f"UsuarioServiceAsync: Error al obtener usuarios: {e}")
+            raise HTTPException(status_code=500, detail=f"Error al obtener usuarios: {str(e)}")
+
+    async def obtener_usuario_por_username(self, username: str) -> Optional[models.Usuario]:
+        """
+        Obtiene un usuario por su nombre de usuario.
+
+        Args:
+            username (str): Nombre de usuario a buscar
+
+        Returns:
+            Usuario | None: El usuario encontrado o None si no existe
+        """
+        try:
+            return await self.db.scalar(select(models.Usuario).where(models.Usuario.username == username))
+        except Exception as e:
+            print(f"UsuarioServiceAsync: Error al buscar usuario por username: {e}")
+            return None
+
+    async def obtener_filas(self, solo_admins: bool = False) -> List[Row]:
+        """
+        Obtiene los usuarios como tuplas de columnas, para serializarlos con filas_json.
+
+        Args:
+            solo_admins (bool): Retornar solo los administradores
+
+        Returns:
+            List[Row]: Filas con las columnas de schemas.Usuario
+
+        Raises:
+            HTTPException: Si hay error en la consulta
+        """
+        try:
+            consulta = seleccionar(schemas.Usuario, models.Usuario)
+            if solo_admins:
+                consulta = consulta.where(models.Usuario.is_admin == True)
+            filas = (await self.db.execute(consulta.order_by(models.Usuario.id))).all()
+            print(f"UsuarioServiceAsync: Obtenidos {len(filas)} usuarios")
+            return filas
+        except Exception as e:
+            print(f"UsuarioServiceAsync: Error al obtener usuarios: {e}")
+            raise HTTPException(status_code=500, detail=f"Error al obtener usuarios: {str(e)}")
+
+    async def obtener_administradores(self) -> List[models.Usuario]:
+        """
+        Obtiene todos los usuarios administradores.
+
+        Returns:
+            List[Usuario]: Lista de usuarios administradores
+        """
+        try:
+            admins = (await self.db.scalars(select(models.Usuario).where(models.Usuario.is_admin == True))).all()
+            print(f"UsuarioServiceAsync: Encontrados {len(admins)} administradores")
+            return admins
+        except Exception as e:
+            print(f"UsuarioServiceAsync: Error al obtener administradores: {e}")
+            return []
+
+    async def validar_credenciales(self, username: str, password: str) -> Optional[models.Usuario]:
+        """
+        Valida las credenciales de un usuario.
+
+        Args:
+            username (str): Nombre de usuario
+            password (str): Contraseña en texto plano
+
+        Returns:
+            Usuario | None: El usuario si las credenciales son válidas, None en caso contrario
+        """
+        try:
+            usuario = await self.obtener_usuario_por_username(username)
+            if usuario and await self.password_manager.verify_password_async(password, usuario.password):
+                print(f"UsuarioServiceAsync: Credenciales válidas para usuario '{username}'")
+                if self.password_manager.needs_rehash(usuario.password):
+                    await self._actualizar_hash(usuario, password)
+                return usuario
+            else:
+                print(f"UsuarioServiceAsync: Credenciales inválidas para usuario '{username}'")
+                return None
+        except HTTPException:
+            raise
+        except Exception as e:
+            print(f"UsuarioServiceAsync: Error al validar credenciales: {e}")
+            return None
+
+    async def _actualizar_hash(self, usuario: models.Usuario, password: str):
+        """Reemplaza un hash antiguo con el KDF actual tras un login correcto"""
+        try:
+            usuario.password = await self.password_manager.hash_password_async(password)
+            await self.db.commit()
+            print(f"UsuarioServiceAsync: Hash de contraseña actualizado para usuario '{usuario.username}'")
+        except Exception as e:
+            # Si falla, el login sigue siendo válido y se reintenta en el próximo
+            await self.db.rollback()
+            print(f"UsuarioServiceAsync: Error al actualizar hash de contraseña: {e}")
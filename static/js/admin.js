@@ -6,6 +6,10 @@ const api = "/productos";
 let productosGlobal = [];
 let marcasGlobal = [];
 let categoriasGlobal = [];
+// Producto cargado en el formulario para edición (para enviar solo los cambios)
+let productoEditando = null;
+// Versión del catálogo que ya se tiene, para pedir solo los cambios posteriores
+let cursorCambios = null;
 
 // Función para renderizar productos según filtros
 function renderizarProductos(productos) {
@@ -15,15 +19,17 @@ function renderizarProductos(productos) {
     const urlImagen = prod.imagen_url && prod.imagen_url.trim() !== "" 
       ? prod.imagen_url 
       : "https://via.placeholder.com/100";
+    // Se muestra la miniatura; si aún no se ha generado se cae al original
+    const urlMiniatura = prod.imagen_thumb_url || urlImagen;
     const card = document.createElement("div");
     card.className = "card producto-card";
     card.innerHTML = `
       <div class="card-body d-flex">
-        <img src="${urlImagen}" onerror="this.onerror=null; this.src='https://via.placeholder.com/100'" class="producto-imagen me-3">
+        <img src="${urlMiniatura}" loading="lazy" data-original="${urlImagen}" onerror="if (this.src !== this.dataset.original) { this.src = this.dataset.original; } else { this.onerror=null; this.src='https://via.placeholder.com/100'; }" class="producto-imagen me-3">
         <div class="flex-grow-1">
           <h5>${prod.nombre}</h5>
           <p><strong>Marca:</strong> ${prod.marca} | <strong>Categoría:</strong> ${prod.categoria}</p>
-          <p><strong>Cantidad:</strong> ${prod.cantidad}</p>
+          <p><strong>Cantidad:</strong> ${prod.cantidad} <small class="text-muted">(mínimo ${prod.stock_minimo})</small></p>
           <p><small>${prod.descripcion}</small></p>
           <button class="btn btn-warning btn-sm me-2" onclick='editar(${JSON.stringify(prod)})'>Editar</button>
           <button class="btn btn-danger btn-sm" onclick="eliminar(${prod.id})">Eliminar</button>
@@ -48,7 +54,7 @@ function aplicarFiltros() {
   renderizarProductos(filtrados);
 }
 
-// Función para cargar productos y llenar filtros
+// Función para cargar productos
 async function cargarProductos() {
   try {
     const res = await fetch(api, {
@@ -59,11 +65,78 @@ async function cargarProductos() {
       return;
     }
     const productos = await res.json();
+    cursorCambios = res.headers.get('X-Cursor-Cambios');
     productosGlobal = productos;
+    aplicarFiltros();
+  } catch (error) {
+    console.error('Error al cargar productos:', error);
+  }
+}
+
+// Trae solo lo que cambió desde la última sincronización y lo aplica sobre la lista
+async function sincronizarCambios() {
+  if (cursorCambios === null) return cargarProductos();
+  try {
+    let hayMas = true;
+    while (hayMas) {
+      const res = await fetch(`${api}/changes?since=${cursorCambios}`, { credentials: 'include' });
+      if (!res.ok) return cargarProductos();
+      const cambios = await res.json();
+      const eliminados = new Set(cambios.eliminados);
+      const porId = new Map(productosGlobal.filter(p => !eliminados.has(p.id)).map(p => [p.id, p]));
+      cambios.productos.forEach(p => porId.set(p.id, p));
+      productosGlobal = [...porId.values()].sort((a, b) => a.id - b.id);
+      cursorCambios = cambios.cursor;
+      hayMas = cambios.hay_mas;
+    }
+    aplicarFiltros();
+  } catch (error) {
+    console.error('Error al sincronizar cambios:', error);
+  }
+}
+
+// Cambios hechos por otros administradores: se aplican sobre la lista sin volver a pedirla
+function escucharCambios() {
+  if (!window.EventSource) return;
+  const fuente = new EventSource(`${api}/eventos`);
+  let conectado = false;
+  fuente.addEventListener('open', () => {
+    // Si la conexión se cayó se pudieron perder eventos: se piden los cambios desde el último cursor
+    if (conectado) sincronizarCambios();
+    conectado = true;
+  });
+  fuente.addEventListener('producto', e => {
+    const cambios = JSON.parse(e.data);
+    const i = productosGlobal.findIndex(p => p.id === cambios.id);
+    if (i >= 0) {
+      productosGlobal[i] = { ...productosGlobal[i], ...cambios };
+    } else if (cambios.nombre !== undefined) {
+      productosGlobal.push(cambios);
+    }
+    aplicarFiltros();
+  });
+  fuente.addEventListener('eliminado', e => {
+    const ids = new Set(JSON.parse(e.data).ids);
+    productosGlobal = productosGlobal.filter(p => !ids.has(p.id));
+    aplicarFiltros();
+  });
+  fuente.addEventListener('recargar', () => {
+    cargarProductos();
+    cargarFacetas();
+  });
+}
+
+// Función para cargar marcas y categorías desde el servidor y llenar filtros
+async function cargarFacetas() {
+  try {
+    const res = await fetch(`${api}/facetas`, {
+      credentials: 'include'
+    });
+    const facetas = await res.json();
     // Llenar datalist de marca y categoría
     try {
-      marcasGlobal = [...new Set(productos.map(p => (p.marca || '').trim()).filter(v => v))];
-      categoriasGlobal = [...new Set(productos.map(p => (p.categoria || '').trim()).filter(v => v))];
+      marcasGlobal = facetas.marcas.map(f => f.valor);
+      categoriasGlobal = facetas.categorias.map(f => f.valor);
       const datalistMarca = document.getElementById('datalist-marca');
       const datalistCategoria = document.getElementById('datalist-categoria');
       if (datalistMarca) {
@@ -108,9 +181,8 @@ async function cargarProductos() {
         filtroCategoria.value = valorActual;
       }
     } catch (e) {}
-    aplicarFiltros();
   } catch (error) {
-    console.error('Error al cargar productos:', error);
+    console.error('Error al cargar facetas:', error);
   }
 }
 
@@ -123,6 +195,7 @@ async function eliminar(id) {
         credentials: 'include' // Incluir cookies de autenticación
       });
       cargarProductos();
+      cargarFacetas();
     } catch (error) {
       console.error('Error al eliminar producto:', error);
       alert('Error al eliminar el producto');
@@ -132,13 +205,18 @@ async function eliminar(id) {
 
 // Función para llenar formulario para edición
 function editar(prod) {
+  productoEditando = prod;
   document.getElementById("productoId").value = prod.id;
   document.getElementById("nombre").value = prod.nombre;
   document.getElementById("cantidad").value = prod.cantidad;
+  document.getElementById("stockMinimo").value = prod.stock_minimo;
   document.getElementById("descripcion").value = prod.descripcion;
   document.getElementById("marca").value = prod.marca;
   document.getElementById("categoria").value = prod.categoria;
   document.getElementById("imagenActual").value = prod.imagen_url || "";
+  document.getElementById("imagenThumb").value = prod.imagen_thumb_url || "";
+  document.getElementById("imagenWebp").value = prod.imagen_webp_url || "";
+  document.getElementById("imagenAvif").value = prod.imagen_avif_url || "";
 }
 
 // Configurar el formulario cuando se carga la página
@@ -153,6 +231,9 @@ document.addEventListener("DOMContentLoaded", async function() {
       const id = document.getElementById("productoId").value;
       const imagen = document.getElementById("imagen");
       let imagen_url = document.getElementById("imagenActual").value;
+      let imagen_thumb_url = document.getElementById("imagenThumb").value || null;
+      let imagen_webp_url = document.getElementById("imagenWebp").value || null;
+      let imagen_avif_url = document.getElementById("imagenAvif").value || null;
       // Subir imagen si hay una nueva
       if (imagen.files.length > 0) {
         const formData = new FormData();
@@ -163,31 +244,57 @@ document.addEventListener("DOMContentLoaded", async function() {
         });
         const dataImg = await resImg.json();
         imagen_url = dataImg.url;
+        // Las variantes de la imagen anterior ya no sirven; el servidor guarda las
+        // nuevas en el producto cuando termina de generarlas
+        imagen_thumb_url = null;
+        imagen_webp_url = null;
+        imagen_avif_url = null;
       }
       // Crear objeto producto
       const producto = {
         nombre: document.getElementById("nombre").value,
         cantidad: parseInt(document.getElementById("cantidad").value),
+        stock_minimo: parseInt(document.getElementById("stockMinimo").value),
         descripcion: document.getElementById("descripcion").value,
         marca: document.getElementById("marca").value,
         categoria: document.getElementById("categoria").value,
-        imagen_url
+        imagen_url,
+        imagen_thumb_url,
+        imagen_webp_url,
+        imagen_avif_url
       };
-      // Determinar método y URL
-      const method = id ? "PUT" : "POST";
-      const url = id ? `${api}/${id}` : `${api}/`;
+      // Al editar se envía con PATCH solo lo que cambió; al crear, el producto completo
+      let method = "POST";
+      let url = `${api}/`;
+      let cuerpo = producto;
+      if (id) {
+        method = "PATCH";
+        url = `${api}/${id}`;
+        cuerpo = {};
+        Object.keys(producto).forEach(campo => {
+          const anterior = productoEditando ? (productoEditando[campo] ?? null) : undefined;
+          if ((producto[campo] || null) !== (anterior || null)) {
+            cuerpo[campo] = producto[campo];
+          }
+        });
+      }
       // Enviar datos
       await fetch(url, {
         method,
         headers: { "Content-Type": "application/json" },
-        body: JSON.stringify(producto),
+        body: JSON.stringify(cuerpo),
         credentials: 'include'
       });
       // Limpiar formulario y recargar productos
       e.target.reset();
+      productoEditando = null;
       document.getElementById("productoId").value = "";
       document.getElementById("imagenActual").value = "";
+      document.getElementById("imagenThumb").value = "";
+      document.getElementById("imagenWebp").value = "";
+      document.getElementById("imagenAvif").value = "";
       cargarProductos();
+      cargarFacetas();
       // Mostrar mensaje de éxito
       alert(id ? 'Producto actualizado exitosamente' : 'Producto creado exitosamente');
     } catch (error) {
@@ -205,8 +312,10 @@ document.addEventListener("DOMContentLoaded", async function() {
     aplicarFiltros();
   });
 
-  // Cargar productos al iniciar
+  // Cargar filtros y productos al iniciar
+  cargarFacetas();
   cargarProductos();
+  escucharCambios();
 });
 
 // Función para verificar autenticación
@@ -1,12 +1,33 @@
 
 const api = "/productos";
 let todosLosProductos = [];
+// Versión del catálogo que ya se tiene, para pedir solo los cambios posteriores
+let cursorCambios = null;
 
 async function obtenerProductos() {
   const res = await fetch(api);
+  cursorCambios = res.headers.get('X-Cursor-Cambios');
   return await res.json();
 }
 
+// Trae solo lo que cambió desde la última sincronización y lo aplica sobre la copia local
+async function sincronizarCambios() {
+  if (cursorCambios === null) return recargarCatalogo();
+  let hayMas = true;
+  while (hayMas) {
+    const res = await fetch(`${api}/changes?since=${cursorCambios}`);
+    if (!res.ok) return recargarCatalogo();
+    const cambios = await res.json();
+    const eliminados = new Set(cambios.eliminados);
+    const porId = new Map(todosLosProductos.filter(p => !eliminados.has(p.id)).map(p => [p.id, p]));
+    cambios.productos.forEach(p => porId.set(p.id, p));
+    todosLosProductos = [...porId.values()].sort((a, b) => a.id - b.id);
+    cursorCambios = cambios.cursor;
+    hayMas = cambios.hay_mas;
+  }
+  aplicarFiltros();
+}
+
 function renderizarProductos(productos) {
   const contenedor = document.getElementById("listaProductos");
   contenedor.innerHTML = "";
@@ -19,10 +40,13 @@ function renderizarProductos(productos) {
       ? prod.imagen_url
       : "https://via.placeholder.com/250";
 
+    // En la cuadrícula se usa la miniatura; si aún no existe se cae al original
+    const urlMiniatura = prod.imagen_thumb_url || urlImagen;
+
     const card = document.createElement("div");
     card.className = "producto-card producto"; // Agrega la clase 'producto'
     card.innerHTML = `
-      <img src="${urlImagen}" onerror="this.onerror=null; this.src='https://via.placeholder.com/250'" class="producto-imagen">
+      <img src="${urlMiniatura}" loading="lazy" data-original="${urlImagen}" onerror="if (this.src !== this.dataset.original) { this.src = this.dataset.original; } else { this.onerror=null; this.src='https://via.placeholder.com/250'; }" class="producto-imagen">
       <div class="producto-nombre">${prod.nombre}</div>
       <div class="producto-info"><strong>Marca:</strong> ${prod.marca}</div>
       <div class="producto-info"><strong>Categoría:</strong> ${prod.categoria}</div>
@@ -43,14 +67,18 @@ function renderizarProductos(productos) {
   });
 }
 
-function llenarSelectUnicos(productos, campo, selectId) {
-  const valores = [...new Set(productos.map(p => (p[campo] || '').trim()).filter(v => v))];
+async function obtenerFacetas() {
+  const res = await fetch(`${api}/facetas`);
+  return await res.json();
+}
+
+function llenarSelectFacetas(facetas, selectId) {
   const select = document.getElementById(selectId);
   select.innerHTML = '<option value="">Todas</option>';
-  valores.forEach(valor => {
+  facetas.forEach(faceta => {
     const option = document.createElement('option');
-    option.value = valor;
-    option.textContent = valor;
+    option.value = faceta.valor;
+    option.textContent = `${faceta.valor} (${faceta.cantidad})`;
     select.appendChild(option);
   });
 }
@@ -68,10 +96,46 @@ function aplicarFiltros() {
   renderizarProductos(filtrados);
 }
 
+async function recargarCatalogo() {
+  todosLosProductos = await obtenerProductos();
+  aplicarFiltros();
+}
+
+// Cambios en tiempo real: se aplican sobre la copia local en lugar de volver a pedir todo el catálogo
+function escucharCambios() {
+  if (!window.EventSource) return;
+  const fuente = new EventSource(`${api}/eventos`);
+  let conectado = false;
+  fuente.addEventListener('open', () => {
+    // Si la conexión se cayó se pudieron perder eventos: se piden los cambios desde el último cursor
+    if (conectado) sincronizarCambios();
+    conectado = true;
+  });
+  fuente.addEventListener('producto', e => {
+    const cambios = JSON.parse(e.data);
+    const i = todosLosProductos.findIndex(p => p.id === cambios.id);
+    if (i >= 0) {
+      todosLosProductos[i] = { ...todosLosProductos[i], ...cambios };
+    } else if (cambios.nombre !== undefined) {
+      todosLosProductos.push(cambios);
+    }
+    aplicarFiltros();
+  });
+  fuente.addEventListener('eliminado', e => {
+    const ids = new Set(JSON.parse(e.data).ids);
+    todosLosProductos = todosLosProductos.filter(p => !ids.has(p.id));
+    aplicarFiltros();
+  });
+  fuente.addEventListener('recargar', recargarCatalogo);
+}
+
 async function inicializarCatalogo() {
+  // Los filtros se llenan desde el servidor sin esperar a que llegue el catálogo
+  obtenerFacetas().then(facetas => {
+    llenarSelectFacetas(facetas.categorias, 'filtroCategoria');
+    llenarSelectFacetas(facetas.marcas, 'filtroMarca');
+  });
   todosLosProductos = await obtenerProductos();
-  llenarSelectUnicos(todosLosProductos, 'categoria', 'filtroCategoria');
-  llenarSelectUnicos(todosLosProductos, 'marca', 'filtroMarca');
   renderizarProductos(todosLosProductos);
 
   document.getElementById('filtroCategoria').addEventListener('change', aplicarFiltros);
@@ -82,6 +146,8 @@ async function inicializarCatalogo() {
     document.getElementById('filtroMarca').value = '';
     renderizarProductos(todosLosProductos);
   });
+
+  escucharCambios();
 }
 
 
@@ -0,0 +1,13 @@
+import os
+import sys
+import tempfile
+
+# Las pruebas nunca deben tocar la base configurada en .env: database.py crea el
+# motor al importarse, así que la URL se fija antes de importar el proyecto
+_directorio = tempfile.mkdtemp(prefix="fisproject-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_directorio, 'pruebas.db')}"
+os.environ.pop("DATABASE_READ_URL", None)
+# Las rutas /async se prueban contra las síncronas
+os.environ["DB_ASYNC_HABILITADO"] = "true"
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,106 @@
+import asyncio
+import base64
+import hashlib
+import secrets
+import threading
+import pytest
+from fastapi import HTTPException
+from services import auth_service
+from services.auth_service import PasswordManager, scrypt_hash
+
+def _hash(password: str, n: int = 2 ** 10) -> str:
+    salt = secrets.token_bytes(16)
+    llave = scrypt_hash(password, salt, n, 8, 1)
+    return f"scrypt${n}$8$1${base64.b64encode(salt).decode()}${base64.b64encode(llave).decode()}"
+
+@pytest.mark.parametrize("password, hashed, esperado", [
+    ("clave", _hash("clave"), True),
+    ("otra", _hash("clave"), False),
+    ("clave", hashlib.md5(b"clave").hexdigest(), True),
+    ("clave", "", False),
+    ("clave", "scrypt$mal$formado", False),
+])
+def test_verify_password_async_igual_que_sincrono(password, hashed, esperado):
+    assert PasswordManager.verify_password(password, hashed) is esperado
+    assert asyncio.run(PasswordManager.verify_password_async(password, hashed)) is esperado
+
+def test_hash_password_async_verificable():
+    hashed = asyncio.run(PasswordManager.hash_password_async("clave"))
+    assert PasswordManager.verify_password("clave", hashed)
+
+def test_event_loop_sigue_atendiendo_durante_el_kdf():
+    hashed = _hash("clave", n=2 ** 15)
+
+    async def medir():
+        vueltas = 0
+        verificacion = asyncio.ensure_future(PasswordManager.verify_password_async("clave", hashed))
+        while not verificacion.done():
+            vueltas += 1
+            await asyncio.sleep(0.001)
+        return vueltas, verificacion.result()
+
+    vueltas, valido = asyncio.run(medir())
+    assert valido and vueltas > 1
+
+def _agotar_cupo() -> int:
+    tomados = 0
+    while auth_service._kdf_pendientes.tomar(0):
+        tomados += 1
+    return tomados
+
+def _devolver_cupo(tomados: int):
+    for _ in range(tomados):
+        auth_service._kdf_pendientes.liberar()
+
+def test_rechaza_con_503_si_hay_demasiados_pendientes(monkeypatch):
+    monkeypatch.setattr(auth_service, "KDF_ESPERA_MAXIMA", 0.05)
+    tomados = _agotar_cupo()
+    try:
+        with pytest.raises(HTTPException) as error:
+            asyncio.run(PasswordManager.verify_password_async("clave", _hash("clave")))
+        assert error.value.status_code == 503
+        with pytest.raises(HTTPException):
+            PasswordManager.verify_password("clave", _hash("clave"))
+    finally:
+        _devolver_cupo(tomados)
+    # El cupo vuelve completo después de cada cálculo
+    assert asyncio.run(PasswordManager.verify_password_async("clave", _hash("clave")))
+    assert _agotar_cupo() == tomados
+    _devolver_cupo(tomados)
+
+def test_cupo_se_entrega_en_orden_de_llegada():
+    tomados = _agotar_cupo()
+    orden = []
+    try:
+        async def esperar():
+            primero = threading.Thread(target=lambda: orden.append(("hilo", auth_service._kdf_pendientes.tomar(5))))
+            primero.start()
+            while not auth_service._kdf_pendientes._fila:
+                await asyncio.sleep(0.001)
+            segundo = asyncio.ensure_future(auth_service._kdf_pendientes.tomar_async(5))
+            await asyncio.sleep(0.01)
+            auth_service._kdf_pendientes.liberar()
+            await asyncio.to_thread(primero.join)
+            assert not segundo.done()
+            auth_service._kdf_pendientes.liberar()
+            orden.append(("async", await segundo))
+
+        asyncio.run(esperar())
+        assert orden == [("hilo", True), ("async", True)]
+    finally:
+        _devolver_cupo(tomados)
+
+def test_hash_passwords_respeta_el_cupo():
+    tomados = _agotar_cupo()
+    resultado = []
+    importacion = threading.Thread(target=lambda: resultado.extend(PasswordManager.hash_passwords(["a", "b"])))
+    try:
+        importacion.start()
+        importacion.join(0.2)
+        assert importacion.is_alive() and not resultado
+    finally:
+        _devolver_cupo(tomados)
+    importacion.join(10)
+    assert len(resultado) == 2 and PasswordManager.verify_password("b", resultado[1])
+    assert _agotar_cupo() == tomados
+    _devolver_cupo(tomados)
@@ -0,0 +1,47 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+import models
+from services.busqueda_service import BusquedaProductos
+
+MARCAS = ["Muñeca", "Piña", "Más", "Crème", "BRÛLÉE", "Acme", "ab"]
+
+@pytest.fixture
+def db(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'busqueda.db'}")
+    models.Base.metadata.create_all(bind=engine)
+    BusquedaProductos.preparar_indices(engine)
+    sesion = sessionmaker(bind=engine)()
+    sesion.add_all(
+        models.Producto(nombre=marca, cantidad=1, descripcion="d", marca=marca, categoria=marca)
+        for marca in MARCAS
+    )
+    sesion.commit()
+    yield sesion
+    sesion.close()
+    engine.dispose()
+
+def marcas_ilike(db, texto):
+    consulta = db.query(models.Producto).filter(models.Producto.marca.ilike(f"%{texto}%"))
+    return [p.marca for p in consulta.order_by(models.Producto.id)]
+
+def test_usa_el_indice_fts(db):
+    assert BusquedaProductos(db)._usa_fts()
+
+@pytest.mark.parametrize("texto, esperado", [
+    ("uñ", ["Muñeca"]),
+    ("ña", ["Piña"]),
+    ("ás", ["Más"]),
+    ("rè", ["Crème"]),
+    ("ñ", ["Muñeca", "Piña"]),
+])
+def test_terminos_cortos_con_acentos(db, texto, esperado):
+    assert [p.marca for p in BusquedaProductos(db).buscar("marca", texto)] == esperado
+
+@pytest.mark.parametrize("texto", ["uñ", "ña", "ás", "rè", "mu", "MU", "b", "ñ", "Crè", "BRÛ", "acm", "ACME", "xyz"])
+def test_mismos_resultados_que_ilike(db, texto):
+    assert [p.marca for p in BusquedaProductos(db).buscar("marca", texto)] == marcas_ilike(db, texto)
+
+def test_campo_no_soportado(db):
+    with pytest.raises(ValueError):
+        BusquedaProductos(db).buscar("nombre", "abc")
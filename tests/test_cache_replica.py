@@ -0,0 +1,90 @@
+import asyncio
+import pytest
+from starlette.requests import Request
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+import schemas
+from database import SessionLocal, engine, motores_async
+from services.cache_service import catalogo_cache
+from services.cambios_service import CambiosService
+from services.esquema_service import actualizar_esquema
+from services.producto_service import ProductoService
+from services.producto_service_async import ProductoServiceAsync
+from services.respuestas_service import respuesta_catalogo, respuesta_catalogo_async
+
+@pytest.fixture
+def version_escrita():
+    """Crea un producto y retorna el número de cambio que quedó confirmado"""
+    actualizar_esquema(engine)
+    catalogo_cache.invalidar()
+    db = SessionLocal()
+    try:
+        ProductoService(db).crear_producto(schemas.ProductoCreate(
+            nombre="replica", cantidad=1, descripcion="d", marca="Marca", categoria="Cat"))
+        return CambiosService(db).version_actual()
+    finally:
+        db.close()
+
+def test_escritura_anota_la_version_confirmada(version_escrita):
+    assert catalogo_cache.version_bd >= version_escrita
+
+def test_replica_al_dia_guarda_en_cache(version_escrita):
+    with Session(engine, info={"replica": True}) as db:
+        servicio = ProductoService(db)
+        assert servicio.obtener_cacheado(("replica", "al-dia"), catalogo_cache.version, lambda: "filas") == "filas"
+    assert catalogo_cache.obtener(("replica", "al-dia"), catalogo_cache.version) == "filas"
+
+def test_replica_atrasada_no_guarda_en_cache(version_escrita):
+    # Otra escritura de este proceso que la "réplica" todavía no tiene
+    catalogo_cache.registrar_escritura(version_escrita + 1)
+    with Session(engine, info={"replica": True}) as db:
+        servicio = ProductoService(db)
+        version = catalogo_cache.version
+        assert servicio.obtener_cacheado(("replica", "atrasada"), version, lambda: "viejo") == "viejo"
+        assert servicio.obtener_cacheado((("replica", "atrasada"), "gzip"), version, lambda: "comprimido") == "comprimido"
+    assert catalogo_cache.obtener(("replica", "atrasada"), version) is None
+    assert catalogo_cache.obtener((("replica", "atrasada"), "gzip"), version) is None
+
+def test_replica_atrasada_no_guarda_en_cache_async(version_escrita):
+    catalogo_cache.registrar_escritura(version_escrita + 1)
+
+    async def leer():
+        async with AsyncSession(motores_async()[0], info={"replica": True}) as db:
+            async def cargar():
+                return "viejo"
+            return await ProductoServiceAsync(db).obtener_cacheado(("replica", "async"), catalogo_cache.version, cargar)
+
+    assert asyncio.run(leer()) == "viejo"
+    assert catalogo_cache.obtener(("replica", "async"), catalogo_cache.version) is None
+
+def _peticion(**cabeceras) -> Request:
+    return Request({"type": "http", "method": "GET", "path": "/productos/",
+                    "headers": [(k.replace("_", "-").encode(), v.encode()) for k, v in cabeceras.items()]})
+
+def test_respuesta_de_replica_atrasada_sin_etag(version_escrita):
+    catalogo_cache.registrar_escritura(version_escrita + 1)
+    with Session(engine, info={"replica": True}) as db:
+        respuesta = respuesta_catalogo(_peticion(accept_encoding="gzip"), ProductoService(db), ("replica", "etag"),
+                                       lambda: (b"[]", {}))
+    assert "etag" not in respuesta.headers
+    assert respuesta.headers["cache-control"] == "no-store"
+
+def test_respuesta_de_replica_al_dia_con_etag(version_escrita):
+    with Session(engine, info={"replica": True}) as db:
+        respuesta = respuesta_catalogo(_peticion(accept_encoding="gzip"), ProductoService(db), ("replica", "etag-al-dia"),
+                                       lambda: (b"[]", {}))
+    assert respuesta.headers["etag"] == catalogo_cache.etag(catalogo_cache.version, "gzip")
+    assert respuesta.headers["cache-control"] == "no-cache"
+
+def test_respuesta_async_de_replica_atrasada_sin_etag(version_escrita):
+    catalogo_cache.registrar_escritura(version_escrita + 1)
+
+    async def responder():
+        async with AsyncSession(motores_async()[0], info={"replica": True}) as db:
+            async def cargar():
+                return b"[]", {}
+            return await respuesta_catalogo_async(_peticion(), ProductoServiceAsync(db), ("replica", "etag-async"), cargar)
+
+    respuesta = asyncio.run(responder())
+    assert "etag" not in respuesta.headers
+    assert respuesta.headers["cache-control"] == "no-store"
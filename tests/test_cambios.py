@@ -0,0 +1,134 @@
+from datetime import datetime, timedelta
+import asyncio
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event, func, select, text, update
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncSession
+import main, models, schemas
+from database import SessionLocal, engine, motores_async
+from services.auth_service import PasswordManager
+from services.cambios_service import (
+    TOLERANCIA, CambiosService, cursor_seguro, siguiente_version, siguiente_version_async,
+)
+from services.esquema_service import actualizar_esquema
+from services.producto_service import ProductoService
+
+AHORA = datetime(2026, 1, 1, 12, 0)
+RECIENTE = AHORA - TOLERANCIA / 2
+ANTIGUO = AHORA - TOLERANCIA * 2
+
+@pytest.mark.parametrize("registrados, esperado", [
+    ([], 10),
+    ([(11, RECIENTE), (12, RECIENTE)], 12),
+    # 12 todavía puede estar en curso: no se entrega 13 hasta que 12 confirme o caduque
+    ([(11, RECIENTE), (13, RECIENTE)], 11),
+    # El número siguiente al hueco se registró hace más de TOLERANCIA: 12 se revirtió
+    ([(11, ANTIGUO), (13, ANTIGUO), (14, RECIENTE)], 14),
+    ([(12, RECIENTE)], 10),
+])
+def test_cursor_seguro(registrados, esperado):
+    assert cursor_seguro(10, registrados, AHORA) == esperado
+
+@pytest.fixture
+def db():
+    actualizar_esquema(engine)
+    sesion = SessionLocal()
+    if not sesion.query(models.Usuario).filter_by(username="admin_cambios").first():
+        sesion.add(models.Usuario(username="admin_cambios", email="admin@cambios.com",
+                                  password=PasswordManager.hash_password("clave"), is_admin=True))
+        sesion.commit()
+    try:
+        yield sesion
+    finally:
+        sesion.close()
+
+def _producto(nombre: str) -> schemas.ProductoCreate:
+    return schemas.ProductoCreate(nombre=nombre, cantidad=1, descripcion="d", marca="Marca", categoria="Cat")
+
+def test_escrituras_no_actualizan_la_marca(db):
+    base = db.scalar(select(models.SecuenciaCambios.valor).where(models.SecuenciaCambios.nombre == "productos"))
+    producto = ProductoService(db).crear_producto(_producto("cambios"))
+    assert db.scalar(select(models.SecuenciaCambios.valor).where(models.SecuenciaCambios.nombre == "productos")) == base
+    assert CambiosService(db).version_actual() == producto.version
+
+def test_consolidar_conserva_la_numeracion(db):
+    ProductoService(db).crear_producto(_producto("consolidar"))
+    consolidado = CambiosService(db).purgar()["consolidado"]
+    assert db.scalar(select(func.count()).select_from(models.CambioCatalogo)) == 1
+    assert CambiosService(db).version_actual() == consolidado
+    assert siguiente_version(db) == consolidado + 1
+    db.rollback()
+
+def test_cursor_anterior_a_la_purga_recibe_410(db):
+    servicio = ProductoService(db)
+    producto = servicio.crear_producto(_producto("purgar"))
+    servicio.eliminar_producto(producto.id)
+    db.execute(update(models.ProductoEliminado)
+               .where(models.ProductoEliminado.producto_id == producto.id)
+               .values(eliminado_en=datetime.now() - timedelta(days=365)))
+    db.commit()
+
+    minimo = CambiosService(db).purgar()["cursor_minimo"]
+    assert minimo > producto.version
+    assert db.get(models.ProductoEliminado, producto.id) is None
+
+    with TestClient(main.app) as cliente:
+        assert cliente.get(f"/productos/changes?since={producto.version}").status_code == 410
+        respuesta = cliente.get(f"/productos/changes?since={minimo}")
+        assert respuesta.status_code == 200
+        assert producto.id not in respuesta.json()["eliminados"]
+
+def _simular_numero_consumido(db, version: int):
+    """PostgreSQL no devuelve a la secuencia un número de una transacción revertida; SQLite sí"""
+    db.execute(text("UPDATE sqlite_sequence SET seq = MAX(seq, :version) WHERE name = 'cambios_catalogo'"),
+               {"version": version})
+    db.commit()
+
+def test_numero_revertido_no_detiene_el_cursor(db):
+    version = siguiente_version(db)
+    db.rollback()
+    _simular_numero_consumido(db, version)
+
+    producto = ProductoService(db).crear_producto(_producto("hueco"))
+    assert producto.version == version + 1
+    assert CambiosService(db).version_actual() == producto.version
+
+def test_numero_revertido_no_detiene_el_cursor_async(db):
+    async def reservar_y_revertir():
+        async with AsyncSession(motores_async()[0]) as sesion:
+            version = await siguiente_version_async(sesion)
+            await sesion.rollback()
+            return version
+
+    version = asyncio.run(reservar_y_revertir())
+    _simular_numero_consumido(db, version)
+    producto = ProductoService(db).crear_producto(_producto("hueco async"))
+    assert CambiosService(db).version_actual() == producto.version
+
+@pytest.mark.parametrize("prefijo", ["", "/async"])
+def test_ajuste_rechazado_no_toma_numero_de_cambio(db, prefijo):
+    producto = ProductoService(db).crear_producto(_producto("sin stock"))
+    sentencias = []
+
+    def registrar(conn, cursor, sentencia, parametros, contexto, executemany):
+        sentencias.append(sentencia)
+
+    with TestClient(main.app) as cliente:
+        cliente.post("/auth/login", json={"username": "admin_cambios", "password": "clave"})
+        event.listen(Engine, "before_cursor_execute", registrar)
+        try:
+            assert cliente.patch(f"{prefijo}/productos/{producto.id}/stock", json={"delta": -5}).status_code == 409
+            assert cliente.patch(f"{prefijo}/productos/999999/stock", json={"delta": 1}).status_code == 404
+            assert cliente.patch(f"{prefijo}/productos/999999", json={"nombre": "x"}).status_code == 404
+            rechazadas = list(sentencias)
+            assert cliente.patch(f"{prefijo}/productos/{producto.id}/stock", json={"delta": 1}).status_code == 200
+        finally:
+            event.remove(Engine, "before_cursor_execute", registrar)
+
+    assert not [s for s in rechazadas if s.startswith("INSERT INTO cambios_catalogo")]
+    # El ajuste aceptado: el UPDATE toma el número y después se registra, sin más consultas
+    escrituras = [" ".join(s.split()[:3]) for s in sentencias[len(rechazadas):] if s.startswith(("UPDATE", "INSERT"))]
+    assert escrituras == ["UPDATE productos SET", "INSERT INTO cambios_catalogo"]
+    assert CambiosService(db).version_actual() == db.scalar(
+        select(models.Producto.version).where(models.Producto.id == producto.id))
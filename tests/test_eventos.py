@@ -0,0 +1,114 @@
+import asyncio
+import pytest
+from fastapi import HTTPException
+from database import SessionLocal, engine
+import schemas
+from services.esquema_service import actualizar_esquema
+from services.eventos_service import DifusorEventos
+from services.producto_service import ProductoService
+
+def _crear(nombre: str) -> int:
+    db = SessionLocal()
+    try:
+        return ProductoService(db).crear_producto(schemas.ProductoCreate(
+            nombre=nombre, cantidad=1, descripcion="d", marca="Marca", categoria="Cat")).id
+    finally:
+        db.close()
+
+def _eliminar(producto_id: int):
+    db = SessionLocal()
+    try:
+        ProductoService(db).eliminar_producto(producto_id)
+    finally:
+        db.close()
+
+async def _esperar(flujo, evento: bytes) -> str:
+    recibido = b""
+    while evento not in recibido:
+        recibido += await asyncio.wait_for(flujo.__anext__(), 5)
+    return recibido.decode()
+
+def test_sondeo_reparte_cambios_de_otros_workers():
+    actualizar_esquema(engine)
+    difusor = DifusorEventos(sondeo=0.02)
+
+    async def escuchar():
+        flujo = difusor.suscribir()
+        await flujo.__anext__()
+        # Publicar directo no entrega nada en modo sondeo: evita duplicados
+        difusor.publicar("producto", {"id": -1})
+        await asyncio.sleep(0.1)
+        # Las escrituras van por otra sesión (como otro worker), sin pasar por este difusor
+        producto_id = await asyncio.to_thread(_crear, "sondeo")
+        creado = await _esperar(flujo, b"event: producto")
+        await asyncio.to_thread(_eliminar, producto_id)
+        eliminado = await _esperar(flujo, b"event: eliminado")
+        await flujo.aclose()
+        return producto_id, creado, eliminado
+
+    producto_id, creado, eliminado = asyncio.run(escuchar())
+    assert '"id": -1' not in creado
+    assert '"nombre": "sondeo"' in creado
+    assert f'"ids": [{producto_id}]' in eliminado
+
+class _FuenteCambios:
+    """Fuente de cambios de prueba: responde en orden los resultados o errores indicados"""
+
+    def __init__(self, *respuestas):
+        self.respuestas = list(respuestas)
+
+    def __call__(self, since):
+        respuesta = self.respuestas.pop(0)
+        if isinstance(respuesta, Exception):
+            raise respuesta
+        return respuesta
+
+def _sin_cambios(cursor: int) -> dict:
+    return {"cursor": cursor, "hay_mas": False, "productos": [], "eliminados": []}
+
+def _difusor_con(fuente, monkeypatch):
+    difusor = DifusorEventos(sondeo=0.01, leer_cambios=fuente)
+    enviados = []
+    monkeypatch.setattr(difusor, "_enviar", lambda evento, datos: enviados.append(evento))
+    return difusor, enviados
+
+def test_error_de_base_no_manda_recargar(monkeypatch):
+    difusor, enviados = _difusor_con(_FuenteCambios(HTTPException(status_code=500, detail="caída")), monkeypatch)
+    with pytest.raises(HTTPException):
+        difusor._publicar_cambios(5)
+    assert enviados == []
+
+def test_cursor_purgado_manda_recargar(monkeypatch):
+    difusor, enviados = _difusor_con(_FuenteCambios(HTTPException(status_code=410), _sin_cambios(9)), monkeypatch)
+    assert difusor._publicar_cambios(5) == 9
+    assert enviados == ["recargar"]
+
+def test_recargar_no_se_envia_si_falla_el_cursor_nuevo(monkeypatch):
+    difusor, enviados = _difusor_con(_FuenteCambios(HTTPException(status_code=410), OSError("caída")), monkeypatch)
+    with pytest.raises(OSError):
+        difusor._publicar_cambios(5)
+    assert enviados == []
+
+def test_sondeo_sobrevive_a_errores_y_conserva_el_cursor(monkeypatch):
+    cursores = []
+    respuestas = [_sin_cambios(3), OSError("caída"), OSError("caída"), _sin_cambios(3)]
+
+    def fuente(since):
+        cursores.append(since)
+        respuesta = respuestas.pop(0) if respuestas else _sin_cambios(3)
+        if isinstance(respuesta, Exception):
+            raise respuesta
+        return respuesta
+
+    difusor, enviados = _difusor_con(fuente, monkeypatch)
+
+    async def escuchar():
+        flujo = difusor.suscribir()
+        await flujo.__anext__()
+        while len(cursores) < 5:
+            await asyncio.sleep(0.01)
+        await flujo.aclose()
+
+    asyncio.run(asyncio.wait_for(escuchar(), 5))
+    assert cursores[:5] == [None, 3, 3, 3, 3]
+    assert enviados == []
@@ -0,0 +1,127 @@
+import asyncio
+import pytest
+from sqlalchemy import event
+import models, schemas
+from database import SessionLocal, engine
+from services.esquema_service import actualizar_esquema
+from services.imagen_service import VARIANTES, ImagenService, generar_variantes
+from services.producto_service import ProductoService
+
+Image = pytest.importorskip("PIL.Image")
+
+def _generar(tmp_path, imagen, nombre="original.png", **opciones):
+    ruta = tmp_path / nombre
+    imagen.save(ruta, **opciones)
+    salida = tmp_path / "variantes"
+    salida.mkdir()
+    return generar_variantes(str(ruta), str(salida), {"thumb": VARIANTES["thumb"]})["thumb"]
+
+def test_aplica_la_orientacion_exif(tmp_path):
+    # 200x100 guardada con Orientation=6 (rotar 90°): se ve vertical
+    imagen = Image.new("RGB", (200, 100), "red")
+    exif = Image.Exif()
+    exif[0x0112] = 6
+    ruta = _generar(tmp_path, imagen, "foto.jpg", exif=exif)
+    with Image.open(ruta) as variante:
+        assert variante.size == (100, 200)
+
+@pytest.mark.parametrize("modo, color", [("LA", (0, 0)), ("RGBA", (0, 0, 0, 0))])
+def test_conserva_la_transparencia(tmp_path, modo, color):
+    ruta = _generar(tmp_path, Image.new(modo, (50, 50), color))
+    with Image.open(ruta) as variante:
+        assert variante.mode == "RGBA"
+        assert variante.getpixel((0, 0))[3] == 0
+
+def test_paleta_con_color_transparente(tmp_path):
+    imagen = Image.new("P", (50, 50), 0)
+    imagen.putpalette([255, 0, 0] + [0, 0, 255] * 255)
+    imagen.info["transparency"] = 0
+    ruta = _generar(tmp_path, imagen, transparency=0)
+    with Image.open(ruta) as variante:
+        assert variante.mode == "RGBA"
+        assert variante.getpixel((0, 0))[3] == 0
+
+def test_sin_alfa_queda_en_rgb(tmp_path):
+    ruta = _generar(tmp_path, Image.new("L", (50, 50), 128))
+    with Image.open(ruta) as variante:
+        assert variante.mode == "RGB"
+
+class _Bucket:
+    """Almacenamiento falso: registra lo subido y falla con las variantes indicadas"""
+
+    def __init__(self, fallan=()):
+        self.fallan = fallan
+
+    def url_publica(self, nombre_archivo: str) -> str:
+        return f"https://bucket/{nombre_archivo}"
+
+    async def subir(self, nombre_archivo, contenido, tipo_contenido="application/octet-stream"):
+        if any(f"_{variante}." in nombre_archivo for variante in self.fallan):
+            raise OSError("bucket no disponible")
+        return self.url_publica(nombre_archivo)
+
+def _procesar(tmp_path, bucket, respuestas=(1,), espera_producto=0.0, contenido=None):
+    ruta = tmp_path / "subida"
+    if contenido is None:
+        Image.new("RGB", (50, 50), "red").save(ruta, "PNG")
+    else:
+        ruta.write_bytes(contenido)
+    servicio = ImagenService(bucket, max_procesos=1, espera_producto=espera_producto)
+    servicio.pausa_producto = 0.01
+    servicio._variantes = {"thumb": VARIANTES["thumb"], "webp": VARIANTES["webp"]}
+    respuestas = iter(respuestas)
+    guardadas = []
+
+    async def guardar(imagen_url, urls):
+        guardadas.append((imagen_url, urls))
+        return next(respuestas)
+
+    try:
+        asyncio.run(servicio.procesar("foto.png", str(ruta), guardar))
+    finally:
+        servicio.cerrar()
+    assert not ruta.exists()
+    return guardadas
+
+def test_guarda_las_urls_de_variantes_escritas(tmp_path):
+    assert _procesar(tmp_path, _Bucket()) == [("https://bucket/foto.png", {
+        "thumb": "https://bucket/foto_thumb.webp", "webp": "https://bucket/foto_webp.webp"})]
+
+def test_no_guarda_la_url_de_una_variante_que_fallo(tmp_path):
+    assert _procesar(tmp_path, _Bucket(fallan={"webp"})) == [
+        ("https://bucket/foto.png", {"thumb": "https://bucket/foto_thumb.webp"})]
+
+def test_sin_variantes_escritas_no_guarda_nada(tmp_path):
+    assert _procesar(tmp_path, _Bucket(), contenido=b"no es una imagen") == []
+
+def test_espera_a_que_algun_producto_use_la_imagen(tmp_path):
+    assert len(_procesar(tmp_path, _Bucket(), respuestas=(0, 0, 1), espera_producto=5)) == 3
+    assert len(_procesar(tmp_path, _Bucket(), respuestas=(0, 0, 0, 0))) == 1
+
+def test_asignar_variantes_a_los_productos_de_la_imagen():
+    actualizar_esquema(engine)
+    db = SessionLocal()
+    try:
+        servicio = ProductoService(db)
+        producto = servicio.crear_producto(schemas.ProductoCreate(
+            nombre="con imagen", cantidad=1, descripcion="d", marca="M", categoria="C",
+            imagen_url="https://bucket/asignar.png", imagen_webp_url="https://bucket/vieja.webp"))
+        version = producto.version
+
+        sentencias = []
+        registrar = lambda conn, cursor, sentencia, *args: sentencias.append(sentencia)
+        event.listen(engine, "before_cursor_execute", registrar)
+        try:
+            assert servicio.asignar_variantes("https://bucket/otra.png", {"thumb": "https://bucket/x.webp"}) == 0
+        finally:
+            event.remove(engine, "before_cursor_execute", registrar)
+        # Sin productos que usen la imagen no se consume ningún número de cambio
+        assert not [s for s in sentencias if s.startswith("INSERT INTO cambios_catalogo")]
+
+        assert servicio.asignar_variantes("https://bucket/asignar.png", {"thumb": "https://bucket/t.webp"}) == 1
+        db.expire_all()
+        guardado = db.get(models.Producto, producto.id)
+        assert (guardado.imagen_thumb_url, guardado.imagen_webp_url) == ("https://bucket/t.webp", "https://bucket/vieja.webp")
+        assert guardado.version > version
+    finally:
+        db.close()
@@ -0,0 +1,51 @@
+import io
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+import models
+from services.cambios_service import preparar_secuencia
+from services.importacion_service import ImportadorProductos, detectar_formato, leer_filas
+
+@pytest.fixture
+def db(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'importacion.db'}")
+    models.Base.metadata.create_all(bind=engine)
+    preparar_secuencia(engine)
+    sesion = sessionmaker(bind=engine)()
+    yield sesion
+    sesion.close()
+    engine.dispose()
+
+def _csv(texto: str):
+    return leer_filas(io.BytesIO(texto.encode()), "csv")
+
+def test_productos_con_celdas_opcionales_vacias(db):
+    resultado = ImportadorProductos(db).importar(_csv(
+        "nombre,cantidad,descripcion,marca,categoria,stock_minimo,imagen_url\n"
+        "Lápiz,10,,Acme,Útiles,,\n"
+        "Borrador,3,Blanco,Acme,Útiles,1,https://ejemplo.com/b.png\n"
+    ))
+    assert resultado["errores"] == []
+    assert resultado["insertados"] == 2
+    lapiz = db.query(models.Producto).filter_by(nombre="Lápiz").one()
+    assert (lapiz.descripcion, lapiz.stock_minimo, lapiz.imagen_url) == ("", 5, None)
+
+def test_productos_celda_obligatoria_vacia(db):
+    resultado = ImportadorProductos(db).importar(_csv(
+        "nombre,cantidad,descripcion,marca,categoria\n"
+        ",10,d,Acme,Útiles\n"
+        "Lápiz,,d,Acme,Útiles\n"
+    ))
+    assert resultado["insertados"] == 0
+    assert [error["fila"] for error in resultado["errores"]] == [2, 3]
+
+@pytest.mark.parametrize("archivo, formato", [("a.csv", "csv"), ("a.jsonl", "jsonl"), ("a.ndjson", "jsonl")])
+def test_detectar_formato(archivo, formato):
+    assert detectar_formato(archivo) == formato
+
+def test_arreglo_json_no_soportado():
+    # Un arreglo JSON se tendría que cargar completo en memoria
+    with pytest.raises(ValueError):
+        detectar_formato("a.json")
+    with pytest.raises(ValueError):
+        list(leer_filas(io.BytesIO(b"[]"), "json"))
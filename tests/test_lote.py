@@ -0,0 +1,60 @@
+import pytest
+from sqlalchemy import event
+import models, schemas
+from database import SessionLocal, engine
+from services.esquema_service import actualizar_esquema
+from services.producto_service import ProductoService
+
+@pytest.fixture
+def db():
+    actualizar_esquema(engine)
+    sesion = SessionLocal()
+    try:
+        yield sesion
+    finally:
+        sesion.close()
+
+def _crear(db, nombre: str, cantidad: int = 1) -> models.Producto:
+    return ProductoService(db).crear_producto(schemas.ProductoCreate(
+        nombre=nombre, cantidad=cantidad, descripcion="d", marca="Marca", categoria="Cat"))
+
+def _lote(*elementos: dict):
+    return [schemas.ProductoUpdateLote(**elemento) for elemento in elementos]
+
+def test_aplica_solo_los_campos_enviados(db):
+    a, b, c = _crear(db, "a", 1), _crear(db, "b", 2), _crear(db, "c", 3)
+    resultados = ProductoService(db).actualizar_productos_lote(_lote(
+        {"id": a.id, "nombre": "a2"},
+        {"id": b.id, "cantidad": 20},
+        {"id": a.id, "cantidad": 10},
+        {"id": c.id},
+        {"id": 999999, "nombre": "x"},
+        {"id": b.id, "nombre": None},
+    ))
+    assert [(r["id"], r["ok"]) for r in resultados] == [
+        (a.id, True), (b.id, True), (a.id, True), (c.id, True), (999999, False), (b.id, False)]
+    db.expire_all()
+    assert (db.get(models.Producto, a.id).nombre, db.get(models.Producto, a.id).cantidad) == ("a2", 10)
+    assert (db.get(models.Producto, b.id).nombre, db.get(models.Producto, b.id).cantidad) == ("b", 20)
+    assert db.get(models.Producto, c.id).version == c.version
+
+def test_producto_borrado_antes_del_update_no_se_informa_ok(db, monkeypatch):
+    a, b = _crear(db, "queda").id, _crear(db, "se borra").id
+    publicados = []
+    monkeypatch.setattr("services.producto_service.difusor_eventos.publicar",
+                        lambda evento, datos: publicados.append(datos["id"]))
+
+    def borrar_antes(conn, cursor, sentencia, parametros, contexto, executemany):
+        # Otra transacción borra el producto justo antes de que llegue el UPDATE
+        if sentencia.startswith("UPDATE productos"):
+            cursor.execute("DELETE FROM productos WHERE id = ?", (b,))
+
+    event.listen(engine, "before_cursor_execute", borrar_antes)
+    try:
+        resultados = ProductoService(db).actualizar_productos_lote(_lote(
+            {"id": a, "cantidad": 7}, {"id": b, "cantidad": 7}))
+    finally:
+        event.remove(engine, "before_cursor_execute", borrar_antes)
+
+    assert resultados == [{"id": a, "ok": True}, {"id": b, "ok": False, "error": "Producto no encontrado"}]
+    assert publicados == [a]
@@ -0,0 +1,15 @@
+import pytest
+import main
+from services.metricas_service import MetricasMiddleware, MetricasService
+
+@pytest.mark.parametrize("metodo, ruta, plantilla", [
+    ("DELETE", "/productos/7", "/productos/{producto_id}"),
+    # Rutas del router /async, que la app guarda dentro de un solo router incluido
+    ("GET", "/async/productos/marca/acme", "/async/productos/marca/{marca}"),
+    ("PATCH", "/async/productos/7", "/async/productos/{producto_id}"),
+    ("GET", "/no-existe", "desconocida"),
+])
+def test_plantilla_ruta(metodo, ruta, plantilla):
+    middleware = MetricasMiddleware(main.app, MetricasService(), main.app.routes)
+    scope = {"type": "http", "method": metodo, "path": ruta, "root_path": "", "query_string": b"", "headers": []}
+    assert middleware._plantilla_ruta(scope) == plantilla
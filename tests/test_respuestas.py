@@ -0,0 +1,29 @@
+import pytest
+from fastapi.testclient import TestClient
+import main
+from services.esquema_service import actualizar_esquema
+
+@pytest.fixture(scope="module")
+def cliente():
+    actualizar_esquema(main.engine)
+    with TestClient(main.app) as c:
+        yield c
+
+def _etag(cliente, codificacion: str) -> str:
+    respuesta = cliente.get("/productos/", headers={"accept-encoding": codificacion})
+    assert respuesta.status_code == 200
+    assert "Accept-Encoding" in respuesta.headers["Vary"]
+    return respuesta.headers["ETag"]
+
+def test_etag_distinto_por_codificacion(cliente):
+    etags = {codificacion: _etag(cliente, codificacion) for codificacion in ("identity", "gzip", "br")}
+    assert len(set(etags.values())) == 3
+    assert etags["gzip"].endswith('-gz"') and etags["br"].endswith('-br"')
+
+def test_304_solo_para_la_misma_codificacion(cliente):
+    etag_gzip = _etag(cliente, "gzip")
+    misma = cliente.get("/productos/", headers={"accept-encoding": "gzip", "if-none-match": etag_gzip})
+    assert misma.status_code == 304
+    assert misma.headers["ETag"] == etag_gzip
+    otra = cliente.get("/productos/", headers={"accept-encoding": "identity", "if-none-match": etag_gzip})
+    assert otra.status_code == 200
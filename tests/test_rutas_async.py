@@ -0,0 +1,111 @@
+import asyncio
+import hashlib
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+import main, models
+from database import SessionLocal
+from services.auth_service import PasswordManager
+from services.esquema_service import actualizar_esquema
+
+CABECERAS = ("X-Cursor-Cambios", "X-Siguiente-Cursor", "Cache-Control", "Content-Type")
+
+@pytest.fixture(scope="module")
+def cliente():
+    actualizar_esquema(main.engine)
+    db = SessionLocal()
+    try:
+        db.query(models.Producto).delete()
+        if not db.query(models.Usuario).filter_by(username="admin_pruebas").first():
+            db.add(models.Usuario(username="admin_pruebas", email="admin@pruebas.com",
+                                  password=PasswordManager.hash_password("clave"), is_admin=True))
+        db.commit()
+    finally:
+        db.close()
+
+    with TestClient(main.app) as c:
+        r = c.post("/auth/login", json={"username": "admin_pruebas", "password": "clave"})
+        assert r.status_code == 200
+        c.cookies.set("token", r.cookies["token"])
+        for i in range(5):
+            c.post("/productos/", json={"nombre": f"p{i}", "cantidad": i, "descripcion": "d",
+                                        "marca": f"Marca {i % 2}", "categoria": "Cat"})
+        yield c
+
+@pytest.mark.parametrize("ruta", [
+    "/productos/",
+    "/productos/?limit=2",
+    "/productos/?limit=2&after=2",
+    "/productos/facetas",
+    "/productos/marca/arca",
+    "/productos/categoria/ca",
+    "/productos/stock-bajo",
+    "/usuarios/",
+])
+def test_lecturas_iguales(cliente, ruta):
+    sincrona = cliente.get(ruta, headers={"accept-encoding": "identity"})
+    asincrona = cliente.get("/async" + ruta, headers={"accept-encoding": "identity"})
+    assert sincrona.status_code == asincrona.status_code == 200
+    assert sincrona.content == asincrona.content
+    for cabecera in CABECERAS:
+        assert sincrona.headers.get(cabecera) == asincrona.headers.get(cabecera), cabecera
+
+def test_listado_completo_incluye_cursor_de_cambios(cliente):
+    assert cliente.get("/async/productos/").headers["X-Cursor-Cambios"].isdigit()
+
+@pytest.mark.parametrize("ruta, cuerpo, estado", [
+    ("/productos/{id}", {"nombre": "nuevo"}, 200),
+    ("/productos/{id}", {"nombre": None}, 400),
+    ("/productos/999999", {"nombre": "x"}, 404),
+    ("/productos/{id}/stock", {"delta": 1}, 200),
+    ("/productos/{id}/stock", {"delta": -1000}, 409),
+])
+def test_escrituras_iguales(cliente, ruta, cuerpo, estado):
+    producto_id = cliente.get("/productos/?limit=1").json()[0]["id"]
+    ruta = ruta.replace("{id}", str(producto_id))
+    sincrona = cliente.patch(ruta, json=cuerpo)
+    asincrona = cliente.patch("/async" + ruta, json=cuerpo)
+    assert sincrona.status_code == asincrona.status_code == estado
+    if estado == 200:
+        a, b = sincrona.json(), asincrona.json()
+        assert b["version"] > a["version"]
+        if "delta" in cuerpo:
+            assert b["cantidad"] == a["cantidad"] + cuerpo["delta"]
+        for campo in ("version", "cantidad"):
+            a.pop(campo), b.pop(campo)
+        assert a == b
+
+def test_login_con_rehash_no_consulta_desde_el_event_loop(cliente):
+    db = SessionLocal()
+    try:
+        db.add(models.Usuario(username="legado_md5", email="legado@pruebas.com",
+                              password=hashlib.md5(b"clave").hexdigest(), is_admin=False))
+        db.commit()
+    finally:
+        db.close()
+
+    sentencias, en_el_loop = [], []
+
+    def registrar(conn, cursor, sentencia, parametros, contexto, multiples):
+        sentencias.append(sentencia.split()[0])
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        en_el_loop.append(sentencia)
+
+    event.listen(main.engine, "before_cursor_execute", registrar)
+    try:
+        r = cliente.post("/auth/login", json={"username": "legado_md5", "password": "clave"})
+    finally:
+        event.remove(main.engine, "before_cursor_execute", registrar)
+    assert r.status_code == 200
+    assert r.json()["user"]["username"] == "legado_md5"
+    assert en_el_loop == []
+    # El commit del hash nuevo no expira al usuario: nadie tiene que recargarlo
+    assert sentencias == ["SELECT", "UPDATE"]
+    db = SessionLocal()
+    try:
+        assert db.query(models.Usuario).filter_by(username="legado_md5").one().password.startswith("scrypt$")
+    finally:
+        db.close()
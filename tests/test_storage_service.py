@@ -0,0 +1,133 @@
+import asyncio
+import io
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import pytest
+from fastapi import UploadFile
+from services.storage_service import StorageService
+
+class _StubStorage(BaseHTTPRequestHandler):
+    """Imita el endpoint de subida de Supabase; el comportamiento se elige por el nombre del objeto"""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        if self.headers.get("Transfer-Encoding") == "chunked":
+            cuerpo = self._leer_chunked()
+        else:
+            cuerpo = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.server.recibidas.append({"ruta": self.path, "headers": dict(self.headers), "cuerpo": cuerpo})
+
+        if "lento" in self.path:
+            time.sleep(self.server.demora)
+        estado = 500 if "falla" in self.path else 200
+        respuesta = b'{"Key": "ok"}' if estado == 200 else b'{"error": "interno"}'
+        self.send_response(estado)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(respuesta)))
+        self.end_headers()
+        self.wfile.write(respuesta)
+
+    def _leer_chunked(self) -> bytes:
+        partes = []
+        while True:
+            tamano = int(self.rfile.readline().strip(), 16)
+            if tamano == 0:
+                self.rfile.readline()
+                return b"".join(partes)
+            partes.append(self.rfile.read(tamano))
+            self.rfile.readline()
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def servidor():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), _StubStorage)
+    httpd.daemon_threads = True
+    httpd.recibidas = []
+    httpd.demora = 0.5
+    hilo = threading.Thread(target=httpd.serve_forever, daemon=True)
+    hilo.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+def _servicio(servidor, **opciones) -> StorageService:
+    host, puerto = servidor.server_address
+    return StorageService(f"http://{host}:{puerto}/", "llave-prueba", bucket="pruebas", **opciones)
+
+def _ejecutar(servicio: StorageService, corrutina):
+    """Corre la corrutina y cierra el pool en el mismo event loop"""
+    async def principal():
+        try:
+            return await corrutina
+        finally:
+            await servicio.cerrar()
+    return asyncio.run(principal())
+
+def test_subida_exitosa(servidor):
+    servicio = _servicio(servidor)
+    url = _ejecutar(servicio, servicio.subir("foto.png", b"contenido", tipo_contenido="image/png", tamano=9))
+
+    assert url == f"{servicio.base_url}/storage/v1/object/public/pruebas/foto.png"
+    [solicitud] = servidor.recibidas
+    assert solicitud["ruta"] == "/storage/v1/object/pruebas/foto.png"
+    assert solicitud["cuerpo"] == b"contenido"
+    assert solicitud["headers"]["Content-Type"] == "image/png"
+    assert solicitud["headers"]["Authorization"] == "Bearer llave-prueba"
+    assert solicitud["headers"]["apikey"] == "llave-prueba"
+
+def test_subida_por_bloques_de_upload(servidor):
+    datos = bytes(range(256)) * 1000
+    copia = io.BytesIO()
+    servicio = _servicio(servidor, tamano_bloque=4096)
+    archivo = UploadFile(file=io.BytesIO(datos), filename="grande.bin", size=len(datos))
+
+    url = _ejecutar(servicio, servicio.subir_upload(archivo, copia=copia))
+
+    [solicitud] = servidor.recibidas
+    assert solicitud["cuerpo"] == datos
+    assert solicitud["headers"]["Content-Length"] == str(len(datos))
+    assert solicitud["ruta"].endswith("_grande.bin")
+    assert url.endswith(solicitud["ruta"].rsplit("/", 1)[1])
+    assert copia.getvalue() == datos
+
+def test_subida_sin_tamano_usa_chunked(servidor):
+    servicio = _servicio(servidor, tamano_bloque=10)
+    archivo = UploadFile(file=io.BytesIO(b"x" * 95), filename="sin_tamano.bin")
+
+    _ejecutar(servicio, servicio.subir_upload(archivo, nombre_archivo="sin_tamano.bin"))
+
+    [solicitud] = servidor.recibidas
+    assert solicitud["headers"].get("Transfer-Encoding") == "chunked"
+    assert solicitud["cuerpo"] == b"x" * 95
+
+def test_error_de_estado(servidor):
+    servicio = _servicio(servidor)
+    with pytest.raises(httpx.HTTPStatusError) as error:
+        _ejecutar(servicio, servicio.subir("falla.png", b"datos"))
+    assert error.value.response.status_code == 500
+
+def test_timeout(servidor):
+    servicio = _servicio(servidor, timeout=0.1)
+    with pytest.raises(httpx.TimeoutException):
+        _ejecutar(servicio, servicio.subir("lento.png", b"datos"))
+
+def test_subidas_concurrentes_no_se_serializan(servidor):
+    servidor.demora = 0.3
+    servicio = _servicio(servidor)
+
+    async def varias():
+        return await asyncio.gather(*(servicio.subir(f"lento_{i}.png", b"datos") for i in range(5)))
+
+    inicio = time.perf_counter()
+    urls = _ejecutar(servicio, varias())
+    duracion = time.perf_counter() - inicio
+
+    assert len(urls) == 5 and len(servidor.recibidas) == 5
+    # En serie serían 1.5 s; en paralelo, poco más que una sola subida
+    assert duracion < 1.0